@@ -0,0 +1,279 @@
+"""
+HTTP load test of ``runserver`` serving ``mywsgi.application``.
+
+    python -m benchmarks.load --concurrency 16 --duration 10
+    python -m benchmarks.load --threads 8 --no-keep-alive --output pool.json
+    python -m benchmarks.load --workers 4 --client-processes 4 --path /:3 --path /path1:1
+
+The server is started in this process on a free port of 127.0.0.1 (pre-forked
+into child processes with ``--workers``) and driven by ``--concurrency``
+client connections for ``--duration`` seconds. Unless paths are given, the
+requests cycle through one example path per named route of ``url_patterns``.
+Client threads share the interpreter with a threaded server; spread them over
+``--client-processes`` to keep them from competing for its GIL.
+"""
+import argparse
+import collections
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import signal
+import threading
+import time
+
+from project.resolvers import _build_reverse_index
+
+# Values tried for each route argument when building example paths.
+_SAMPLE_VALUES = ('1', '2', 'a', 'abc', '2016', '05', 'some-slug')
+
+
+def sample_paths(patterns):
+    """One request path per named route of ``patterns`` whose arguments can be guessed."""
+    paths = []
+    for name, reversals in sorted(_build_reverse_index(patterns, {}, '', []).items()):
+        for reversal in reversals:
+            args = []
+            for check in reversal.checks:
+                value = next((value for value in _SAMPLE_VALUES if check.fullmatch(value)), None)
+                if value is None:
+                    break
+                args.append(value)
+            else:
+                path = reversal.fill(args, {})
+                if path is not None:
+                    paths.append(path)
+    return paths
+
+
+def parse_mix(specs):
+    """Expand ``['/:3', '/path1']`` into a list where every path appears as often as its weight."""
+    paths = []
+    for spec in specs:
+        path, _, weight = spec.rpartition(':') if ':' in spec else (spec, '', '1')
+        paths.extend([path] * int(weight))
+    return paths
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[max(int(math.ceil(fraction * len(ordered))) - 1, 0)]
+
+
+class ClientResult(object):
+    def __init__(self):
+        self.latencies = []
+        self.statuses = collections.Counter()
+        self.errors = collections.Counter()
+
+    def merge(self, other):
+        self.latencies.extend(other.latencies)
+        self.statuses.update(other.statuses)
+        self.errors.update(other.errors)
+
+
+def client(port, paths, keep_alive, deadline, seed, result):
+    """Send requests on one connection at a time until ``deadline``."""
+    paths = list(paths)
+    random.Random(seed).shuffle(paths)
+    headers = {} if keep_alive else {'Connection': 'close'}
+    connection = None
+    position = 0
+    while time.perf_counter() < deadline:
+        path = paths[position % len(paths)]
+        position += 1
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            result.statuses[response.status] += 1
+            if response.will_close:
+                connection.close()
+                connection = None
+        except (OSError, http.client.HTTPException) as e:
+            result.errors[type(e).__name__] += 1
+            if connection is not None:
+                connection.close()
+                connection = None
+            continue
+        result.latencies.append(time.perf_counter() - started)
+    if connection is not None:
+        connection.close()
+
+
+def run_clients(port, paths, keep_alive, concurrency, duration, seed=0):
+    deadline = time.perf_counter() + duration
+    results = [ClientResult() for _ in range(concurrency)]
+    threads = [threading.Thread(target=client, args=(port, paths, keep_alive, deadline, seed + number, result))
+               for number, result in enumerate(results)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = ClientResult()
+    for result in results:
+        total.merge(result)
+    return total
+
+
+def _client_process(queue, *args):
+    result = run_clients(*args)
+    queue.put((result.latencies, dict(result.statuses), dict(result.errors)))
+
+
+def drive(port, paths, keep_alive, concurrency, duration, processes=1):
+    if processes <= 1:
+        return run_clients(port, paths, keep_alive, concurrency, duration)
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    children = []
+    for number in range(processes):
+        share = concurrency // processes + (1 if number < concurrency % processes else 0)
+        child = context.Process(target=_client_process,
+                                args=(queue, port, paths, keep_alive, share, duration, number * concurrency))
+        child.start()
+        children.append(child)
+    total = ClientResult()
+    for _ in children:
+        latencies, statuses, errors = queue.get()
+        total.latencies.extend(latencies)
+        total.statuses.update(statuses)
+        total.errors.update(errors)
+    for child in children:
+        child.join()
+    return total
+
+
+def start_server(application, threads=0, workers=1, queue_size=None, backlog=None):
+    """Serve ``application`` on a free local port; return ``(port, stop)``."""
+    from project import runserver
+
+    class QuietHandler(runserver.WSGIRequestHandler):
+        def log_request(self, code='-', size='-'):
+            pass
+
+    kwargs = {'threads': threads, 'handler_class': QuietHandler}
+    if queue_size is not None:
+        kwargs['queue_size'] = queue_size
+    if backlog is not None:
+        kwargs['backlog'] = backlog
+    httpd = runserver.make_server('127.0.0.1', 0, application, **kwargs)
+    port = httpd.server_address[1]
+    if workers > 1:
+        pid = os.fork()
+        if not pid:
+            try:
+                runserver.PreforkServer(httpd, workers).serve_forever()
+            finally:
+                os._exit(0)
+        httpd.server_close()
+
+        def stop():
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+    else:
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        def stop():
+            httpd.shutdown()
+            httpd.server_close()
+    return port, stop
+
+
+def summarize(result, duration):
+    ordered = sorted(result.latencies)
+    requests = len(ordered)
+    failed = sum(result.errors.values()) + sum(count for status, count in result.statuses.items() if status >= 500)
+    attempts = requests + sum(result.errors.values())
+
+    def milliseconds(fraction):
+        value = percentile(ordered, fraction)
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'requests': requests,
+        'rps': round(requests / duration, 1),
+        'latency_ms': {'p50': milliseconds(0.5), 'p99': milliseconds(0.99), 'p999': milliseconds(0.999)},
+        'statuses': dict((str(status), count) for status, count in sorted(result.statuses.items())),
+        'errors': dict(result.errors),
+        'error_rate': round(failed / float(attempts), 6) if attempts else 0.0,
+    }
+
+
+def load_test(application, paths, concurrency=8, duration=5.0, keep_alive=True, threads=0, workers=1,
+              client_processes=1, queue_size=None, backlog=None):
+    port, stop = start_server(application, threads=threads, workers=workers, queue_size=queue_size,
+                              backlog=backlog)
+    try:
+        started = time.perf_counter()
+        result = drive(port, paths, keep_alive, concurrency, duration, client_processes)
+        elapsed = time.perf_counter() - started
+    finally:
+        stop()
+    summary = summarize(result, elapsed)
+    summary['config'] = {
+        'mode': 'prefork' if workers > 1 else 'pool' if threads else 'thread-per-connection',
+        'threads': threads, 'workers': workers, 'concurrency': concurrency, 'keep_alive': keep_alive,
+        'duration': duration, 'client_processes': client_processes, 'paths': sorted(set(paths)),
+        'python': platform.python_version(),
+    }
+    return summary
+
+
+def report(summary):
+    latency = summary['latency_ms']
+    lines = [
+        '%(mode)s, %(concurrency)d connections, keep-alive %(keep_alive)s' % summary['config'],
+        'requests  %d (%.1f/s)' % (summary['requests'], summary['rps']),
+        'latency   p50 %s ms  p99 %s ms  p99.9 %s ms' % (latency['p50'], latency['p99'], latency['p999']),
+        'statuses  %s' % ', '.join('%s: %d' % item for item in sorted(summary['statuses'].items())),
+        'errors    %s (rate %.4f%%)' % (', '.join('%s: %d' % item for item in sorted(summary['errors'].items()))
+                                        or 'none', summary['error_rate'] * 100),
+    ]
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test runserver with mywsgi.application.')
+    parser.add_argument('--concurrency', type=int, default=8, help='client connections')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds to run')
+    parser.add_argument('--no-keep-alive', dest='keep_alive', action='store_false',
+                        help='open a new connection for every request')
+    parser.add_argument('--path', action='append', default=[],
+                        help='request path, optionally with a weight as /path:3; repeatable')
+    parser.add_argument('--threads', type=int, default=0, help='server thread pool size (0: thread per connection)')
+    parser.add_argument('--workers', type=int, default=1, help='pre-forked server processes')
+    parser.add_argument('--queue-size', type=int, default=None)
+    parser.add_argument('--backlog', type=int, default=None)
+    parser.add_argument('--client-processes', type=int, default=1,
+                        help='processes the client connections are spread over')
+    parser.add_argument('--output', help='write the summary to this JSON file')
+    options = parser.parse_args(argv)
+
+    from project.mywsgi import application, url_patterns
+    paths = parse_mix(options.path) if options.path else sample_paths(url_patterns)
+    if not paths:
+        parser.error('no path to request: give some with --path')
+    summary = load_test(application, paths, concurrency=options.concurrency, duration=options.duration,
+                        keep_alive=options.keep_alive, threads=options.threads, workers=options.workers,
+                        client_processes=options.client_processes, queue_size=options.queue_size,
+                        backlog=options.backlog)
+    print('\n'.join(report(summary)))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+    return summary
+
+
+if __name__ == '__main__':
+    main()
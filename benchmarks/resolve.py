@@ -0,0 +1,263 @@
+"""
+Route resolution benchmarks on synthetic URLconfs.
+
+    python -m benchmarks.resolve --output before.json
+    python -m benchmarks.resolve --output after.json --compare before.json
+
+Every URLconf is resolved with the plain linear scan over
+``RegexURLPattern.resolve`` / ``RegexURLPatternList.resolve`` and with the
+compiled ``project.resolvers.Resolver``, for the first route (best case),
+the last route (worst case) and a path nothing matches (404). Latencies are
+nanoseconds per resolve; memory is the bytes allocated per route to build
+and warm each of them.
+"""
+import argparse
+import json
+import platform
+import re
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from project.resolvers import Resolver
+from project.urlsconf import url
+
+SIZES = (10, 100, 1000, 10000)
+DEPTHS = (1, 4, 8)
+
+
+def view(environ, *args, **kwargs):
+    return args, kwargs
+
+
+def flat_urlconf(size):
+    """``size`` routes side by side, each with a named group."""
+    patterns = [url(r'^section%d/(?P<id>[0-9]+)/$' % number, view) for number in range(size)]
+    return patterns, {
+        'best': 'section0/42/',
+        'worst': 'section%d/42/' % (size - 1),
+        '404': 'section%d/42/' % size,
+    }
+
+
+def mixed_urlconf(size):
+    """``size`` routes alternating named groups, positional groups and no groups."""
+    patterns = []
+    paths = []
+    for number in range(size):
+        kind = number % 3
+        if kind == 0:
+            patterns.append(url(r'^articles%d/(?P<year>[0-9]{4})/(?P<slug>[-\w]+)/$' % number, view))
+            paths.append('articles%d/2016/some-slug/' % number)
+        elif kind == 1:
+            patterns.append(url(r'^archive%d/([0-9]{4})/([0-9]{2})/$' % number, view))
+            paths.append('archive%d/2016/05/' % number)
+        else:
+            patterns.append(url(r'^page%d/$' % number, view))
+            paths.append('page%d/' % number)
+    return patterns, {'best': paths[0], 'worst': paths[-1], '404': 'articles%d/20/x/' % size}
+
+
+def nested_urlconf(depth, fanout=10):
+    """include() levels ``depth`` deep, with ``fanout`` routes next to each level."""
+    patterns = [url(r'^leaf(?P<id>[0-9]+)/$', view)]
+    prefix = ''
+    for level in reversed(range(depth)):
+        siblings = [url(r'^other%d_%d/(?P<id>[0-9]+)/$' % (level, number), view) for number in range(fanout)]
+        patterns = siblings + [url(r'^level%d/(?P<l%d>[a-z]+)/' % (level, level), patterns)]
+    for level in range(depth):
+        prefix += 'level%d/abc/' % level
+    return patterns, {
+        'best': 'other0_0/1/',
+        'worst': prefix + 'leaf7/',
+        '404': prefix + 'leaf/',
+    }
+
+
+GENERATORS = {'flat': flat_urlconf, 'mixed': mixed_urlconf, 'nested': nested_urlconf}
+
+
+def urlconfs(sizes=SIZES, depths=DEPTHS):
+    """``(kind, size)`` of every URLconf to benchmark."""
+    for size in sizes:
+        yield 'flat', size
+        yield 'mixed', size
+    for depth in depths:
+        yield 'nested', depth
+
+
+def linear_resolve(patterns, path):
+    for pattern in patterns:
+        obj = pattern.resolve(path)
+        if obj:
+            return obj
+
+
+def count_routes(patterns):
+    return sum(1 for pattern in walk(patterns) if not hasattr(pattern, 'patterns'))
+
+
+def time_call(func, arg, min_time=0.05, repeat=5):
+    """Return the (min, median) nanoseconds per ``func(arg)`` call."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func(arg)
+        timings.append((time.perf_counter() - started) / number)
+    return int(min(timings) * 1e9), int(statistics.median(timings) * 1e9)
+
+
+def measure_memory(build):
+    """Bytes still allocated after ``build()``, with the regex cache emptied first."""
+    re.purge()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        kept = build()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+
+
+def bench_urlconf(kind, size, min_time=0.05, repeat=5):
+    generate = GENERATORS[kind]
+    patterns, paths = generate(size)
+    routes = count_routes(patterns)
+
+    def build_linear():
+        # What the linear scan keeps: every pattern's compiled regex.
+        fresh = generate(size)[0]
+        for pattern in walk(fresh):
+            pattern.regex
+        return fresh
+
+    def build_resolver():
+        resolver = Resolver(generate(size)[0])
+        resolver.warm()
+        return resolver
+
+    resolver = Resolver(patterns)
+    resolver.warm()
+    name = '%s-%d' % (kind, size)
+    result = {
+        'urlconf': name,
+        'routes': routes,
+        'memory_per_route': {
+            'linear': measure_memory(build_linear) // routes,
+            'resolver': measure_memory(build_resolver) // routes,
+        },
+        'latency_ns': {},
+    }
+    for case, path in sorted(paths.items()):
+        expected = linear_resolve(patterns, path)
+        assert resolver.resolve(path) == expected, (name, case)
+        assert (expected is None) == (case == '404'), (name, case)
+        result['latency_ns'][case] = {
+            'linear': dict(zip(('min', 'median'),
+                               time_call(lambda p: linear_resolve(patterns, p), path, min_time, repeat))),
+            'resolver': dict(zip(('min', 'median'), time_call(resolver.resolve, path, min_time, repeat))),
+        }
+    return result
+
+
+def walk(patterns):
+    for pattern in patterns:
+        if hasattr(pattern, 'patterns'):
+            yield pattern
+            for sub_pattern in walk(pattern.patterns):
+                yield sub_pattern
+        else:
+            yield pattern
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=SIZES, depths=DEPTHS, min_time=0.05, repeat=5):
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': [bench_urlconf(kind, size, min_time, repeat) for kind, size in urlconfs(sizes, depths)],
+    }
+
+
+def compare(old, new):
+    """Lines with the median latency of ``new`` relative to ``old``."""
+    previous = dict((result['urlconf'], result) for result in old['results'])
+    lines = ['%-14s %-6s %-9s %12s %12s %8s' % ('urlconf', 'case', 'resolver', 'old ns', 'new ns', 'ratio')]
+    for result in new['results']:
+        before = previous.get(result['urlconf'])
+        if before is None:
+            continue
+        for case, latencies in sorted(result['latency_ns'].items()):
+            for kind, latency in sorted(latencies.items()):
+                try:
+                    old_ns = before['latency_ns'][case][kind]['median']
+                except KeyError:
+                    continue
+                new_ns = latency['median']
+                lines.append('%-14s %-6s %-9s %12d %12d %7.2fx' % (
+                    result['urlconf'], case, kind, old_ns, new_ns, new_ns / float(old_ns or 1)))
+    return lines
+
+
+def report(data):
+    lines = ['%-14s %7s %-6s %14s %14s %10s' % ('urlconf', 'routes', 'case', 'linear ns', 'resolver ns', 'B/route')]
+    for result in data['results']:
+        for case, latencies in sorted(result['latency_ns'].items()):
+            lines.append('%-14s %7d %-6s %14d %14d %10d' % (
+                result['urlconf'], result['routes'], case, latencies['linear']['median'],
+                latencies['resolver']['median'], result['memory_per_route']['resolver']))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark URL resolution on synthetic URLconfs.')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES),
+                        help='comma separated numbers of routes for the flat and mixed URLconfs')
+    parser.add_argument('--depths', default=','.join(str(depth) for depth in DEPTHS),
+                        help='comma separated include() depths for the nested URLconfs')
+    parser.add_argument('--min-time', type=float, default=0.05, help='seconds to spend timing each case')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run to compare against')
+    options = parser.parse_args(argv)
+
+    data = run([int(size) for size in options.sizes.split(',') if size],
+               [int(depth) for depth in options.depths.split(',') if depth],
+               options.min_time, options.repeat)
+    print('\n'.join(report(data)))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as f:
+            print('\n'.join(compare(json.load(f), data)))
+    return data
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+import asyncio
+import functools
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import responses
+from urllib.parse import unquote_to_bytes
+
+from project import mywsgi
+from project.request import HttpRequest
+
+
+class BadRequest(Exception):
+    def __init__(self, status, message=''):
+        super(BadRequest, self).__init__(message)
+        self.status = status
+
+
+class AsyncServer(object):
+    """
+    HTTP/1.1 server on an asyncio event loop.
+
+    Requests are resolved with ``mywsgi.resolve_path`` against the usual
+    ``url_patterns``. Coroutine views are awaited on the loop; plain views
+    run in a thread pool so they can't block it. An idle kept-alive
+    connection costs a coroutine instead of a thread, so many slow or idle
+    clients can be held open at once.
+    """
+
+    # Seconds a kept-alive connection may wait for its next request.
+    idle_timeout = 5
+    max_header_size = 65536
+    max_body_size = 10 * 1024 * 1024
+
+    def __init__(self, addr, port, threads=None):
+        self.addr = addr
+        self.port = port
+        self.executor = ThreadPoolExecutor(threads)
+        self.server = None
+        self.loop = None
+        self._handler = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(
+            self.handle_connection, self.addr, self.port, limit=self.max_header_size)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=False)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.send_error(writer, 431)
+                    break
+                metrics = mywsgi.metrics
+                started = time.perf_counter()
+                try:
+                    environ, keep_alive = self.parse_head(head, writer)
+                    if metrics is not None:
+                        metrics.parse.observe(time.perf_counter() - started)
+                    environ['wsgi.input'] = io.BytesIO(await self.read_body(reader, environ))
+                except BadRequest as e:
+                    await self.send_error(writer, e.status)
+                    break
+                response = await self.get_response(environ)
+                started = time.perf_counter()
+                keep_alive = await self.send_response(writer, environ, response, keep_alive)
+                if metrics is not None:
+                    metrics.write.observe(time.perf_counter() - started)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def parse_head(self, head, writer):
+        lines = head.decode('iso-8859-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise BadRequest(400)
+        if not version.startswith('HTTP/1.'):
+            raise BadRequest(505)
+        path, _, query = target.partition('?')
+        host, port = writer.get_extra_info('sockname')[:2]
+        peer = writer.get_extra_info('peername')
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            # Same as runserver: non-ASCII bytes are decoded with ISO-8859-1.
+            'PATH_INFO': unquote_to_bytes(path).decode('iso-8859-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': host,
+            'SERVER_PORT': str(port),
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': peer[0] if peer else '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise BadRequest(400)
+            # Headers with underscores are dropped, as runserver does, to
+            # prevent spoofing through the dash/underscore ambiguity.
+            if '_' in name:
+                continue
+            key = name.strip().upper().replace('-', '_')
+            value = value.strip()
+            if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[key] = value
+            else:
+                key = 'HTTP_' + key
+                environ[key] = environ[key] + ',' + value if key in environ else value
+        connection = environ.get('HTTP_CONNECTION', '').lower()
+        if version == 'HTTP/1.1':
+            keep_alive = connection != 'close'
+        else:
+            keep_alive = connection == 'keep-alive'
+        return environ, keep_alive
+
+    async def read_body(self, reader, environ):
+        if environ.get('HTTP_TRANSFER_ENCODING'):
+            raise BadRequest(501)
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise BadRequest(400)
+        if length > self.max_body_size:
+            raise BadRequest(413)
+        if not length:
+            return b''
+        try:
+            return await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise BadRequest(400)
+
+    async def get_response(self, environ):
+        loop = asyncio.get_running_loop()
+        try:
+            if mywsgi.middleware:
+                # Middleware hooks are plain functions, so the whole chain runs
+                # in the pool; see call_view for coroutine views.
+                response = await loop.run_in_executor(self.executor, self.get_handler(), environ)
+            else:
+                callback, args, kwargs = mywsgi.resolve_path(environ)
+                metrics = mywsgi.metrics
+                request = HttpRequest(environ)
+                if asyncio.iscoroutinefunction(callback):
+                    started = time.perf_counter()
+                    response = await callback(request, *args, **kwargs)
+                    if metrics is not None:
+                        metrics.view.observe(time.perf_counter() - started)
+                elif metrics is not None:
+                    response = await loop.run_in_executor(
+                        self.executor, metrics.call_view, callback, request, args, kwargs)
+                else:
+                    response = await loop.run_in_executor(
+                        self.executor, functools.partial(callback, request, *args, **kwargs))
+        except Exception as e:
+            response = mywsgi.response_for_exception(e)
+        return response
+
+    def get_handler(self):
+        composed = self._handler
+        if composed is None or composed[0] is not mywsgi.middleware:
+            composed = self._handler = (mywsgi.middleware, mywsgi.build_handler(mywsgi.middleware, self.call_view))
+        return composed[1]
+
+    def call_view(self, environ, callback, args, kwargs):
+        # Called from a pool thread: coroutine views are handed to the loop.
+        request = HttpRequest(environ)
+        if asyncio.iscoroutinefunction(callback):
+            started = time.perf_counter()
+            response = asyncio.run_coroutine_threadsafe(callback(request, *args, **kwargs), self.loop).result()
+            if mywsgi.metrics is not None:
+                mywsgi.metrics.view.observe(time.perf_counter() - started)
+            return response
+        if mywsgi.metrics is not None:
+            return mywsgi.metrics.call_view(callback, request, args, kwargs)
+        return callback(request, *args, **kwargs)
+
+    async def send_response(self, writer, environ, response, keep_alive):
+        loop = asyncio.get_running_loop()
+        try:
+            region = None
+            if getattr(response, 'file_to_stream', None) is not None:
+                response.apply_range(environ.get('HTTP_RANGE'))
+                region = response.region
+            status, headers = mywsgi.status_and_headers(response)
+            names = set(name.lower() for name, value in headers)
+            version = environ['SERVER_PROTOCOL']
+            has_body = environ['REQUEST_METHOD'] != 'HEAD' and response.status_code not in (204, 304)
+            chunked = False
+            if 'content-length' not in names and has_body:
+                if version == 'HTTP/1.1':
+                    headers.append(('Transfer-Encoding', 'chunked'))
+                    chunked = True
+                else:
+                    keep_alive = False
+            if not keep_alive:
+                headers.append(('Connection', 'close'))
+            elif version != 'HTTP/1.1':
+                headers.append(('Connection', 'keep-alive'))
+            head = ['HTTP/1.1 %s' % status]
+            head.extend('%s: %s' % header for header in headers)
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('iso-8859-1'))
+            if has_body:
+                if region is not None and region.length is not None and not chunked:
+                    # Let the loop use os.sendfile, or its own fallback.
+                    if region.length:
+                        await loop.sendfile(writer.transport, region.file, region.offset, region.length)
+                elif response.streaming:
+                    # Streaming bodies may block while producing chunks.
+                    chunks = iter(response)
+                    while True:
+                        chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                        if chunk is None:
+                            break
+                        await self.write_body(writer, chunk, chunked)
+                else:
+                    await self.write_body(writer, response.content, chunked)
+                if chunked:
+                    writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        finally:
+            response.close()
+        return keep_alive
+
+    async def write_body(self, writer, data, chunked):
+        if not data:
+            return
+        if chunked:
+            writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+        else:
+            writer.write(data)
+        await writer.drain()
+
+    async def send_error(self, writer, status):
+        reason = responses.get(status, 'Error')
+        body = ('%d %s\n' % (status, reason)).encode('ascii')
+        writer.write(('HTTP/1.1 %d %s\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n'
+                      'Connection: close\r\n\r\n' % (status, reason, len(body))).encode('ascii') + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def run(addr, port, threads=None):
+    server = AsyncServer(addr, port, threads=threads)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == '__main__':
+    # python -m project.asyncserver [addr] [port]
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the asyncio server.')
+    parser.add_argument('addr', nargs='?', default='127.0.0.1')
+    parser.add_argument('port', nargs='?', type=int, default=8003)
+    parser.add_argument('--threads', type=int, default=None,
+                        help='size of the thread pool that runs plain (non-async) views')
+    parser.add_argument('--static-root', help='directory of static files to serve')
+    parser.add_argument('--static-url', default='/static/', help='URL prefix of the static files')
+    parser.add_argument('--compress', action='store_true', help='gzip/brotli compress responses')
+    parser.add_argument('--metrics', action='store_true', help='collect request timings, served at /__metrics__')
+    options = parser.parse_args()
+    if options.metrics:
+        from project.metrics import Metrics
+        mywsgi.metrics = Metrics()
+        mywsgi.middleware.append(mywsgi.metrics)
+    if options.compress:
+        from project.compression import CompressionMiddleware
+        mywsgi.middleware.append(CompressionMiddleware())
+    if options.static_root:
+        from project.staticfiles import StaticFiles
+        mywsgi.middleware.append(StaticFiles(options.static_root, prefix=options.static_url))
+    run(options.addr, options.port, threads=options.threads)
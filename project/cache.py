@@ -0,0 +1,288 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from project.exceptions import ImproperlyConfigured
+from project.response import HttpResponse, HttpResponseNotModified
+
+
+class CacheEntry(object):
+    """A response as it goes out: status, validated headers and body bytes."""
+
+    __slots__ = ('status', 'reason', 'headers', 'content', 'expires')
+
+    def __init__(self, status, reason, headers, content, expires):
+        self.status = status
+        self.reason = reason
+        # Lower-case name -> (name, value), like HttpResponseBase._headers.
+        self.headers = headers
+        self.content = content
+        self.expires = expires
+
+    @property
+    def size(self):
+        return len(self.content) + sum(len(name) + len(value) for name, value in self.headers.values())
+
+    @property
+    def etag(self):
+        return self.headers.get('etag', (None, None))[1]
+
+    def response(self):
+        response = HttpResponse(self.content, status=self.status, reason=self.reason)
+        # The headers were validated when the entry was stored.
+        response._headers = dict(self.headers)
+        return response
+
+    def dumps(self):
+        meta = {
+            'status': self.status,
+            'reason': self.reason,
+            'headers': list(self.headers.values()),
+            'expires': self.expires,
+        }
+        return json.dumps(meta).encode('utf-8') + b'\n' + self.content
+
+    @classmethod
+    def loads(cls, data):
+        meta, _, content = data.partition(b'\n')
+        meta = json.loads(meta.decode('utf-8'))
+        headers = dict((name.lower(), (name, value)) for name, value in meta['headers'])
+        return cls(meta['status'], meta['reason'], headers, content, meta['expires'])
+
+
+class MemoryBackend(object):
+    """An LRU of entries holding at most ``max_memory`` bytes of bodies and headers."""
+
+    def __init__(self, max_memory=64 * 1024 * 1024):
+        self.max_memory = max_memory
+        self.memory_used = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.time():
+                del self._entries[key]
+                self.memory_used -= entry.size
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = entry.size
+        if size > self.max_memory:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.memory_used -= old.size
+            self._entries[key] = entry
+            self.memory_used += size
+            while self.memory_used > self.max_memory:
+                key, evicted = self._entries.popitem(last=False)
+                self.memory_used -= evicted.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.memory_used = 0
+
+
+class FileBackend(object):
+    """
+    Entries stored as files under ``directory``, shared by every process
+    using it. Files are written to a temporary name and renamed into place,
+    so readers never see half an entry. Expired files are removed when they
+    are read and every ``prune_every`` writes.
+    """
+
+    suffix = '.response'
+
+    def __init__(self, directory, prune_every=256):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.prune_every = prune_every
+        self._writes = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + self.suffix)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = CacheEntry.loads(f.read())
+        except (OSError, ValueError, KeyError):
+            return None
+        if entry.expires <= time.time():
+            self._remove(path)
+            return None
+        return entry
+
+    def set(self, key, entry):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(entry.dumps())
+            os.replace(temp_path, self.path(key))
+        except OSError:
+            self._remove(temp_path)
+            return
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self):
+        """Remove the expired entries."""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'rb') as f:
+                    expires = json.loads(f.readline().decode('utf-8'))['expires']
+            except (OSError, ValueError, KeyError):
+                continue
+            if expires <= now:
+                self._remove(path)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                self._remove(os.path.join(self.directory, name))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an ``If-None-Match`` header matches ``etag``, weakly compared."""
+    if etag is None:
+        return False
+    etag = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate == etag or candidate == 'W/' + etag:
+            return True
+    return False
+
+
+def vary_environ_keys(vary):
+    """
+    The environ keys of the request headers named in the value of a
+    ``Vary`` header, such as ``'HTTP_COOKIE'`` for ``Cookie``. ``'*'`` is
+    kept as it is.
+    """
+    keys = []
+    for header in vary.split(','):
+        header = header.strip()
+        if not header:
+            continue
+        if header == '*':
+            keys.append(header)
+            continue
+        name = header.upper().replace('-', '_')
+        keys.append(name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name)
+    return keys
+
+
+class ResponseCacheMiddleware(object):
+    """
+    Cache whole responses to GET and HEAD requests for ``ttl`` seconds.
+
+    Entries are keyed by the method, the path, the query string and the
+    values of the request headers listed in ``vary_on`` (WSGI names such as
+    ``'HTTP_ACCEPT_LANGUAGE'``), and kept in ``backend``: a MemoryBackend by
+    default, or a FileBackend to share them between worker processes. Like
+    Django's ``learn_cache_key``, the request headers a response names in
+    its ``Vary`` header are added to the key: an entry without a status,
+    stored under the key without them, lists them for the next requests.
+    Only 200 responses with a body in memory, no cookies, no ``Vary: *``
+    and no ``Cache-Control: private``/``no-store`` are cached; they get an
+    ETag from their content when they have none. A request whose
+    ``If-None-Match`` matches gets a 304, straight from the cache when the
+    entry is there, without resolving its path.
+
+    Put it after CompressionMiddleware in ``mywsgi.middleware`` so the stored
+    bodies are uncompressed, or before it to store the compressed ones,
+    keyed by ``Accept-Encoding`` through the ``Vary`` header.
+    """
+
+    def __init__(self, ttl=60, vary_on=(), backend=None):
+        if ttl <= 0:
+            raise ImproperlyConfigured('The response cache TTL must be positive.')
+        self.ttl = ttl
+        self.vary_on = tuple(vary_on)
+        self.backend = backend if backend is not None else MemoryBackend()
+
+    def key(self, environ, varied=()):
+        parts = [environ.get('REQUEST_METHOD', 'GET'), environ['PATH_INFO'], environ.get('QUERY_STRING', '')]
+        parts.extend(environ.get(header, '') for header in self.vary_on)
+        parts.extend(environ.get(header, '') for header in varied)
+        return '\n'.join(parts)
+
+    def varied(self, vary):
+        """The environ keys of the headers in the ``Vary`` value ``vary`` that ``vary_on`` misses."""
+        return [key for key in vary_environ_keys(vary) if key not in self.vary_on]
+
+    def process_request(self, environ):
+        if environ.get('REQUEST_METHOD', 'GET') not in ('GET', 'HEAD'):
+            return None
+        key = self.key(environ)
+        entry = self.backend.get(key)
+        if entry is not None and entry.status is None:
+            # The responses vary on more request headers, listed by the entry.
+            entry = self.backend.get(self.key(environ, self.varied(entry.headers['vary'][1])))
+        if entry is None:
+            environ['mywsgi.cache.key'] = key
+            return None
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+            return self.not_modified(entry.etag)
+        return entry.response()
+
+    def process_response(self, environ, response):
+        key = environ.pop('mywsgi.cache.key', None)
+        if key is None or not self.cacheable(response):
+            return response
+        if not response.has_header('ETag'):
+            response['ETag'] = '"%s"' % hashlib.md5(response.content).hexdigest()
+        expires = time.time() + self.ttl
+        varied = self.varied(response.get('Vary', ''))
+        if varied:
+            self.backend.set(key, CacheEntry(None, None, {'vary': ('Vary', response['Vary'])}, b'', expires))
+            key = self.key(environ, varied)
+        self.backend.set(key, CacheEntry(response.status_code, response.reason_phrase, dict(response._headers),
+                                         response.content, expires))
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None and etag_matches(if_none_match, response['ETag']):
+            return self.not_modified(response['ETag'])
+        return response
+
+    def cacheable(self, response):
+        if response.status_code != 200 or response.streaming or response._cookies:
+            return False
+        if '*' in vary_environ_keys(response.get('Vary', '')):
+            return False
+        cache_control = response.get('Cache-Control', '').lower()
+        return 'private' not in cache_control and 'no-store' not in cache_control
+
+    def not_modified(self, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,96 @@
+import threading
+
+from project.cache import CacheEntry, vary_environ_keys
+
+
+class _Flight(object):
+    __slots__ = ('done', 'entry')
+
+    def __init__(self):
+        self.done = threading.Event()
+        # Set when the leader's response can be shared.
+        self.entry = None
+
+
+class CoalescingMiddleware(object):
+    """
+    Run a view once for concurrent identical requests.
+
+    GET and HEAD requests resolved to the same view with the same arguments,
+    query string and values of the ``vary_on`` request headers while one of
+    them is running wait for it and get a copy of its response instead of
+    running the view themselves. Only views in ``views`` are coalesced, or
+    every view when it is None: the response must not depend on anything
+    else in the request. Requests carrying credentials (a Cookie or
+    Authorization header not in ``vary_on``) are never coalesced, so one
+    user can't get a page made for another.
+
+    A waiting request gives up after ``timeout`` seconds and runs the view
+    itself, as it does when the first request raised or produced a response
+    that can't be shared: anything but a 200 with its body in memory, no
+    cookies and no ``Vary`` naming a header missing from ``vary_on``. ``counts`` tells how many requests ran the view (``leaders``),
+    got a shared response (``coalesced``), timed out or couldn't share.
+    """
+
+    # Request headers that make a response personal.
+    credentials = ('HTTP_COOKIE', 'HTTP_AUTHORIZATION')
+
+    def __init__(self, views=None, timeout=10.0, vary_on=()):
+        self.views = None if views is None else frozenset(views)
+        self.timeout = timeout
+        self.vary_on = tuple(vary_on)
+        self.counts = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'unshared': 0}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def process_view(self, environ, callback, args, kwargs):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        if method not in ('GET', 'HEAD') or (self.views is not None and callback not in self.views):
+            return None
+        for header in self.credentials:
+            if header not in self.vary_on and environ.get(header):
+                return None
+        key = (method, callback, args, tuple(sorted(kwargs.items())), environ.get('QUERY_STRING', ''),
+               tuple(environ.get(header) for header in self.vary_on))
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                self._flights[key] = _Flight()
+                self.counts['leaders'] += 1
+                environ['mywsgi.coalescing.key'] = key
+                return None
+        if not flight.done.wait(self.timeout):
+            self._count('timeouts')
+            return None
+        if flight.entry is None:
+            self._count('unshared')
+            return None
+        self._count('coalesced')
+        return flight.entry.response()
+
+    def process_response(self, environ, response):
+        self.land(environ, response)
+        return response
+
+    def process_exception(self, environ, exception):
+        self.land(environ, None)
+
+    def land(self, environ, response):
+        key = environ.pop('mywsgi.coalescing.key', None)
+        if key is None:
+            return
+        with self._lock:
+            flight = self._flights.pop(key)
+        if (response is not None and response.status_code == 200 and not response.streaming
+                and not response._cookies and self.shareable_vary(response.get('Vary', ''))):
+            flight.entry = CacheEntry(response.status_code, response.reason_phrase, dict(response._headers),
+                                      response.content, None)
+        flight.done.set()
+
+    def shareable_vary(self, vary):
+        """Whether every request header in the ``Vary`` value ``vary`` is part of the key."""
+        return all(key in self.vary_on for key in vary_environ_keys(vary))
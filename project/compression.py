@@ -0,0 +1,146 @@
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_compressible_type_re = re.compile(
+    r'^(text/|image/svg\+xml|application/(json|javascript|xml|xhtml\+xml|[a-z.-]+\+(json|xml))\b)', re.I)
+
+
+def accepted_codings(header):
+    """The content codings an ``Accept-Encoding`` header allows, lower-cased."""
+    codings = set()
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        codings.add(coding.strip().lower())
+    return codings
+
+
+def patch_vary_headers(response, newheaders):
+    """Add ``newheaders`` to the response's Vary header, keeping what is there."""
+    if response.has_header('Vary'):
+        vary_headers = [header.strip() for header in response['Vary'].split(',')]
+    else:
+        vary_headers = []
+    existing = set(header.lower() for header in vary_headers)
+    vary_headers.extend(header for header in newheaders if header.lower() not in existing)
+    response['Vary'] = ', '.join(vary_headers)
+
+
+class GzipStream(object):
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliStream(object):
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware(object):
+    """
+    Compress responses with gzip, or brotli when the ``brotli`` package is
+    installed and the client prefers it.
+
+    Bodies shorter than ``min_length``, responses that already have a
+    Content-Encoding, types that don't compress (images, archives...) and
+    file responses, which go out through sendfile, are left alone. Streaming
+    bodies are compressed as they are produced; the compressor is flushed
+    whenever ``buffer_size`` bytes went in without any output, so a slow
+    stream keeps moving and at most that much is held back.
+    """
+
+    def __init__(self, min_length=200, gzip_level=6, brotli_level=5, buffer_size=16 * 1024):
+        self.min_length = min_length
+        self.gzip_level = gzip_level
+        self.brotli_level = brotli_level
+        self.buffer_size = buffer_size
+
+    def choose(self, accept_encoding):
+        """The coding to use for a request with this ``Accept-Encoding``, or None."""
+        accepted = accepted_codings(accept_encoding)
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted or '*' in accepted:
+            return 'gzip'
+        return None
+
+    def stream_for(self, coding):
+        if coding == 'br':
+            return BrotliStream(self.brotli_level)
+        return GzipStream(self.gzip_level)
+
+    def process_response(self, environ, response):
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+        if response.has_header('Content-Encoding') or getattr(response, 'file_to_stream', None) is not None:
+            return response
+        if not _compressible_type_re.match(response.get('Content-Type', '')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = self.choose(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        stream = self.stream_for(coding)
+        if response.streaming:
+            del response['Content-Length']
+            response.streaming_content = self.compress_chunks(response.streaming_content, stream)
+        else:
+            content = response.content
+            compressed = stream.compress(content) + stream.finish()
+            # Return the original response if compression didn't pay off.
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The representation changed, so a strong validator no longer holds.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+    def compress_chunks(self, chunks, stream):
+        pending = 0
+        for chunk in chunks:
+            data = stream.compress(chunk)
+            pending += len(chunk)
+            if data:
+                pending = 0
+            elif pending >= self.buffer_size:
+                data = stream.flush()
+                pending = 0
+            if data:
+                yield data
+        yield stream.finish()
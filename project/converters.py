@@ -0,0 +1,83 @@
+import uuid
+
+from project.exceptions import ImproperlyConfigured
+
+_SLUG_CHARS = frozenset('-_abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+_HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+class Converter(object):
+    """
+    Converters turn one path segment into the value passed to the view.
+
+    ``to_python`` checks the segment without going through the regex engine
+    and raises ValueError when it doesn't match; ``regex`` describes the same
+    segments and is only used to check the arguments given to ``reverse``.
+    ``to_url`` turns a value back into a segment.
+    """
+
+    regex = '[^/]+'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return str(value)
+
+
+class StringConverter(Converter):
+
+    def to_python(self, value):
+        if not value:
+            raise ValueError('empty segment')
+        return value
+
+
+class IntConverter(Converter):
+    regex = '[0-9]+'
+
+    def to_python(self, value):
+        if not value.isdigit() or not value.isascii():
+            raise ValueError(value)
+        return int(value)
+
+
+class SlugConverter(Converter):
+    regex = '[-a-zA-Z0-9_]+'
+
+    def to_python(self, value):
+        if not value or not _SLUG_CHARS.issuperset(value):
+            raise ValueError(value)
+        return value
+
+
+class UUIDConverter(Converter):
+    regex = '[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+
+    def to_python(self, value):
+        if (len(value) != 36 or value[8] != '-' or value[13] != '-' or value[18] != '-' or value[23] != '-'
+                or not _HEX_DIGITS.issuperset(value.replace('-', '')) or value.count('-') != 4):
+            raise ValueError(value)
+        return uuid.UUID(value)
+
+
+DEFAULT_CONVERTERS = {
+    'int': IntConverter(),
+    'slug': SlugConverter(),
+    'str': StringConverter(),
+    'uuid': UUIDConverter(),
+}
+
+_converters = dict(DEFAULT_CONVERTERS)
+
+
+def register_converter(converter, type_name):
+    """Make ``converter`` (a Converter subclass) available to routes as ``<type_name:name>``."""
+    _converters[type_name] = converter()
+
+
+def get_converter(raw_converter):
+    try:
+        return _converters[raw_converter]
+    except KeyError:
+        raise ImproperlyConfigured('Unknown path converter "%s".' % raw_converter)
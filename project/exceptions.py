@@ -1,6 +1,9 @@
 class Http404(Exception):
     pass
 
+class NoReverseMatch(Exception):
+    pass
+
 class ImproperlyConfigured(Exception):
     """Django is somehow improperly configured"""
     pass
@@ -0,0 +1,148 @@
+import bisect
+import threading
+import weakref
+from time import perf_counter
+
+from project.resolvers import ResolveTrace
+from project.response import HttpResponse
+
+# Seconds, from 50us to 10s.
+TIME_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shard(object):
+    # Owned by one thread; dropped with the thread's local storage.
+    __slots__ = ('counts', '__weakref__')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+
+
+class Histogram(object):
+    """
+    A Prometheus histogram whose counts are kept per thread.
+
+    Every thread updates its own list of bucket counts, so ``observe`` takes
+    no lock; a lock is only taken the first time a thread observes something
+    and when a thread goes away and its counts are folded into the totals.
+    ``snapshot`` adds the lists up; a scrape may miss observations made while
+    it runs, which is fine for metrics.
+    """
+
+    def __init__(self, name, documentation, buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # One count per bucket, one for +Inf, then the sum.
+        self._size = len(self.buckets) + 2
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # id() of each live thread's counts -> counts.
+        self._shards = {}
+        self._retired = [0] * self._size
+
+    def observe(self, value):
+        try:
+            counts = self._local.shard.counts
+        except AttributeError:
+            counts = self._add_shard().counts
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _add_shard(self):
+        shard = self._local.shard = _Shard(self._size)
+        counts = shard.counts
+        with self._lock:
+            self._shards[id(counts)] = counts
+        weakref.finalize(shard, self._retire, counts)
+        return shard
+
+    def _retire(self, counts):
+        with self._lock:
+            del self._shards[id(counts)]
+            for position, value in enumerate(counts):
+                self._retired[position] += value
+
+    def snapshot(self):
+        """Return ``(cumulative bucket counts, count, sum)``; the last bucket is +Inf."""
+        with self._lock:
+            totals = list(self._retired)
+            for counts in self._shards.values():
+                for position, value in enumerate(counts):
+                    totals[position] += value
+        cumulative = []
+        running = 0
+        for value in totals[:-1]:
+            running += value
+            cumulative.append(running)
+        return cumulative, running, totals[-1]
+
+    def render(self):
+        cumulative, count, total = self.snapshot()
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s histogram' % self.name]
+        for bound, value in zip(self.buckets, cumulative):
+            lines.append('%s_bucket{le="%s"} %d' % (self.name, _format(bound), value))
+        lines.append('%s_bucket{le="+Inf"} %d' % (self.name, count))
+        lines.append('%s_sum %s' % (self.name, _format(total)))
+        lines.append('%s_count %d' % (self.name, count))
+        return '\n'.join(lines)
+
+
+def _format(value):
+    return repr(float(value))
+
+
+class Metrics(object):
+    """
+    Timers for the stages of a request: parsing it, resolving its path (with
+    the number of patterns tried and the include() depth reached), running
+    the view and writing the response.
+
+    Set ``mywsgi.metrics`` to an instance to collect them. Added to
+    ``mywsgi.middleware``, it also answers ``path`` with the histograms in
+    the Prometheus text format.
+    """
+
+    path = '/__metrics__'
+
+    def __init__(self, prefix='mywsgi'):
+        self.parse = Histogram(prefix + '_parse_seconds', 'Time spent parsing the request line and headers.')
+        self.resolve = Histogram(prefix + '_resolve_seconds', 'Time spent resolving the request path.')
+        self.patterns_tried = Histogram(prefix + '_resolve_patterns_tried',
+                                        'URL patterns tried to resolve a path.',
+                                        buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, 256))
+        self.resolve_depth = Histogram(prefix + '_resolve_depth',
+                                       'include() levels descended to resolve a path.',
+                                       buckets=(0, 1, 2, 3, 4, 6, 8))
+        self.view = Histogram(prefix + '_view_seconds', 'Time spent in the view.')
+        self.write = Histogram(prefix + '_write_seconds', 'Time spent serializing and writing the response.')
+
+    def histograms(self):
+        return [self.parse, self.resolve, self.patterns_tried, self.resolve_depth, self.view, self.write]
+
+    def resolve_path(self, resolver, cache, path):
+        trace = ResolveTrace()
+        started = perf_counter()
+        if cache is not None:
+            resolved = cache.resolve(resolver, path, trace)
+        else:
+            resolved = resolver.resolve(path, trace)
+        self.resolve.observe(perf_counter() - started)
+        self.patterns_tried.observe(trace.tried)
+        self.resolve_depth.observe(trace.depth)
+        return resolved
+
+    def call_view(self, callback, request, args, kwargs):
+        started = perf_counter()
+        try:
+            return callback(request, *args, **kwargs)
+        finally:
+            self.view.observe(perf_counter() - started)
+
+    def render(self):
+        return '\n'.join(histogram.render() for histogram in self.histograms()) + '\n'
+
+    def process_request(self, environ):
+        if environ['PATH_INFO'] == self.path:
+            return HttpResponse(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,29 +1,60 @@
 import re
 
 from project.urlsconf import url_patterns
+from project.request import HttpRequest
 from project.response import HttpResponseNotFound, HttpResponseServerError
 from project.exceptions import Http404
+from project.resolvers import get_resolver
+
+# Set to a project.resolvers.ResolveCache to memoize path resolution.
+resolve_cache = None
+# Set to a project.metrics.Metrics to time resolution and views.
+metrics = None
+# Middleware instances, outermost first. See build_handler() for the hooks.
+middleware = []
+_handler = None
 
 
 def application(environ, start_response):
 
     try:
-        response = path_to_response(environ)
-    except Http404:
-        response = HttpResponseNotFound('<p style="color:red;">path not found error</p>')
-    except Exception:
-        response = HttpResponseServerError('error occur in server')
+        if middleware:
+            response = get_handler(middleware)(environ)
+        else:
+            response = path_to_response(environ)
+    except Exception as e:
+        response = response_for_exception(e)
 
-    status = '%s %s' % (response.status_code, response.reason_phrase)
-    response_headers = [(str(k), str(v)) for k, v in response.items()]
-    for c in response.cookies.values():
-        response_headers.append((str('Set-Cookie'), str(c.output(header=''))))
+    file_to_stream = getattr(response, 'file_to_stream', None)
+    if file_to_stream is not None:
+        response.apply_range(environ.get('HTTP_RANGE'))
+
+    status, response_headers = status_and_headers(response)
     start_response(status, response_headers)
+    if file_to_stream is not None and environ.get('wsgi.file_wrapper'):
+        return environ['wsgi.file_wrapper'](response.region, response.block_size)
     return response
 
+
+def response_for_exception(exc):
+    if isinstance(exc, Http404):
+        return HttpResponseNotFound('<p style="color:red;">path not found error</p>')
+    return HttpResponseServerError('error occur in server')
+
+
+def status_and_headers(response):
+    """The WSGI status line and header list for ``response``."""
+    if not response.streaming and not response.has_header('Content-Length') and response.status_code != 304:
+        # Lets the server keep the connection open without chunking.
+        response['Content-Length'] = str(len(response.content))
+
+    status = '%s %s' % (response.status_code, response.reason_phrase)
+    return status, response.wsgi_headers()
+
 # first_pattern = re.compile(r'/')
 
-def path_to_response(environ):
+def resolve_path(environ):
+    """Return ``(callback, args, kwargs)`` for the request path, or raise Http404."""
 
     path = environ['PATH_INFO']
     # match = path[1:]
@@ -32,20 +63,116 @@ def path_to_response(environ):
     # callback = None
     # args = None
     # kwargs = None
-    for pattern_object in url_patterns:
-        # compiled_regex = re.compile(pattern, re.UNICODE)
-        # match = pattern_object.regex.search(path)
-        # if match:
-        #     kwargs = match.groupdict()
-        #     args = () if kwargs else match.groups()
-        #     return pattern_object.callback(environ, *args, **kwargs)
-        obj = pattern_object.resolve(new_path)
-        if obj:
-            callback, args, kwargs = obj
-            return callback(environ, *args, **kwargs)
+    resolver = get_resolver(url_patterns)
+    if metrics is not None:
+        obj = metrics.resolve_path(resolver, resolve_cache, new_path)
+    elif resolve_cache is not None:
+        obj = resolve_cache.resolve(resolver, new_path)
+    else:
+        obj = resolver.resolve(new_path)
+    if obj:
+        return obj
 
     raise Http404
 
 
+def _call_view(environ, callback, args, kwargs):
+    if metrics is not None:
+        return metrics.call_view(callback, HttpRequest(environ), args, kwargs)
+    return callback(HttpRequest(environ), *args, **kwargs)
+
+
+def path_to_response(environ):
+    return _call_view(environ, *resolve_path(environ))
+
+
+def build_handler(middleware, call_view=_call_view):
+    """
+    Compose ``middleware`` into one function taking ``environ`` and returning
+    the response. The hooks a middleware has are looked up here, once, so a
+    request makes a fixed number of calls. Each of them is optional:
+
+    - ``process_request(environ)`` runs before the inner middleware; a
+      response returned from it is used instead of resolving the path.
+    - ``process_view(environ, callback, args, kwargs)`` runs after the path
+      is resolved, in list order; a response skips the view.
+    - ``process_exception(environ, exception)`` sees exceptions raised
+      further in (inner middleware, resolution, the view), innermost first;
+      a response replaces the exception, None lets it propagate.
+    - ``process_response(environ, response)`` gets every response coming out
+      of the middleware, including the one from its own process_request,
+      and returns the response to use.
+
+    ``call_view`` calls the resolved view; servers can pass their own.
+    """
+    for obj in reversed(middleware):
+        process_view = getattr(obj, 'process_view', None)
+        if process_view is not None:
+            call_view = _view_layer(process_view, call_view)
+    if call_view is _call_view:
+        handler = path_to_response
+    else:
+        handler = _resolve_layer(call_view)
+    for obj in reversed(middleware):
+        process_exception = getattr(obj, 'process_exception', None)
+        if process_exception is not None:
+            handler = _exception_layer(process_exception, handler)
+        process_request = getattr(obj, 'process_request', None)
+        if process_request is not None:
+            handler = _request_layer(process_request, handler)
+        process_response = getattr(obj, 'process_response', None)
+        if process_response is not None:
+            handler = _response_layer(process_response, handler)
+    return handler
+
+
+def get_handler(middleware):
+    """Return the handler composed from ``middleware``, rebuilding it if the list was swapped."""
+    global _handler
+    composed = _handler
+    if composed is None or composed[0] is not middleware:
+        composed = _handler = (middleware, build_handler(middleware))
+    return composed[1]
+
+
+def _resolve_layer(call_view):
+    def handler(environ):
+        callback, args, kwargs = resolve_path(environ)
+        return call_view(environ, callback, args, kwargs)
+    return handler
+
+
+def _view_layer(process_view, call_view):
+    def layer(environ, callback, args, kwargs):
+        response = process_view(environ, callback, args, kwargs)
+        if response is None:
+            response = call_view(environ, callback, args, kwargs)
+        return response
+    return layer
+
+
+def _request_layer(process_request, handler):
+    def layer(environ):
+        response = process_request(environ)
+        if response is None:
+            response = handler(environ)
+        return response
+    return layer
+
+
+def _response_layer(process_response, handler):
+    def layer(environ):
+        return process_response(environ, handler(environ))
+    return layer
 
 
+def _exception_layer(process_exception, handler):
+    def layer(environ):
+        try:
+            return handler(environ)
+        except Exception as e:
+            response = process_exception(environ, e)
+            if response is None:
+                raise
+            return response
+    return layer
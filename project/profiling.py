@@ -0,0 +1,195 @@
+import cProfile
+import collections
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from project.exceptions import ImproperlyConfigured
+
+_unsafe_chars_re = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class _Watch(object):
+    __slots__ = ('started', 'samples')
+
+    def __init__(self, started):
+        self.started = started
+        self.samples = collections.Counter()
+
+
+def _stack(frame, limit=64):
+    """The call stack of ``frame`` as ``function (file:line)`` strings, outermost first."""
+    stack = []
+    while frame is not None and len(stack) < limit:
+        code = frame.f_code
+        stack.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class StackSampler(object):
+    """
+    A background thread that samples the stacks of the threads being
+    watched, once they have been running a request for ``threshold``
+    seconds, every ``interval`` seconds. Fast requests are never sampled.
+    """
+
+    def __init__(self, threshold, interval):
+        self.threshold = threshold
+        self.interval = interval
+        self.watched = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def watch(self, ident):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self.run, name='stack-sampler')
+                    self._thread.daemon = True
+                    self._thread.start()
+        watch = self.watched[ident] = _Watch(time.perf_counter())
+        return watch
+
+    def unwatch(self, ident):
+        return self.watched.pop(ident, None)
+
+    def sample(self):
+        now = time.perf_counter()
+        frames = None
+        for ident, watch in list(self.watched.items()):
+            if now - watch.started < self.threshold:
+                continue
+            if frames is None:
+                frames = sys._current_frames()
+            frame = frames.get(ident)
+            if frame is not None:
+                watch.samples[_stack(frame)] += 1
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
+
+class ProfilingMiddleware(object):
+    """
+    Profile selected requests and write the profiles to ``directory``.
+
+    A request is profiled with cProfile when its ``header`` equals
+    ``token`` or when it is picked at random with probability ``rate``.
+    Profiling slows the server down, so the header needs a ``token``;
+    ``header=None`` turns header triggering off. With a ``threshold`` (seconds), every other request
+    is watched by a ``StackSampler``: nothing happens unless it is still
+    running after ``threshold``, then its stack is sampled every
+    ``interval`` until it ends and written out in the folded format that
+    flame graph tools read.
+
+    Each profile (``.prof`` for pstats, ``.folded`` for samples) comes with a
+    ``.json`` file naming the path, the resolved view and its arguments,
+    the status (or the exception raised) and the duration. Only the newest
+    ``keep`` profiles are kept. Requests that aren't profiled cost a dict
+    lookup, plus a dict insert and delete when a threshold is set.
+
+    Add it last to ``mywsgi.middleware`` so that it covers resolving the path
+    and running the view rather than the other middleware.
+    """
+
+    def __init__(self, directory, header='X-Profile', token=None, rate=0.0, threshold=None,
+                 interval=0.005, keep=50):
+        if header is not None and not token:
+            raise ImproperlyConfigured('Profiling on the %s header requires a token.' % header)
+        self.directory = directory
+        self.environ_key = 'HTTP_' + header.upper().replace('-', '_') if header is not None else None
+        self.token = token
+        self.rate = rate
+        self.keep = keep
+        self.sampler = StackSampler(threshold, interval) if threshold is not None else None
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def wanted(self, environ):
+        if self.environ_key is not None and environ.get(self.environ_key) == self.token:
+            return True
+        return self.rate > 0 and random.random() < self.rate
+
+    def process_request(self, environ):
+        if self.wanted(environ):
+            profiler = cProfile.Profile()
+            environ['mywsgi.profile'] = (time.perf_counter(), profiler)
+            profiler.enable()
+        elif self.sampler is not None:
+            ident = threading.get_ident()
+            environ['mywsgi.profile'] = (self.sampler.watch(ident).started, ident)
+
+    def process_view(self, environ, callback, args, kwargs):
+        if 'mywsgi.profile' in environ:
+            environ['mywsgi.profile.route'] = {
+                'view': '%s.%s' % (callback.__module__, getattr(callback, '__qualname__', callback.__name__)),
+                'args': [str(arg) for arg in args],
+                'kwargs': dict((key, str(value)) for key, value in kwargs.items()),
+            }
+
+    def process_response(self, environ, response):
+        self.finish(environ, response.status_code)
+        return response
+
+    def process_exception(self, environ, exception):
+        self.finish(environ, type(exception).__name__)
+
+    def finish(self, environ, status):
+        profile = environ.pop('mywsgi.profile', None)
+        if profile is None:
+            return
+        started, profiler = profile
+        duration = time.perf_counter() - started
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            self.save(environ, status, duration, 'prof', profiler.dump_stats)
+        else:
+            watch = self.sampler.unwatch(profiler)
+            if watch is not None and watch.samples:
+                def dump(path):
+                    with open(path, 'w') as f:
+                        for stack, count in watch.samples.most_common():
+                            f.write('%s %d\n' % (';'.join(stack), count))
+                self.save(environ, status, duration, 'folded', dump, sum(watch.samples.values()))
+
+    def save(self, environ, status, duration, kind, dump, samples=None):
+        path = environ.get('PATH_INFO', '')
+        stem = '%s-%d-%06d-%s' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(self._counter) % 1000000,
+                                  _unsafe_chars_re.sub('_', path.strip('/'))[:60] or 'root')
+        base = os.path.join(self.directory, stem)
+        dump(base + '.' + kind)
+        meta = {
+            'method': environ.get('REQUEST_METHOD', 'GET'),
+            'path': path,
+            'query': environ.get('QUERY_STRING', ''),
+            'route': environ.pop('mywsgi.profile.route', None),
+            'status': status,
+            'duration': round(duration, 6),
+            'profile': stem + '.' + kind,
+        }
+        if samples is not None:
+            meta['samples'] = samples
+        with open(base + '.json', 'w') as f:
+            json.dump(meta, f, indent=2, sort_keys=True)
+        self.rotate()
+
+    def rotate(self):
+        with self._lock:
+            stems = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+            for stem in stems[:-self.keep] if len(stems) > self.keep else ():
+                for suffix in ('.json', '.prof', '.folded'):
+                    try:
+                        os.remove(os.path.join(self.directory, stem + suffix))
+                    except OSError:
+                        pass
@@ -0,0 +1,189 @@
+import io
+from urllib.parse import parse_qsl
+
+from django.utils.datastructures import MultiValueDict
+
+
+class RawPostDataException(Exception):
+    """
+    You cannot access the body after reading from the request's data
+    stream: it has been consumed.
+    """
+    pass
+
+
+def parse_cookie(cookie):
+    """Return a dictionary parsed from a ``Cookie:`` header string."""
+    cookies = {}
+    for chunk in cookie.split(';'):
+        if '=' in chunk:
+            key, value = chunk.split('=', 1)
+        else:
+            # Assume an empty name per https://bugzilla.mozilla.org/show_bug.cgi?id=169091
+            key, value = '', chunk
+        key, value = key.strip(), value.strip()
+        if key or value:
+            if len(value) > 1 and value[0] == value[-1] == '"':
+                value = value[1:-1]
+            cookies[key] = value
+    return cookies
+
+
+class HttpHeaders(object):
+    """The request headers of a WSGI environ, looked up without regard to case."""
+
+    __slots__ = ('_headers',)
+
+    def __init__(self, environ):
+        headers = {}
+        for key, value in environ.items():
+            if key.startswith('HTTP_'):
+                headers[key[5:].replace('_', '-').lower()] = value
+            elif key in ('CONTENT_TYPE', 'CONTENT_LENGTH') and value:
+                headers[key.replace('_', '-').lower()] = value
+        self._headers = headers
+
+    def __getitem__(self, name):
+        return self._headers[name.lower()]
+
+    def __contains__(self, name):
+        return name.lower() in self._headers
+
+    def __len__(self):
+        return len(self._headers)
+
+    def get(self, name, default=None):
+        return self._headers.get(name.lower(), default)
+
+    def items(self):
+        return ((name.title(), value) for name, value in self._headers.items())
+
+
+class HttpRequest(object):
+    """
+    The request passed to views, wrapping the WSGI environ.
+
+    Nothing is parsed up front: ``GET``, ``COOKIES``, ``headers`` and
+    ``body`` are built the first time they are used and kept, so a view pays
+    only for what it reads. ``read()`` and ``readline()`` stream the body
+    from ``wsgi.input`` without holding it in memory, up to the
+    Content-Length. Indexing the request looks the environ up, which keeps
+    views written against the environ working.
+    """
+
+    __slots__ = ('environ', '_get', '_cookies', '_headers', '_body', '_stream', '_read_started')
+
+    def __init__(self, environ):
+        self.environ = environ
+        self._get = None
+        self._cookies = None
+        self._headers = None
+        self._body = None
+        self._stream = None
+        self._read_started = False
+
+    def __repr__(self):
+        return '<%s: %s %r>' % (self.__class__.__name__, self.method, self.get_full_path())
+
+    def __getitem__(self, key):
+        return self.environ[key]
+
+    def __contains__(self, key):
+        return key in self.environ
+
+    def get(self, key, default=None):
+        return self.environ.get(key, default)
+
+    @property
+    def path(self):
+        return self.environ.get('PATH_INFO', '/')
+
+    @property
+    def method(self):
+        return self.environ.get('REQUEST_METHOD', 'GET').upper()
+
+    def get_full_path(self):
+        query_string = self.environ.get('QUERY_STRING', '')
+        return self.path + ('?' + query_string if query_string else '')
+
+    @property
+    def GET(self):
+        if self._get is None:
+            values = MultiValueDict()
+            for key, value in parse_qsl(self.environ.get('QUERY_STRING', ''), keep_blank_values=True):
+                values.appendlist(key, value)
+            self._get = values
+        return self._get
+
+    @property
+    def COOKIES(self):
+        if self._cookies is None:
+            self._cookies = parse_cookie(self.environ.get('HTTP_COOKIE', ''))
+        return self._cookies
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            self._headers = HttpHeaders(self.environ)
+        return self._headers
+
+    @property
+    def content_length(self):
+        try:
+            return max(int(self.environ.get('CONTENT_LENGTH') or 0), 0)
+        except ValueError:
+            return 0
+
+    @property
+    def body(self):
+        if self._body is None:
+            if self._read_started:
+                raise RawPostDataException("You cannot access body after reading from request's data stream")
+            self._body = self.read()
+            self._stream = io.BytesIO(self._body)
+            self._read_started = False
+        return self._body
+
+    def _get_stream(self):
+        if self._stream is None:
+            self._stream = LimitedStream(self.environ.get('wsgi.input') or io.BytesIO(), self.content_length)
+        return self._stream
+
+    def read(self, size=-1):
+        self._read_started = True
+        return self._get_stream().read(size)
+
+    def readline(self, size=-1):
+        self._read_started = True
+        return self._get_stream().readline(size)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+class LimitedStream(object):
+    """Read at most ``limit`` bytes of ``stream``, so a read never waits for bytes the client won't send."""
+
+    __slots__ = ('stream', 'remaining')
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.remaining = limit
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if not size:
+            return b''
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if not size:
+            return b''
+        line = self.stream.readline(size)
+        self.remaining -= len(line)
+        return line
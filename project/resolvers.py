@@ -0,0 +1,1099 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+from project import urlsconf
+from project.exceptions import ImproperlyConfigured, NoReverseMatch
+from project.urlsconf import (LazyURLPatterns, RegexURLPattern, RegexURLPatternList, RoutePattern,
+                             RoutePatternList, load_all)
+
+try:
+    re.compile('(?>a)')
+except re.error:
+    # Atomic groups arrived in Python 3.11. Without them an include() prefix
+    # can't be glued to its sub patterns with the same backtracking
+    # behaviour, so include() trees are resolved level by level instead.
+    _ATOMIC_GROUPS = False
+else:
+    _ATOMIC_GROUPS = True
+
+
+class _RegexInfo(object):
+    __slots__ = ('renamed', 'top_level_bar', 'inner_anchor', 'lookbehind')
+
+    def __init__(self, renamed, top_level_bar, inner_anchor, lookbehind):
+        # The regex with named groups renamed, None if it can't be embedded
+        # in a bigger regex (backreferences, conditionals, global flags).
+        self.renamed = renamed
+        self.top_level_bar = top_level_bar
+        self.inner_anchor = inner_anchor
+        self.lookbehind = lookbehind
+
+
+def _inspect(regex, prefix='_'):
+    """
+    Scan ``regex`` for the constructs that decide whether it can be moved
+    into a combined or composed regex, renaming every named group to
+    ``prefix`` + index on the way.
+    """
+    out = []
+    i, n = 0, len(regex)
+    in_class = False
+    renamed = 0
+    depth = 0
+    movable = True
+    top_level_bar = inner_anchor = lookbehind = False
+    while i < n:
+        char = regex[i]
+        if char == '\\':
+            if not in_class and i + 1 < n:
+                if regex[i + 1] in '123456789':
+                    movable = False
+                elif regex[i + 1] == 'A' and i > 0:
+                    inner_anchor = True
+                elif regex[i + 1] in 'bB':
+                    # A word boundary looks at the character before it, which
+                    # is the prefix's once the regex is glued after one.
+                    lookbehind = True
+            out.append(regex[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            if char == ']':
+                in_class = False
+            out.append(char)
+            i += 1
+            continue
+        if char == '[':
+            # A ']' right after '[' or '[^' is a literal, not the class end.
+            end = i + 1
+            if regex[end:end + 1] == '^':
+                end += 1
+            if regex[end:end + 1] == ']':
+                end += 1
+            out.append(regex[i:end])
+            in_class = True
+            i = end
+            continue
+        if char == '(':
+            depth += 1
+            if regex[i + 1:i + 2] == '?':
+                if regex.startswith('(?P<', i):
+                    close = regex.index('>', i)
+                    out.append('(?P<%s%d>' % (prefix, renamed))
+                    renamed += 1
+                    i = close + 1
+                    continue
+                if regex.startswith('(?P=', i) or regex.startswith('(?(', i):
+                    movable = False
+                elif regex.startswith('(?<=', i) or regex.startswith('(?<!', i):
+                    lookbehind = True
+                elif re.match(r'\(\?[aiLmsux]+\)', regex[i:]):
+                    movable = False
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            top_level_bar = True
+        elif char == '^' and i > 0:
+            inner_anchor = True
+        out.append(char)
+        i += 1
+    return _RegexInfo(''.join(out) if movable else None, top_level_bar, inner_anchor, lookbehind)
+
+
+def _rename_groups(regex, prefix):
+    """
+    Return ``regex`` with every named group renamed to ``prefix`` + index so
+    that several patterns can share one compiled alternation, or None when
+    the regex uses a construct that can't be moved into a bigger regex
+    unchanged: backreferences (their group numbers and names shift),
+    conditionals and global inline flags.
+    """
+    return _inspect(regex, prefix).renamed
+
+
+def _anchor(regex):
+    if regex.startswith('^'):
+        return '^'
+    if regex.startswith('\\A'):
+        return '\\A'
+    return ''
+
+
+def _scan_literal(regex):
+    """
+    Return ``(prefix, complete)``: the literal text every match of the
+    anchored ``regex`` starts with, and whether the regex is nothing but
+    that literal.
+    """
+    anchor = _anchor(regex)
+    if not anchor or _inspect(regex).top_level_bar:
+        return '', False
+    prefix = []
+    i, n = len(anchor), len(regex)
+    while i < n:
+        char = regex[i]
+        if char == '\\':
+            escaped = regex[i + 1:i + 2]
+            if not escaped or escaped.isalnum() or escaped == '_':
+                break
+            prefix.append(escaped)
+            i += 2
+        elif char in '.^$*+?{}[]|()':
+            break
+        else:
+            prefix.append(char)
+            i += 1
+        if regex[i:i + 1] in ('?', '*', '{'):
+            # The last literal is optional or repeated a variable number
+            # of times, so it isn't part of every match.
+            prefix.pop()
+            return ''.join(prefix), False
+    return ''.join(prefix), i == n
+
+
+def _literal_prefix(regex):
+    """
+    Return the literal text every match of the anchored ``regex`` starts
+    with: ``'path'`` for ``'^path([1,2])$'``, ``''`` when there is none.
+    """
+    return _scan_literal(regex)[0]
+
+
+def _group_end(regex, start):
+    """Return the index just past the group opened at ``regex[start]``, and whether it has subgroups."""
+    depth = 0
+    i, n = start, len(regex)
+    in_class = False
+    capturing = False
+    while i < n:
+        char = regex[i]
+        if char == '\\':
+            i += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+            if regex[i + 1:i + 2] == '^':
+                i += 1
+            if regex[i + 1:i + 2] == ']':
+                i += 1
+        elif char == '(':
+            if depth and (regex[i + 1:i + 2] != '?' or regex.startswith('(?P<', i)):
+                capturing = True
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if not depth:
+                return i + 1, capturing
+        i += 1
+    return n, capturing
+
+
+def _reverse_template(regex, offset=0):
+    """
+    Turn an url regex made of literals and capturing groups into a
+    ``%``-format template and the list of ``(name, group regex)`` it needs,
+    e.g. ``'^path([1,2])$'`` into ``('path%(_0)s', [(None, '[1,2]')])``.
+    Placeholders are numbered from ``offset``.
+
+    Returns None for regexes that can't be reversed that way (quantified
+    literals, character classes outside groups, alternation, ...).
+    """
+    anchor = _anchor(regex)
+    i, n = len(anchor), len(regex)
+    if regex.endswith('\\Z'):
+        n -= 2
+    elif regex.endswith('$') and not regex.endswith('\\$'):
+        n -= 1
+    template = []
+    params = []
+    while i < n:
+        char = regex[i]
+        if char == '\\':
+            escaped = regex[i + 1:i + 2]
+            if not escaped or escaped.isalnum() or escaped == '_':
+                return None
+            template.append(escaped.replace('%', '%%'))
+            i += 2
+        elif char == '(':
+            end, nested = _group_end(regex, i)
+            if end > n or nested:
+                return None
+            if regex.startswith('(?P<', i):
+                close = regex.index('>', i)
+                name, inner = regex[i + 4:close], regex[close + 1:end - 1]
+            elif regex[i + 1:i + 2] == '?':
+                return None
+            else:
+                name, inner = None, regex[i + 1:end - 1]
+            template.append('%%(_%d)s' % (offset + len(params)))
+            params.append((name, inner))
+            i = end
+        elif char in '.^$*+?{}[]|)':
+            return None
+        else:
+            template.append(char.replace('%', '%%'))
+            i += 1
+        if regex[i:i + 1] in ('?', '*', '+', '{'):
+            return None
+    return ''.join(template), params
+
+
+class _Reversal(object):
+    """
+    A reversible route: its template and the regex each argument must
+    match. ``params`` holds a group regex per argument of a regex route, the
+    converter of a ``path()`` route, which turns the value into the segment.
+    """
+
+    __slots__ = ('template', 'names', 'converters', 'checks')
+
+    def __init__(self, template, params):
+        self.template = template
+        self.names = [name for name, inner in params]
+        self.converters = [None if inner.__class__ is str else inner for name, inner in params]
+        self.checks = [re.compile(inner if converter is None else converter.regex, re.UNICODE)
+                       for (name, inner), converter in zip(params, self.converters)]
+
+    def fill(self, args, kwargs):
+        if kwargs:
+            if None in self.names or set(kwargs) != set(self.names):
+                return None
+            args = [kwargs[name] for name in self.names]
+        elif len(args) != len(self.names):
+            return None
+        values = {}
+        for number, (value, converter, check) in enumerate(zip(args, self.converters, self.checks)):
+            if converter is None:
+                value = str(value)
+            else:
+                try:
+                    value = converter.to_url(value)
+                except ValueError:
+                    return None
+            if not check.fullmatch(value):
+                return None
+            values['_%d' % number] = value
+        return '/' + quote(self.template % values, safe="/~:@!$&'()*+,;=")
+
+
+def _route_template(segments, offset=0):
+    """The ``%``-format template and ``(name, converter)`` list of ``path()`` route segments."""
+    template = []
+    params = []
+    for segment in segments:
+        if segment.__class__ is str:
+            template.append(segment.replace('%', '%%'))
+        else:
+            name, converter = segment
+            template.append('%%(_%d)s' % (offset + len(params)))
+            params.append((name, converter))
+    return '/'.join(template), params
+
+
+def _build_reverse_index(patterns, index, template, params):
+    for pattern in patterns:
+        if isinstance(pattern, (RoutePattern, RoutePatternList)):
+            sub_template, sub_params = _route_template(pattern.segments, len(params))
+            if isinstance(pattern, RoutePatternList):
+                if pattern.segments:
+                    sub_template += '/'
+                _build_reverse_index(pattern.patterns, index, template + sub_template, params + sub_params)
+            elif pattern.name is not None:
+                index.setdefault(pattern.name, []).append(
+                    _Reversal(template + sub_template, params + sub_params))
+            continue
+        if not isinstance(pattern, (RegexURLPattern, RegexURLPatternList)):
+            continue
+        reversed_regex = _reverse_template(pattern._regex, len(params))
+        if reversed_regex is None:
+            continue
+        sub_template, sub_params = reversed_regex
+        if isinstance(pattern, RegexURLPatternList):
+            _build_reverse_index(pattern.patterns, index, template + sub_template, params + sub_params)
+        elif pattern.name is not None:
+            index.setdefault(pattern.name, []).append(
+                _Reversal(template + sub_template, params + sub_params))
+    return index
+
+
+def _groups(match, numbers):
+    if len(numbers) > 1:
+        return match.group(*numbers)
+    if numbers:
+        return (match.group(numbers[0]),)
+    return ()
+
+
+def _kwargs(match, names, numbers):
+    if len(numbers) > 1:
+        return dict(zip(names, match.group(*numbers)))
+    if numbers:
+        return {names[0]: match.group(numbers[0])}
+    return {}
+
+
+class _Route(object):
+    """
+    One row of a resolver's flattened route table.
+
+    A row is either a view (``callback``), an include() that couldn't be
+    flattened and is resolved level by level (``include``), or a pattern of
+    a type the resolver doesn't know, which keeps its own ``resolve``
+    (``pattern``). ``positional`` and ``named`` are the group numbers that
+    make up the args and kwargs of a match, computed once when the table is
+    built. Of the args of an include() row, only the first ``kept`` stay
+    when its sub patterns give kwargs: those of the outermost prefix, as
+    resolving level by level would.
+    """
+
+    def __init__(self, anchor, body, positional, named, prefix, literal, origin, callback=None,
+                 include=None, pattern=None, compiled=None, combinable=None, nestable=None, kept=None):
+        self.anchor = anchor
+        self.body = body
+        self.positional = positional
+        self.kept = len(positional) if kept is None else kept
+        self.named = named
+        self.prefix = prefix
+        self.literal = literal
+        # Index path of the pattern that owns the callback, from the top of
+        # the resolver's pattern list down through include() levels.
+        self.origin = origin
+        self.callback = callback
+        self.include = include
+        self.pattern = pattern
+        self._compiled = compiled
+        self._resolver = None
+        if combinable is not None:
+            self.combinable, self.nestable = combinable, nestable
+        elif pattern is None:
+            info = _inspect(anchor + body)
+            # A top level '|' leaves the branches after it unanchored, so the
+            # regex can't be matched at the start of the path only.
+            self.combinable = bool(anchor) and info.renamed is not None and not info.top_level_bar
+            # Whether the row can be glued after an include() prefix.
+            self.nestable = self.combinable and not info.inner_anchor and not info.lookbehind
+        else:
+            self.combinable = self.nestable = False
+
+    @classmethod
+    def from_pattern(cls, pattern, origin):
+        if isinstance(pattern, RoutePattern):
+            prefix = pattern.literal_prefix
+            return cls('', '', (), (), prefix, False, origin, pattern=pattern)
+        if not isinstance(pattern, (RegexURLPattern, RegexURLPatternList)):
+            return cls('', '', (), (), '', False, origin, pattern=pattern)
+        # Compiling here also reports invalid regexes as ImproperlyConfigured.
+        compiled = pattern.regex
+        anchor = _anchor(pattern._regex)
+        named = tuple(compiled.groupindex.items())
+        positional = tuple(range(1, compiled.groups + 1))
+        prefix, literal = _scan_literal(pattern._regex)
+        if isinstance(pattern, RegexURLPattern):
+            return cls(anchor, pattern._regex[len(anchor):], () if named else positional, named,
+                       prefix, literal, origin, callback=pattern.callback, compiled=compiled)
+        return cls(anchor, pattern._regex[len(anchor):], positional, named, prefix, literal,
+                   origin, include=pattern, compiled=compiled)
+
+    @classmethod
+    def from_state(cls, state, patterns):
+        """Rebuild a row saved by ``state()`` for the pattern list it came from."""
+        pattern = patterns[state['origin'][0]]
+        for index in state['origin'][1:]:
+            pattern = pattern.patterns[index]
+        kwargs = {}
+        if getattr(pattern, '_regex', None) == state['anchor'] + state['body']:
+            kwargs['compiled'] = pattern.regex
+        if isinstance(pattern, RegexURLPattern):
+            kwargs['callback'] = pattern.callback
+        elif isinstance(pattern, RegexURLPatternList):
+            kwargs['include'] = pattern
+        else:
+            kwargs['pattern'] = pattern
+        return cls(state['anchor'], state['body'], tuple(state['positional']),
+                   tuple((name, number) for name, number in state['named']), state['prefix'],
+                   state['literal'], tuple(state['origin']), combinable=state['combinable'],
+                   nestable=state['nestable'], kept=state['kept'], **kwargs)
+
+    def state(self):
+        """Return the row as plain data, without the callback, for the route table cache file."""
+        return {
+            'anchor': self.anchor, 'body': self.body, 'positional': self.positional,
+            'named': self.named, 'prefix': self.prefix, 'literal': self.literal,
+            'origin': self.origin, 'combinable': self.combinable, 'nestable': self.nestable,
+            'kept': self.kept,
+        }
+
+    def nest(self, route):
+        """Return ``route`` glued after this row's include() prefix."""
+        offset = self.regex.groups
+        outer = _rename_groups(self.body, '_o')
+        inner = _rename_groups(route.body, '_s')
+        # The atomic group stops the sub pattern from backtracking into the
+        # prefix, so the prefix matches exactly what it would on its own.
+        body = '(?>%s)(?:%s)' % (outer, inner)
+        named = OrderedDict(self.named)
+        named.update((name, number + offset) for name, number in route.named)
+        named = tuple(named.items())
+        positional = self.positional
+        if not named or route.include is not None:
+            # The groups of an include() row below are only args when its own
+            # sub patterns give no kwargs either; finish() decides.
+            positional += tuple(number + offset for number in route.positional)
+        if self.literal:
+            prefix, literal = self.prefix + route.prefix, route.literal
+        else:
+            prefix, literal = self.prefix, False
+        return _Route(self.anchor, body, positional, named, prefix, literal, route.origin,
+                      callback=route.callback, include=route.include, kept=self.kept)
+
+    @property
+    def source(self):
+        return self.anchor + self.body
+
+    @property
+    def regex(self):
+        if self._compiled is None:
+            self._compiled = re.compile(self.source, re.UNICODE)
+        return self._compiled
+
+    def child(self):
+        """Return the resolver for the patterns of an include() row."""
+        resolver = self._resolver
+        if resolver is None:
+            resolver = self._resolver = Resolver(self.include.patterns)
+        return resolver
+
+    def finish(self, path, end, args, kwargs, trace=None):
+        """Build the resolve result once this row's regex matched ``path`` up to ``end``."""
+        if self.include is None:
+            return self.callback, args, kwargs
+        if trace is None:
+            sub_match = self.child().resolve(path[end:])
+        else:
+            trace.level += len(self.origin)
+            sub_match = self.child().resolve(path[end:], trace)
+            trace.level -= len(self.origin)
+        if sub_match:
+            sub_match_dict = dict(kwargs, **sub_match[2])
+            if sub_match_dict:
+                sub_match_args = args[:self.kept]
+            else:
+                sub_match_args = args + sub_match[1]
+            return sub_match[0], sub_match_args, sub_match_dict
+        return None
+
+
+def _flatten(pattern, origin):
+    """
+    Return the route table rows for ``pattern``.
+
+    An include() whose prefix and sub patterns can all be glued together is
+    replaced by one row per view below it, each with a single composed regex,
+    so resolving it needs no recursion and no per-level slicing or merging.
+    Anything else stays a single row, lazy include()s too, so their module
+    is only imported once a path matches their prefix.
+    """
+    route = _Route.from_pattern(pattern, origin)
+    if (route.include is None or not _ATOMIC_GROUPS or not route.nestable or
+            isinstance(route.include.patterns, LazyURLPatterns)):
+        return [route]
+    rows = []
+    for index, sub_pattern in enumerate(route.include.patterns):
+        sub_rows = _flatten(sub_pattern, origin + (index,))
+        if not all(sub_route.nestable for sub_route in sub_rows):
+            return [route]
+        rows.extend(route.nest(sub_route) for sub_route in sub_rows)
+    return rows
+
+
+class _Standalone(object):
+    """A single route tried on its own with its own compiled regex."""
+
+    def __init__(self, resolver, index):
+        self.index = index
+        self.route = resolver.routes[index]
+        self.names = tuple(name for name, number in self.route.named)
+        self.numbers = tuple(number for name, number in self.route.named)
+
+    def resolve(self, path, trace=None):
+        route = self.route
+        if trace is not None:
+            trace.tried += 1
+        if route.pattern is not None:
+            # Unknown pattern types keep their own resolution logic.
+            return route.pattern.resolve(path)
+        match = route.regex.search(path)
+        if match:
+            kwargs = _kwargs(match, self.names, self.numbers) if self.numbers else {}
+            args = _groups(match, route.positional) if route.positional else ()
+            if trace is not None:
+                trace.reached(route)
+            if route.include is None:
+                return route.callback, args, kwargs
+            return route.finish(path, match.end(), args, kwargs, trace)
+
+
+class _Alternation(object):
+    """
+    Consecutive anchored routes compiled into one regex of the form
+    ``(?P<_r0>...)|(?P<_r1>...)|...``.
+
+    Alternatives are tried left to right at the start of the path, so the
+    first alternative that matches is the same route a linear scan would
+    have picked.
+    """
+
+    def __init__(self, resolver, indexes):
+        self.routes = resolver.routes
+        self.indexes = indexes
+        self._from = {}
+
+    def _compile(self, start):
+        parts = []
+        lookup = {}
+        group = 0
+        for position in range(start, len(self.indexes)):
+            index = self.indexes[position]
+            route = self.routes[index]
+            parts.append('(?P<_r%d>%s)' % (index, _rename_groups(route.source, '_r%d_' % index)))
+            wrapper = group + 1
+            group = wrapper + route.regex.groups
+            positional = tuple(wrapper + number for number in route.positional)
+            names = tuple(name for name, number in route.named)
+            numbers = tuple(wrapper + number for name, number in route.named)
+            # View rows are answered on the spot, without finish().
+            callback = route.callback if route.include is None else None
+            lookup[wrapper] = (position, route, positional, names, numbers, callback)
+        return re.compile('|'.join(parts), re.UNICODE), lookup
+
+    def compile(self, start=0):
+        try:
+            return self._from[start]
+        except KeyError:
+            compiled = self._from[start] = self._compile(start)
+            return compiled
+
+    def resolve(self, path, trace=None):
+        start = 0
+        while start < len(self.indexes):
+            compiled = self._from.get(start)
+            regex, lookup = compiled if compiled is not None else self.compile(start)
+            match = regex.match(path)
+            if not match:
+                if trace is not None:
+                    trace.tried += len(self.indexes) - start
+                return None
+            wrapper = match.lastindex
+            position, route, positional, names, numbers, callback = lookup[wrapper]
+            kwargs = _kwargs(match, names, numbers) if numbers else {}
+            args = _groups(match, positional) if positional else ()
+            if trace is not None:
+                # The alternatives before the winner were tried and failed.
+                trace.tried += position - start + 1
+                trace.reached(route)
+            if callback is not None:
+                return callback, args, kwargs
+            resolved = route.finish(path, match.end(wrapper), args, kwargs, trace)
+            if resolved:
+                return resolved
+            # An include() prefix matched but nothing inside it did; carry on
+            # with the routes after it, as the linear scan would.
+            start = position + 1
+        return None
+
+
+class _SegmentNode(object):
+    __slots__ = ('literals', 'converters', 'end', 'first')
+
+    def __init__(self):
+        # Literal segment -> node.
+        self.literals = {}
+        # ``[name, converter, node]`` edges, in route order.
+        self.converters = []
+        # ``(position, route)`` of the first route ending here.
+        self.end = None
+        # Smallest position of a route ending at or below this node.
+        self.first = None
+
+
+class _Segments(object):
+    """
+    Consecutive ``path()`` routes merged into one tree of path segments.
+
+    A path is split on slashes once and walked down the tree: a literal
+    segment is a dict lookup, a converter edge calls the converter. When
+    several routes match, the one that comes first in the pattern list wins,
+    as with a linear scan; branches that can only lead to later routes than
+    the best match so far are not visited.
+    """
+
+    def __init__(self, resolver, indexes):
+        self.routes = [resolver.routes[index] for index in indexes]
+        self.root = _SegmentNode()
+        for position, route in enumerate(self.routes):
+            node = self.root
+            node.first = position if node.first is None else node.first
+            for segment in route.pattern.segments:
+                if segment.__class__ is str:
+                    node = node.literals.setdefault(segment, _SegmentNode())
+                else:
+                    name, converter = segment
+                    for edge in node.converters:
+                        if edge[0] == name and edge[1] is converter:
+                            node = edge[2]
+                            break
+                    else:
+                        child = _SegmentNode()
+                        node.converters.append([name, converter, child])
+                        node = child
+                if node.first is None:
+                    node.first = position
+            if node.end is None:
+                node.end = (position, route)
+
+    def _match(self, node, parts, depth, values, best):
+        """The ``(position, route, values)`` of the first route matching ``parts[depth:]`` before ``best``."""
+        if depth == len(parts):
+            if node.end is not None and node.end[0] < best[0]:
+                return node.end + (dict(values),)
+            return None
+        found = None
+        part = parts[depth]
+        child = node.literals.get(part)
+        if child is not None and child.first < best[0]:
+            found = self._match(child, parts, depth + 1, values, best)
+            if found is not None:
+                best = found
+        for name, converter, child in node.converters:
+            if child.first >= best[0]:
+                continue
+            try:
+                value = converter.to_python(part)
+            except ValueError:
+                continue
+            values.append((name, value))
+            result = self._match(child, parts, depth + 1, values, best)
+            values.pop()
+            if result is not None:
+                found = best = result
+        return found
+
+    def resolve(self, path, trace=None):
+        found = self._match(self.root, path.split('/'), 0, [], (len(self.routes),))
+        if found is None:
+            if trace is not None:
+                trace.tried += len(self.routes)
+            return None
+        position, route, kwargs = found
+        if trace is not None:
+            trace.tried += position + 1
+            trace.reached(route)
+        return route.pattern.callback, (), kwargs
+
+
+# Tables with fewer routes skip the prefix trie.
+_TRIE_MIN_ROUTES = 16
+
+
+class _TrieNode(object):
+    __slots__ = ('children', 'indexes', 'units')
+
+    def __init__(self):
+        self.children = {}
+        # Routes whose literal prefix ends at this node.
+        self.indexes = []
+        # Resolution units for every route whose prefix is on the way here,
+        # built the first time a path stops at this node.
+        self.units = None
+
+
+class Resolver(object):
+    """
+    Compiled resolver for a list of url patterns.
+
+    include() trees are flattened into one table of routes whose regexes
+    already contain every prefix above them. The literal prefix of every
+    anchored route (``path`` for ``^path([1,2])$``) is stored in a trie, so
+    a path is only tried against the routes whose prefix it starts with;
+    routes without a literal prefix sit at the root and are always
+    candidates. Tables of fewer than ``_TRIE_MIN_ROUTES`` routes have no
+    trie: on those, one combined regex over every route is cheaper than the
+    walk, even for paths the trie would have rejected at once. Runs of
+    candidate anchored routes share a single combined regex so a lookup
+    costs one match call instead of one ``regex.search`` per pattern. Routes that can't be combined (not anchored with ``^``,
+    backreferences, inline global flags) are tried on their own, in their
+    original position. Runs of ``path()`` routes share a tree of path
+    segments instead (see ``_Segments``). Resolution returns the same
+    ``(callback, args, kwargs)`` as the linear scan over the patterns'
+    own ``resolve``.
+    """
+
+    def __init__(self, patterns, routes=None):
+        self.patterns = patterns
+        if routes is None:
+            routes = []
+            for index, pattern in enumerate(patterns):
+                routes.extend(_flatten(pattern, (index,)))
+        self.routes = routes
+        self._reverse_index = None
+        self._reverse_cache = {}
+        self._trie = _TrieNode()
+        if len(routes) < _TRIE_MIN_ROUTES:
+            # Walking the trie costs more than it saves on a short table:
+            # every route is a candidate, from the root.
+            self._trie.indexes.extend(range(len(routes)))
+        else:
+            for index, route in enumerate(routes):
+                node = self._trie
+                for char in route.prefix:
+                    node = node.children.setdefault(char, _TrieNode())
+                node.indexes.append(index)
+
+    def _build_units(self, indexes):
+        units = []
+        run = []
+        kind = None
+        for index in indexes:
+            route = self.routes[index]
+            if route.combinable:
+                route_kind = _Alternation
+            elif isinstance(route.pattern, RoutePattern):
+                route_kind = _Segments
+            else:
+                route_kind = None
+            if run and route_kind is not kind:
+                units.append(kind(self, run))
+                run = []
+            if route_kind is None:
+                units.append(_Standalone(self, index))
+            else:
+                run.append(index)
+            kind = route_kind
+        if run:
+            units.append(kind(self, run))
+        return units
+
+    def _candidates(self, path):
+        """Return the resolution units for the routes whose literal prefix starts ``path``."""
+        node = owner = self._trie
+        for char in path:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.indexes:
+                # Nodes without routes of their own share the candidates of
+                # the closest node above them that has some. Only those
+                # nodes ever hold units, which keeps their number bounded by
+                # the number of routes and lets warm() build them all.
+                owner = node
+            if not node.children:
+                break
+        units = owner.units
+        if units is None:
+            # First path stopping here: collect the nodes on the way down.
+            nodes = [self._trie]
+            for char in path:
+                if nodes[-1] is owner:
+                    break
+                nodes.append(nodes[-1].children[char])
+            units = owner.units = self._units_for(nodes)
+        return units
+
+    def _units_for(self, nodes):
+        return self._build_units(sorted(index for node in nodes for index in node.indexes))
+
+    def reverse(self, viewname, *args, **kwargs):
+        """
+        Return the path of the route called ``viewname``, filled with ``args``
+        or ``kwargs``. The name -> template index is built on first use; paths
+        of routes without arguments are memoized.
+        """
+        if not args and not kwargs:
+            try:
+                return self._reverse_cache[viewname]
+            except KeyError:
+                pass
+        elif args and kwargs:
+            raise ValueError("Don't mix *args and **kwargs in call to reverse()!")
+        index = self._reverse_index
+        if index is None:
+            index = self._reverse_index = _build_reverse_index(self.patterns, {}, '', [])
+        for reversal in index.get(viewname, ()):
+            path = reversal.fill(args, kwargs)
+            if path is not None:
+                if not args and not kwargs:
+                    self._reverse_cache[viewname] = path
+                return path
+        raise NoReverseMatch("Reverse for '%s' with arguments '%s' and keyword arguments '%s' "
+                             "not found." % (viewname, args, kwargs))
+
+    def warm(self, load_lazy=False):
+        """
+        Compile every route regex and every combined regex a path can reach,
+        including those of include() levels that couldn't be flattened, so
+        no request pays for a compile. Lazy include()s that haven't been
+        imported yet are left alone unless ``load_lazy`` is true.
+        """
+        stack = [(self._trie, [self._trie])]
+        while stack:
+            node, nodes = stack.pop()
+            if node.indexes or node is self._trie:
+                if node.units is None:
+                    node.units = self._units_for(nodes)
+                for unit in node.units:
+                    if isinstance(unit, _Alternation):
+                        unit.compile()
+            for child in node.children.values():
+                stack.append((child, nodes + [child]))
+        if load_lazy:
+            load_all(self.patterns)
+        if self._reverse_index is None and not _has_unloaded(self.patterns):
+            # Built now only if that doesn't import anything.
+            self._reverse_index = _build_reverse_index(self.patterns, {}, '', [])
+        for route in self.routes:
+            if route.pattern is None:
+                route.regex
+            if route.include is not None and not _is_unloaded(route.include.patterns):
+                route.child().warm(load_lazy)
+
+    def state(self):
+        """Return the route table as plain data, see ``freeze``."""
+        table = []
+        for route in self.routes:
+            row = route.state()
+            if route.include is not None and not isinstance(route.include.patterns, LazyURLPatterns):
+                row['include'] = route.child().state()
+            table.append(row)
+        return table
+
+    @classmethod
+    def from_state(cls, patterns, table):
+        routes = [_Route.from_state(row, patterns) for row in table]
+        for route, row in zip(routes, table):
+            if route.include is not None and 'include' in row:
+                route._resolver = cls.from_state(route.include.patterns, row['include'])
+        return cls(patterns, routes)
+
+    def resolve(self, path, trace=None):
+        """
+        Return ``(callback, args, kwargs)`` for ``path``, or None. A
+        ``ResolveTrace`` passed as ``trace`` records the work done.
+        """
+        units = self._trie.units
+        if units is None or self._trie.children:
+            units = self._candidates(path)
+        for unit in units:
+            resolved = unit.resolve(path, trace)
+            if resolved:
+                return resolved
+        return None
+
+
+class ResolveTrace(object):
+    """
+    What one ``Resolver.resolve`` call did: the number of patterns tried
+    (every alternative up to the winner counts for a combined regex) and
+    the deepest include() level a matching pattern was found at.
+    """
+
+    __slots__ = ('tried', 'depth', 'level')
+
+    def __init__(self):
+        self.tried = 0
+        self.depth = 0
+        # include() levels above the resolver currently running.
+        self.level = 0
+
+    def reached(self, route):
+        depth = self.level + len(route.origin) - 1
+        if depth > self.depth:
+            self.depth = depth
+
+
+def _is_unloaded(patterns):
+    return isinstance(patterns, LazyURLPatterns) and not patterns.loaded
+
+
+def _has_unloaded(patterns):
+    """Whether a lazy include() below ``patterns`` hasn't been imported yet."""
+    for pattern in patterns:
+        sub_patterns = getattr(pattern, 'patterns', None)
+        if sub_patterns is not None and (_is_unloaded(sub_patterns) or _has_unloaded(sub_patterns)):
+            return True
+    return False
+
+
+# Resolvers by id() of their pattern list, oldest first. Each resolver keeps
+# its list alive, so an id can't be reused while its entry is here.
+_resolvers = OrderedDict()
+_MAX_RESOLVERS = 8
+
+
+def _install(resolver):
+    _resolvers[id(resolver.patterns)] = resolver
+    while len(_resolvers) > _MAX_RESOLVERS:
+        _resolvers.popitem(last=False)
+    return resolver
+
+
+def get_resolver(patterns):
+    """
+    Return the compiled resolver for ``patterns``, building it the first time
+    that list is seen. Resolvers of several lists are kept side by side, so
+    resolving against one list and reversing against another don't keep
+    rebuilding each other.
+    """
+    resolver = _resolvers.get(id(patterns))
+    if resolver is None or resolver.patterns is not patterns:
+        resolver = _install(Resolver(patterns))
+    return resolver
+
+
+def reverse(viewname, *args, **kwargs):
+    """Return the path of the route called ``viewname`` in the project's url_patterns."""
+    return get_resolver(urlsconf.url_patterns).reverse(viewname, *args, **kwargs)
+
+
+def _check(patterns, errors):
+    for pattern in patterns:
+        if isinstance(pattern, (RegexURLPattern, RegexURLPatternList)):
+            try:
+                pattern.regex
+            except ImproperlyConfigured as e:
+                errors.append(str(e))
+        if isinstance(pattern, (RegexURLPatternList, RoutePatternList)) and not _is_unloaded(pattern.patterns):
+            _check(pattern.patterns, errors)
+    return errors
+
+
+_TABLE_VERSION = 4
+
+
+def _fingerprint(patterns):
+    """Hash of everything the route table is derived from: the regexes, routes and their nesting."""
+    def shape(patterns):
+        if isinstance(patterns, LazyURLPatterns):
+            # Never flattened, so its content doesn't change the table.
+            return patterns.module_path
+        return [[type(pattern).__name__, getattr(pattern, '_regex', None) or getattr(pattern, '_route', None),
+                 shape(pattern.patterns) if isinstance(pattern, (RegexURLPatternList, RoutePatternList)) else None]
+                for pattern in patterns]
+    data = json.dumps([_TABLE_VERSION, _ATOMIC_GROUPS, shape(patterns)])
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def _load_table(cache_file, fingerprint):
+    try:
+        with open(cache_file) as f:
+            data = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if data.get('fingerprint') != fingerprint:
+        return None
+    return data['routes']
+
+
+def _dump_table(cache_file, fingerprint, table):
+    temp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+    with open(temp_file, 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'routes': table}, f)
+    # Workers starting at the same time must never read a half written file.
+    os.replace(temp_file, cache_file)
+
+
+def freeze(patterns, cache_file=None, load_lazy=False):
+    """
+    Build, compile and validate the resolver for ``patterns`` now instead of
+    on first request, and make it the one ``get_resolver`` returns.
+
+    Every invalid regex in the tree is reported in a single
+    ImproperlyConfigured. With ``cache_file`` the flattened route table is
+    read from that file when it was written for the same patterns, and
+    (re)written otherwise, so further processes skip the analysis of the
+    tree; the regexes themselves are still compiled in every process.
+
+    Lazy include()s are left for the first request that needs them, unless
+    ``load_lazy`` is true: then they are imported, checked and compiled
+    too, which is what a pre-fork server wants before forking its workers.
+    """
+    if load_lazy:
+        load_all(patterns)
+    errors = _check(patterns, [])
+    if errors:
+        raise ImproperlyConfigured('Invalid url patterns:\n%s' % '\n'.join(errors))
+    resolver = None
+    if cache_file is not None:
+        fingerprint = _fingerprint(patterns)
+        table = _load_table(cache_file, fingerprint)
+        if table is not None:
+            try:
+                resolver = Resolver.from_state(patterns, table)
+            except (KeyError, IndexError, TypeError, AttributeError):
+                resolver = None
+        if resolver is None:
+            resolver = Resolver(patterns)
+            _dump_table(cache_file, fingerprint, resolver.state())
+    else:
+        resolver = Resolver(patterns)
+    resolver.warm(load_lazy)
+    return _install(resolver)
+
+
+class ResolveCache(object):
+    """
+    Bounded LRU cache of ``path -> (callback, args, kwargs)``.
+
+    With ``negative=True`` paths that resolved to nothing are remembered too,
+    so repeated 404s skip resolution as well. The cache belongs to one
+    resolver: it empties itself when asked about a different one, which is
+    what happens when ``url_patterns`` is swapped.
+    """
+
+    _missing = object()
+
+    def __init__(self, maxsize=1024, negative=False):
+        if maxsize <= 0:
+            raise ValueError('maxsize must be a positive number, got %r' % maxsize)
+        self.maxsize = maxsize
+        self.negative = negative
+        self.hits = 0
+        self.misses = 0
+        self._resolver = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def resolve(self, resolver, path, trace=None):
+        with self._lock:
+            if self._resolver is not resolver:
+                self._entries.clear()
+                self._resolver = resolver
+            entry = self._entries.get(path, self._missing)
+            if entry is not self._missing:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = resolver.resolve(path, trace)
+        if entry is None and not self.negative:
+            return None
+        with self._lock:
+            if self._resolver is resolver:
+                self._entries[path] = entry
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return entry
@@ -1,12 +1,18 @@
 import datetime
+import mimetypes
+import os
 import sys
 import re
 
 from django.utils import six,  timezone
 from http.client import responses
 from email.header import Header
+from http.cookies import SimpleCookie
 
 _charset_from_content_type_re = re.compile(r';\s*charset=(?P<charset>[^\s;]+)', re.I)
+_byte_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Header names and values that are valid in ASCII and latin-1 as they are.
+_plain_header = re.compile(r'[\t\x20-\x7e]*').fullmatch
 
 
 class HttpResponseBase(six.Iterator):
@@ -15,30 +21,62 @@ class HttpResponseBase(six.Iterator):
 
     This class doesn't handle content. It should not be used directly.
     Use the HttpResponse and StreamingHttpResponse subclasses instead.
+
+    Responses have ``__slots__`` and create their cookie jar and list of
+    closable objects only when something is put in them.
     """
 
-    status_code = 200
+    __slots__ = ('_headers', '_closables', '_cookies', '_handler_class', 'closed',
+                 '_status_code', '_reason_phrase', '_charset')
+
+    default_status_code = 200
+
+    def __init_subclass__(cls, **kwargs):
+        # Subclasses declare their status as ``status_code = 404``; that would
+        # hide the property, so keep it as the default instead.
+        super(HttpResponseBase, cls).__init_subclass__(**kwargs)
+        if isinstance(cls.__dict__.get('status_code'), int):
+            cls.default_status_code = cls.__dict__['status_code']
+            cls.status_code = HttpResponseBase.status_code
 
     def __init__(self, content_type=None, status=None, reason=None, charset=None):
         # _headers is a mapping of the lower-case name to the original case of
         # the header (required for working with legacy systems) and the header
-        # value. Both the name of the header and its value are ASCII strings.
+        # value. Both are validated native strings, ready for start_response().
         self._headers = {}
-        self._closable_objects = []
+        self._closables = None
         # This parameter is set by the handler. It's necessary to preserve the
         # historical behavior of request_finished.
         self._handler_class = None
-        self.cookies = {}
+        self._cookies = None
         self.closed = False
-        if status is not None:
-            self.status_code = status
+        self._status_code = self.default_status_code if status is None else status
         self._reason_phrase = reason
         self._charset = charset
         if content_type is None:
-            content_type = '%s; charset=%s' % ('text/html',
-                                               self.charset)
+            content_type = 'text/html; charset=%s' % (charset or 'utf-8')
         self['Content-Type'] = content_type
 
+    @property
+    def status_code(self):
+        return self._status_code
+
+    @status_code.setter
+    def status_code(self, value):
+        self._status_code = value
+
+    @property
+    def cookies(self):
+        if self._cookies is None:
+            self._cookies = SimpleCookie()
+        return self._cookies
+
+    @property
+    def _closable_objects(self):
+        if self._closables is None:
+            self._closables = []
+        return self._closables
+
     @property
     def reason_phrase(self):
         if self._reason_phrase is not None:
@@ -119,8 +157,10 @@ class HttpResponseBase(six.Iterator):
         return value
 
     def __setitem__(self, header, value):
-        header = self._convert_to_charset(header, 'ascii')
-        value = self._convert_to_charset(value, 'latin-1', mime_encode=True)
+        if type(header) is not str or not _plain_header(header):
+            header = self._convert_to_charset(header, 'ascii')
+        if type(value) is not str or not _plain_header(value):
+            value = self._convert_to_charset(value, 'latin-1', mime_encode=True)
         self._headers[header.lower()] = (header, value)
 
     def __delitem__(self, header):
@@ -141,6 +181,13 @@ class HttpResponseBase(six.Iterator):
     def items(self):
         return self._headers.values()
 
+    def wsgi_headers(self):
+        """The header list to pass to WSGI's start_response(), cookies included."""
+        headers = list(self._headers.values())
+        if self._cookies:
+            headers.extend(('Set-Cookie', morsel.OutputString()) for morsel in self._cookies.values())
+        return headers
+
     def get(self, header, alternate=None):
         return self._headers.get(header.lower(), (None, alternate))[1]
 
@@ -226,7 +273,7 @@ class HttpResponseBase(six.Iterator):
     # The WSGI server must call this method upon completion of the request.
     # See http://blog.dscpl.com.au/2012/10/obligations-for-calling-close-on.html
     def close(self):
-        for closable in self._closable_objects:
+        for closable in self._closables or ():
             try:
                 closable.close()
             except Exception:
@@ -260,6 +307,8 @@ class HttpResponse(HttpResponseBase):
     This content that can be read, appended to or replaced.
     """
 
+    __slots__ = ('_container',)
+
     streaming = False
 
     def __init__(self, content='', *args, **kwargs):
@@ -312,11 +361,207 @@ class HttpResponse(HttpResponseBase):
             self.write(line)
 
 
+class StreamingHttpResponse(HttpResponseBase):
+    """
+    A streaming HTTP response class with an iterator as content.
+
+    This should only be iterated once, when the response is streamed to the
+    client. However, it can be appended to or replaced with a new iterator
+    that wraps the original content (or yields entirely new content).
+
+    No Content-Length is set, so the server sends the chunks with chunked
+    transfer-encoding to HTTP/1.1 clients and closes the connection after
+    the body for older ones.
+    """
+
+    __slots__ = ('_iterator',)
+
+    streaming = True
+
+    def __init__(self, streaming_content=(), *args, **kwargs):
+        super(StreamingHttpResponse, self).__init__(*args, **kwargs)
+        # `streaming_content` should be an iterable of bytestrings.
+        # See the `streaming_content` property methods.
+        self.streaming_content = streaming_content
+
+    @property
+    def content(self):
+        raise AttributeError("This %s instance has no `content` attribute. "
+                             "Use `streaming_content` instead." % self.__class__.__name__)
+
+    @property
+    def streaming_content(self):
+        return six.moves.map(self.make_bytes, self._iterator)
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        self._set_streaming_content(value)
+
+    def _set_streaming_content(self, value):
+        # Ensure we can never iterate on "value" more than once.
+        self._iterator = iter(value)
+        if hasattr(value, 'close'):
+            self._closable_objects.append(value)
+
+    def __iter__(self):
+        return self.streaming_content
+
+    def getvalue(self):
+        return b''.join(self.streaming_content)
+
+
+class FileRegion(object):
+    """
+    ``length`` bytes of an open file starting at ``offset`` (up to the end
+    of the file when ``length`` is None), read through a file-like API.
+
+    This is what a FileResponse hands to ``wsgi.file_wrapper``: servers that
+    know about it send ``fileno()``/``offset``/``length`` with os.sendfile,
+    the others just ``read()`` it. Closing the region closes the response.
+    """
+
+    __slots__ = ('file', 'offset', 'length', '_response', '_remaining', '_started')
+
+    def __init__(self, file, offset, length, response):
+        self.file = file
+        self.offset = offset
+        self.length = length
+        self._response = response
+        self._remaining = length
+        self._started = False
+
+    def read(self, size=-1):
+        if not self._started:
+            self._started = True
+            if self.offset is not None:
+                self.file.seek(self.offset)
+        if self._remaining is None:
+            return self.file.read(size)
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self.file.read(size) if size else b''
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self._response.close()
+
+
+class FileResponse(StreamingHttpResponse):
+    """
+    A streaming HTTP response class optimized for files.
+
+    ``mywsgi.application`` passes the open file to the server's
+    ``wsgi.file_wrapper`` instead of iterating it, so the server can send it
+    with os.sendfile without copying it through Python. Content-Length and
+    Content-Type are filled in from the file when possible and single byte
+    ranges are supported, see ``apply_range``.
+    """
+
+    __slots__ = ('file_to_stream', 'size', 'region')
+
+    block_size = 64 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super(FileResponse, self).__init__(*args, **kwargs)
+        if self.file_to_stream is not None and kwargs.get('content_type') is None:
+            name = getattr(self.file_to_stream, 'name', None)
+            content_type = mimetypes.guess_type(name)[0] if isinstance(name, str) else None
+            if content_type:
+                self['Content-Type'] = content_type
+
+    def _set_streaming_content(self, value):
+        if not hasattr(value, 'read'):
+            self.file_to_stream = self.region = None
+            return super(FileResponse, self)._set_streaming_content(value)
+
+        self.file_to_stream = filelike = value
+        if hasattr(filelike, 'close'):
+            self._closable_objects.append(filelike)
+        try:
+            offset = filelike.tell()
+            size = os.fstat(filelike.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            # Not a real file on disk: stream whatever read() returns.
+            self.size = None
+            self.region = FileRegion(filelike, None, None, self)
+        else:
+            self.size = max(size - offset, 0)
+            self.region = FileRegion(filelike, offset, self.size, self)
+            self['Content-Length'] = str(self.size)
+            self['Accept-Ranges'] = 'bytes'
+        self._iterator = self._read_blocks()
+
+    def _read_blocks(self):
+        # The region is looked up on the first read, after apply_range().
+        region = self.region
+        while True:
+            data = region.read(self.block_size)
+            if not data:
+                break
+            yield data
+
+    def apply_range(self, range_header):
+        """
+        Restrict the response to the single byte range asked for by a
+        ``Range`` request header: 206 with the part, or 416 when the range
+        is past the end of the file. Headers it can't satisfy that way
+        (several ranges, other units) leave the full 200 response.
+        """
+        if not range_header or self.status_code != 200 or self.size is None:
+            return
+        match = _byte_range_re.match(range_header.strip())
+        if not match or match.groups() == ('', ''):
+            return
+        first, last = match.groups()
+        size = self.size
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(size - int(last), 0)
+            end = size - 1 if int(last) else -1
+        base = self.region.offset
+        if start >= size or end < start:
+            self.status_code = 416
+            self['Content-Range'] = 'bytes */%d' % size
+            self['Content-Length'] = '0'
+            self.region = FileRegion(self.file_to_stream, base, 0, self)
+            return
+        self.status_code = 206
+        self['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+        self['Content-Length'] = str(end - start + 1)
+        self.region = FileRegion(self.file_to_stream, base + start, end - start + 1, self)
+
+
+class HttpResponseNotModified(HttpResponse):
+    __slots__ = ()
+
+    status_code = 304
+
+    def __init__(self, *args, **kwargs):
+        super(HttpResponseNotModified, self).__init__(*args, **kwargs)
+        del self['content-type']
+
+    @HttpResponse.content.setter
+    def content(self, value):
+        if value:
+            raise AttributeError("You cannot set content to a 304 (Not Modified) response")
+        self._container = []
+
+
 class HttpResponseNotFound(HttpResponse):
+    __slots__ = ()
+
     status_code = 404
 
 
 class HttpResponseServerError(HttpResponse):
+    __slots__ = ()
+
     status_code = 500
 
 
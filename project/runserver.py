@@ -1,10 +1,17 @@
+import os
+import queue
+import selectors
+import signal
 import socket
 import socketserver
+import sys
+import threading
+import time
 
 from wsgiref import simple_server
 from django.utils.encoding import uri_to_iri
 from django.core.management.color import color_style
-from django.core.handlers.wsgi import ISO_8859_1, UTF_8
+from django.core.handlers.wsgi import ISO_8859_1, UTF_8, LimitedStream
 from django.utils import six
 
 
@@ -14,7 +21,101 @@ def is_broken_pipe_error():
 
 
 class ServerHandler(simple_server.ServerHandler, object):
+    """
+    HTTP/1.1 handler that frames every response so the connection can be
+    reused: with the application's Content-Length, with chunked
+    transfer-encoding for HTTP/1.1 clients, or else by closing the
+    connection afterwards.
+    """
+
+    http_version = '1.1'
+    _chunked = False
+    _discard_body = False
+    _body_started = False
+
+    def cleanup_headers(self):
+        super(ServerHandler, self).cleanup_headers()
+        request_handler = self.request_handler
+        status = self.status[:3]
+        # HEAD responses, 1xx, 204 and 304 never carry a body, whatever the
+        # application returned.
+        self._discard_body = (self.environ['REQUEST_METHOD'] == 'HEAD' or
+                              status[0] == '1' or status in ('204', '304'))
+        if 'Content-Length' not in self.headers and not self._discard_body:
+            if request_handler.request_version == 'HTTP/1.1':
+                self.headers['Transfer-Encoding'] = 'chunked'
+                self._chunked = True
+            else:
+                request_handler.close_connection = True
+        if request_handler.close_connection:
+            self.headers['Connection'] = 'close'
+        elif request_handler.request_version != 'HTTP/1.1':
+            # HTTP/1.0 clients that asked for keep-alive need to be told.
+            self.headers['Connection'] = 'keep-alive'
+
+    def send_headers(self):
+        super(ServerHandler, self).send_headers()
+        self._body_started = True
+
+    def _write(self, data):
+        if self._body_started:
+            if self._discard_body:
+                return
+            if self._chunked:
+                if not data:
+                    return
+                data = b'%x\r\n%s\r\n' % (len(data), data)
+        super(ServerHandler, self)._write(data)
+
+    def sendfile(self):
+        """Send a wsgi.file_wrapper response with os.sendfile, straight from the file to the socket."""
+        filelike = self.result.filelike
+        if not hasattr(os, 'sendfile') or 'Content-Length' not in self.headers:
+            return False
+        try:
+            in_fd = filelike.fileno()
+            out_fd = self.request_handler.connection.fileno()
+        except (AttributeError, OSError, ValueError):
+            return False
+        offset = getattr(filelike, 'offset', None)
+        if offset is None:
+            offset = os.lseek(in_fd, 0, os.SEEK_CUR)
+        count = int(self.headers['Content-Length'])
+        if not self.headers_sent:
+            self.bytes_sent = count
+            self.send_headers()
+        if self._discard_body:
+            return True
+        self._flush()
+        while count > 0:
+            sent = os.sendfile(out_fd, in_fd, offset, count)
+            if not sent:
+                # The file is shorter than announced; the response is broken.
+                self.request_handler.close_connection = True
+                break
+            offset += sent
+            count -= sent
+        return True
+
+    def finish_response(self):
+        metrics = self.request_handler.server.metrics
+        if metrics is None:
+            return super(ServerHandler, self).finish_response()
+        started = time.perf_counter()
+        try:
+            super(ServerHandler, self).finish_response()
+        finally:
+            metrics.write.observe(time.perf_counter() - started)
+
+    def finish_content(self):
+        super(ServerHandler, self).finish_content()
+        if self._chunked:
+            self._chunked = False
+            super(ServerHandler, self)._write(b'0\r\n\r\n')
+
     def handle_error(self):
+        # A response that failed halfway can't be framed any more.
+        self.request_handler.close_connection = True
         # Ignore broken pipe errors, otherwise pass on
         if not is_broken_pipe_error():
             super(ServerHandler, self).handle_error()
@@ -24,6 +125,8 @@ class WSGIServer(simple_server.WSGIServer, object):
     """BaseHTTPServer that implements the Python WSGI protocol"""
 
     request_queue_size = 10
+    # A project.metrics.Metrics timing request parsing and response writing.
+    metrics = None
 
     def __init__(self, *args, **kwargs):
         if kwargs.pop('ipv6', False):
@@ -42,8 +145,228 @@ class WSGIServer(simple_server.WSGIServer, object):
             super(WSGIServer, self).handle_error(request, client_address)
 
 
+class ThreadPoolMixIn(object):
+    """
+    Mix-in that hands connections to a fixed pool of worker threads through
+    a bounded queue, instead of starting a thread per connection.
+
+    When every worker is busy and the queue is full, the connection gets an
+    immediate 503 so clients back off instead of piling up.
+
+    A kept-alive connection doesn't hold a thread while it waits for its
+    next request: the handler parks it, and a watcher thread queues it again
+    once the request arrives, or closes it after the handler's
+    ``idle_timeout``. Queued again, it waits for a thread but never gets a
+    503.
+
+    The threads start with the first connection rather than in
+    ``__init__``: threads don't survive fork(), and PreforkServer forks its
+    workers after the server is built.
+    """
+
+    pool_size = 8
+    queue_size = 64
+    busy_response = (b'HTTP/1.1 503 Service Unavailable\r\n'
+                     b'Content-Type: text/plain\r\n'
+                     b'Content-Length: 12\r\n'
+                     b'Retry-After: 1\r\n'
+                     b'Connection: close\r\n'
+                     b'\r\n'
+                     b'server busy\n')
+
+    def __init__(self, *args, **kwargs):
+        self.pool_size = kwargs.pop('pool_size', self.pool_size)
+        self.queue_size = kwargs.pop('queue_size', self.queue_size)
+        self._requests = queue.Queue(self.queue_size)
+        self._stats_lock = threading.Lock()
+        self.busy = 0
+        self.handled = 0
+        self.rejected = 0
+        self.idle = 0
+        self._pool = []
+        # The process the threads of _pool run in.
+        self._pool_pid = None
+        super(ThreadPoolMixIn, self).__init__(*args, **kwargs)
+
+    def _start_pool(self):
+        if self._pool_pid is not None:
+            # Forked from a process that already served: its threads, the
+            # connections they held and their locks stayed behind.
+            self._requests = queue.Queue(self.queue_size)
+            self._stats_lock = threading.Lock()
+            self.busy = 0
+        self._pool_pid = os.getpid()
+        # Connections parked by handlers, for the watcher to pick up, and the
+        # socket pair that wakes the watcher up when one is.
+        self._parked = queue.Queue()
+        self._wakeup = socket.socketpair()
+        self._wakeup[1].setblocking(False)
+        self._local = threading.local()
+        self._closing = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, name='idle-connections')
+        self._watcher.daemon = True
+        self._watcher.start()
+        self._pool = []
+        for number in range(self.pool_size):
+            worker = threading.Thread(target=self._work, name='request-worker-%d' % number)
+            worker.daemon = True
+            worker.start()
+            self._pool.append(worker)
+
+    def served_before(self):
+        """The requests served earlier on the connection this thread handles."""
+        return self._local.served
+
+    def park(self, served, idle_timeout):
+        """
+        Take the connection this thread handles back once its handler
+        returns, ``served`` requests in, and queue it again when its next
+        request arrives within ``idle_timeout`` seconds.
+        """
+        self._local.parked = (served, idle_timeout)
+
+    def stats(self):
+        """Queue depth and worker utilization counters."""
+        return {
+            'pool_size': self.pool_size,
+            'busy': self.busy,
+            'utilization': float(self.busy) / self.pool_size,
+            'queued': self._requests.qsize(),
+            'queue_size': self.queue_size,
+            'idle': self.idle,
+            'handled': self.handled,
+            'rejected': self.rejected,
+        }
+
+    def process_request(self, request, client_address):
+        if self._pool_pid != os.getpid():
+            self._start_pool()
+        try:
+            self._requests.put_nowait((request, client_address, 0))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            try:
+                request.sendall(self.busy_response)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address, self._local.served = item
+            self._local.parked = None
+            with self._stats_lock:
+                self.busy += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self._local.parked = None
+                self.handle_error(request, client_address)
+            finally:
+                # Free before parking, so a connection is never counted
+                # both busy and idle.
+                with self._stats_lock:
+                    self.busy -= 1
+                    self.handled += 1
+                if self._local.parked is None:
+                    self.shutdown_request(request)
+                else:
+                    served, idle_timeout = self._local.parked
+                    self._parked.put((request, client_address, served, time.time() + idle_timeout))
+                    self._wake_watcher()
+
+    def _watch(self):
+        """Queue parked connections again as their next request arrives; close those idle too long."""
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup[0], selectors.EVENT_READ)
+        try:
+            while True:
+                while True:
+                    try:
+                        item = self._parked.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        return
+                    request, client_address, served, deadline = item
+                    selector.register(request, selectors.EVENT_READ, (client_address, served, deadline))
+                parked = [key for key in selector.get_map().values() if key.data is not None]
+                self.idle = len(parked)
+                timeout = max(min(key.data[2] for key in parked) - time.time(), 0) if parked else None
+                for key, _ in selector.select(timeout):
+                    if key.data is None:
+                        self._wakeup[0].recv(4096)
+                        continue
+                    selector.unregister(key.fileobj)
+                    client_address, served, deadline = key.data
+                    self._requeue((key.fileobj, client_address, served))
+                now = time.time()
+                for key in parked:
+                    if key.data[2] <= now and key.fileobj in selector.get_map():
+                        selector.unregister(key.fileobj)
+                        self.shutdown_request(key.fileobj)
+        finally:
+            for key in list(selector.get_map().values()):
+                if key.data is not None:
+                    self.shutdown_request(key.fileobj)
+            selector.close()
+            self.idle = 0
+
+    def _wake_watcher(self):
+        try:
+            self._wakeup[1].send(b'\0')
+        except OSError:
+            # Already awake with bytes to read.
+            pass
+
+    def _requeue(self, item):
+        # Wait for room rather than turning a kept-alive client away.
+        while not self._closing.is_set():
+            try:
+                self._requests.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        self.shutdown_request(item[0])
+
+    def server_close(self):
+        super(ThreadPoolMixIn, self).server_close()
+        if self._pool_pid != os.getpid():
+            return
+        self._closing.set()
+        self._parked.put(None)
+        self._wake_watcher()
+        self._watcher.join()
+        for end in self._wakeup:
+            end.close()
+        for _ in self._pool:
+            self._requests.put(None)
+        for worker in self._pool:
+            worker.join()
+
+
 class WSGIRequestHandler(simple_server.WSGIRequestHandler, object):
 
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle's algorithm the
+    # body then waits for the client's delayed ACK on kept-alive connections.
+    disable_nagle_algorithm = True
+    # Seconds a kept-alive connection may wait for its next request, and
+    # the number of requests one connection may carry.
+    idle_timeout = 5
+    max_requests = 100
+    # Bytes of request body the view didn't read that are skipped to keep
+    # the connection usable; bigger leftovers close it instead.
+    max_drain = 64 * 1024
+    # perf_counter() when the current request line arrived.
+    request_started = None
+    # Requests read from the connection so far.
+    requests_served = 0
+
     def __init__(self, *args, **kwargs):
         self.style = color_style()
         super(WSGIRequestHandler, self).__init__(*args, **kwargs)
@@ -85,6 +408,12 @@ class WSGIRequestHandler(simple_server.WSGIRequestHandler, object):
 
         sys.stderr.write(msg)
 
+    def log_request(self, code='-', size='-'):
+        if self.request_started is None:
+            return super(WSGIRequestHandler, self).log_request(code, size)
+        elapsed = (time.perf_counter() - self.request_started) * 1000
+        self.log_message('"%s" %s %s %.1fms', self.requestline, str(code), str(size), elapsed)
+
     def get_environ(self):
         # Strip all headers with underscores in the name before constructing
         # the WSGI environ. This prevents header-spoofing based on ambiguity
@@ -109,9 +438,53 @@ class WSGIRequestHandler(simple_server.WSGIRequestHandler, object):
         return env
 
     def handle(self):
-        """Copy of WSGIRequestHandler, but with different ServerHandler"""
+        """Serve requests from the connection until one of them closes it."""
+        served_before = getattr(self.server, 'served_before', None)
+        self.requests_served = served_before() if served_before is not None else 0
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if self.park():
+                return
+            self.handle_one_request()
+
+    def park(self):
+        """
+        Hand the kept-alive connection back to a thread pool server while
+        it waits for its next request, instead of holding a thread. Return
+        True when the handler is done with the connection.
+        """
+        park = getattr(self.server, 'park', None)
+        if park is None:
+            # handle_one_request() waits up to idle_timeout itself.
+            return False
+        self.connection.settimeout(0)
+        try:
+            if self.rfile.peek(1):
+                # The next request is already here.
+                return False
+        except OSError:
+            self.close_connection = True
+            return True
+        finally:
+            self.connection.settimeout(None)
+        park(self.requests_served, self.idle_timeout)
+        return True
+
+    def handle_one_request(self):
+        """Copy of WSGIRequestHandler.handle, but with different ServerHandler"""
 
-        self.raw_requestline = self.rfile.readline(65537)
+        self.connection.settimeout(self.idle_timeout)
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except (socket.timeout, ConnectionError):
+            self.close_connection = True
+            return
+        self.connection.settimeout(None)
+        self.request_started = time.perf_counter()
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
         if len(self.raw_requestline) > 65536:
             self.requestline = ''
             self.request_version = ''
@@ -121,27 +494,256 @@ class WSGIRequestHandler(simple_server.WSGIRequestHandler, object):
 
         if not self.parse_request():  # An error code has been sent, just exit
             return
+        self.requests_served += 1
+        if self.requests_served >= self.max_requests:
+            # The last request the connection may carry; tell the client.
+            self.close_connection = True
+
+        if self.headers.get('Transfer-Encoding'):
+            # The end of a chunked body isn't tracked, so the next request
+            # can't be found on this connection.
+            self.close_connection = True
+            stream = self.rfile
+        else:
+            try:
+                content_length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                self.send_error(400, 'Invalid Content-Length')
+                return
+            stream = LimitedStream(self.rfile, content_length)
 
         handler = ServerHandler(
-            self.rfile, self.wfile, self.get_stderr(), self.get_environ()
+            stream, self.wfile, self.get_stderr(), self.get_environ()
         )
         handler.request_handler = self      # backpointer for logging
+        if self.server.metrics is not None:
+            self.server.metrics.parse.observe(time.perf_counter() - self.request_started)
         handler.run(self.server.get_app())
 
+        if not self.close_connection and stream is not self.rfile:
+            if stream.remaining > self.max_drain:
+                self.close_connection = True
+            else:
+                stream.read()
+
+
+class PreforkServer(object):
+    """
+    Bind the listening socket once, then fork ``workers`` processes that all
+    accept on it with their own threaded ``WSGIServer``.
+
+    The parent only supervises: a worker that dies is replaced, SIGHUP
+    replaces every worker one by one (each old worker finishes its in-flight
+    requests first), SIGTERM and SIGINT stop them all gracefully.
+    """
+
+    # A worker that dies sooner than this after its start is considered to be
+    # crashing on startup; wait this long before replacing it again.
+    respawn_delay = 1.0
 
-def run(addr, port, application, ipv6=False, threading=False):
+    def __init__(self, httpd, workers):
+        self.httpd = httpd
+        self.workers = workers
+        self.children = {}
+        self.retiring = set()
+        self.stopping = False
+        self.restarting = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.time()
+            return pid
+        try:
+            self.run_worker()
+        finally:
+            os._exit(0)
+
+    def run_worker(self):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        serving = threading.Thread(target=self.httpd.serve_forever)
+        serving.start()
+        while not stop.wait(1):
+            if not serving.is_alive():
+                break
+        # Stop accepting, then let the request threads finish their work.
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_restart(self, signum, frame):
+        self.restarting = True
+
+    def restart_workers(self):
+        for pid in list(self.children):
+            if pid in self.retiring:
+                continue
+            self.spawn()
+            self.retiring.add(pid)
+            os.kill(pid, signal.SIGTERM)
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            started = self.children.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            if started is None or self.stopping:
+                continue
+            sys.stderr.write("Worker %s exited with status %s, starting a new one\n" % (pid, status))
+            if time.time() - started < self.respawn_delay:
+                time.sleep(self.respawn_delay)
+            self.spawn()
+
+    def serve_forever(self):
+        # Workers race to accept; the losers must not block in accept().
+        self.httpd.socket.setblocking(False)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+        for _ in range(self.workers):
+            self.spawn()
+        try:
+            while not self.stopping:
+                if self.restarting:
+                    self.restarting = False
+                    self.restart_workers()
+                self.reap()
+                time.sleep(0.2)
+        finally:
+            for pid in self.children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            while self.children:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                self.children.pop(pid, None)
+            self.httpd.server_close()
+
+
+def make_server(addr, port, application, ipv6=False, threads=0, queue_size=ThreadPoolMixIn.queue_size,
+                backlog=WSGIServer.request_queue_size, metrics=None, handler_class=WSGIRequestHandler):
+    """
+    Bind a server for ``application`` on ``addr:port`` without serving yet.
+
+    ``threads`` > 0 serves connections from a fixed pool of that many
+    threads with at most ``queue_size`` connections waiting for one,
+    otherwise every connection gets its own thread. ``backlog`` is the
+    listen() queue length. ``metrics``, a project.metrics.Metrics, times
+    parsing and writing.
+    """
     server_address = (addr, port)
-    http_cls = type(str('WSGIServer'), (socketserver.ThreadingMixIn, WSGIServer), {})
-    httpd = http_cls(server_address, WSGIRequestHandler)
+    attrs = {'request_queue_size': backlog, 'metrics': metrics}
+    kwargs = {'ipv6': ipv6}
+    if threads > 0:
+        mixin = ThreadPoolMixIn
+        kwargs.update(pool_size=threads, queue_size=queue_size)
+    else:
+        mixin = socketserver.ThreadingMixIn
+    http_cls = type(str('WSGIServer'), (mixin, WSGIServer), attrs)
+    httpd = http_cls(server_address, handler_class, **kwargs)
     httpd.set_app(application)
-    httpd.serve_forever()
+    return httpd
+
+
+def run(addr, port, application, ipv6=False, threading=False, workers=1,
+        threads=0, queue_size=ThreadPoolMixIn.queue_size, backlog=WSGIServer.request_queue_size,
+        metrics=None):
+    """
+    Serve ``application`` on ``addr:port``, see ``make_server``. ``workers``
+    > 1 pre-forks that many processes.
+    """
+    httpd = make_server(addr, port, application, ipv6=ipv6, threads=threads, queue_size=queue_size,
+                        backlog=backlog, metrics=metrics)
+    if workers > 1:
+        PreforkServer(httpd, workers).serve_forever()
+    else:
+        httpd.serve_forever()
 
 if __name__ == '__main__':
     # import sys
     # sys.path.insert(0, r'D:\learn_django_urls\learn_django_urls')
     # print(sys.path)
-    import sys, os
+    import argparse
     myPath = os.path.dirname(os.path.abspath(__file__))
     sys.path.insert(0, myPath + '/../')
-    from project.mywsgi import application
-    run('127.0.0.1', 8003, application)
\ No newline at end of file
+    from project import mywsgi
+    from project.mywsgi import application, url_patterns
+    from project.resolvers import freeze
+    from project.cache import FileBackend, ResponseCacheMiddleware
+    from project.coalescing import CoalescingMiddleware
+    from project.compression import CompressionMiddleware
+    from project.metrics import Metrics
+    from project.profiling import ProfilingMiddleware
+    from project.staticfiles import StaticFiles
+
+    parser = argparse.ArgumentParser(description='Run the development server.')
+    parser.add_argument('addr', nargs='?', default='127.0.0.1')
+    parser.add_argument('port', nargs='?', type=int, default=8003)
+    parser.add_argument('--ipv6', action='store_true')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of pre-forked worker processes sharing the socket')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='serve from a pool of this many threads instead of a thread per connection')
+    parser.add_argument('--queue-size', type=int, default=ThreadPoolMixIn.queue_size,
+                        help='connections that may wait for a pool thread before getting a 503')
+    parser.add_argument('--backlog', type=int, default=WSGIServer.request_queue_size,
+                        help='listen() backlog of the server socket')
+    parser.add_argument('--static-root', help='directory of static files to serve')
+    parser.add_argument('--static-url', default='/static/', help='URL prefix of the static files')
+    parser.add_argument('--compress', action='store_true', help='gzip/brotli compress responses')
+    parser.add_argument('--metrics', action='store_true',
+                        help='collect request timings, served at /__metrics__ (per worker process)')
+    parser.add_argument('--warm-all', action='store_true',
+                        help='import the lazy include()s of the URLconf before serving')
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help='cache whole responses for this many seconds')
+    parser.add_argument('--cache-dir', help='keep the cached responses in this directory, shared by the workers')
+    parser.add_argument('--coalesce', action='store_true',
+                        help='run the view once for concurrent identical GET requests and share the response')
+    parser.add_argument('--profile-dir', help='write request profiles into this directory')
+    parser.add_argument('--profile-token',
+                        help='also profile requests sent with an X-Profile header equal to this token')
+    parser.add_argument('--profile-rate', type=float, default=0.0,
+                        help='also profile this fraction of the requests')
+    parser.add_argument('--profile-threshold', type=float, default=None,
+                        help='sample the stacks of requests running longer than this many seconds')
+    options = parser.parse_args()
+    if options.metrics:
+        mywsgi.metrics = Metrics()
+        mywsgi.middleware.append(mywsgi.metrics)
+    if options.compress:
+        mywsgi.middleware.append(CompressionMiddleware())
+    if options.static_root:
+        # Indexed in the parent, so forked workers share the table.
+        mywsgi.middleware.append(StaticFiles(options.static_root, prefix=options.static_url))
+    if options.cache_ttl:
+        backend = FileBackend(options.cache_dir) if options.cache_dir else None
+        mywsgi.middleware.append(ResponseCacheMiddleware(options.cache_ttl, backend=backend))
+    if options.coalesce:
+        mywsgi.middleware.append(CoalescingMiddleware())
+    if options.profile_dir:
+        header = 'X-Profile' if options.profile_token else None
+        mywsgi.middleware.append(ProfilingMiddleware(options.profile_dir, header=header, token=options.profile_token,
+                                                     rate=options.profile_rate,
+                                                     threshold=options.profile_threshold))
+    # Compile the routes once in the parent so forked workers share them.
+    freeze(url_patterns, load_lazy=options.warm_all)
+    run(options.addr, options.port, application, ipv6=options.ipv6, workers=options.workers,
+        threads=options.threads, queue_size=options.queue_size, backlog=options.backlog,
+        metrics=mywsgi.metrics)
\ No newline at end of file
@@ -0,0 +1,180 @@
+import email.utils
+import mimetypes
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+from project.compression import accepted_codings
+from project.exceptions import ImproperlyConfigured
+from project.response import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+
+# Precompressed siblings looked for next to every file, most preferred first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class StaticAsset(object):
+    """One representation of a static file: the file itself or a precompressed sibling."""
+
+    __slots__ = ('path', 'size', 'mtime', 'encoding', 'etag', 'last_modified', 'mapping')
+
+    def __init__(self, path, stat, encoding=None):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.encoding = encoding
+        self.etag = '"%x-%x%s"' % (self.mtime, self.size, '-' + encoding if encoding else '')
+        self.last_modified = email.utils.formatdate(self.mtime, usegmt=True)
+        self.mapping = None
+
+
+class StaticEntry(object):
+    """A file of the index with the precompressed variants found next to it."""
+
+    __slots__ = ('asset', 'content_type', 'variants')
+
+    def __init__(self, asset, content_type, variants):
+        self.asset = asset
+        self.content_type = content_type
+        self.variants = variants
+
+    def choose(self, accept_encoding):
+        """The best representation the client accepts."""
+        if self.variants and accept_encoding:
+            accepted = accepted_codings(accept_encoding)
+            for asset in self.variants:
+                if asset.encoding in accepted or '*' in accepted:
+                    return asset
+        return self.asset
+
+
+class StaticFiles(object):
+    """
+    Serve the files under ``root`` at URLs starting with ``prefix``.
+
+    The directory is indexed once, when the instance is created (call
+    ``index()`` again to pick up new files), so a request costs a dict lookup
+    and no stat() call. Files up to ``max_cached_size`` bytes are kept in an
+    LRU cache holding at most ``max_memory`` bytes; bigger files are mmap-ed
+    on first use and served from the mapping. Responses carry an ETag and a
+    Last-Modified header and conditional requests get a 304. A ``.br`` or
+    ``.gz`` sibling of a file is sent instead of it to clients that accept
+    that encoding.
+    """
+
+    block_size = 64 * 1024
+
+    def __init__(self, root, prefix='/static/', max_cached_size=256 * 1024, max_memory=32 * 1024 * 1024):
+        if not os.path.isdir(root):
+            raise ImproperlyConfigured('The static files root "%s" is not a directory.' % root)
+        if not prefix.startswith('/') or not prefix.endswith('/'):
+            raise ImproperlyConfigured('The static files prefix must start and end with a slash.')
+        self.root = root
+        self.prefix = prefix
+        self.max_cached_size = max_cached_size
+        self.max_memory = max_memory
+        self.memory_used = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.files = {}
+        self.index()
+
+    def index(self):
+        """Walk the root directory and rebuild the table of files."""
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            names = set(filenames)
+            for filename in filenames:
+                if any(filename.endswith(suffix) and filename[:-len(suffix)] in names
+                       for encoding, suffix in ENCODINGS):
+                    continue
+                path = os.path.join(dirpath, filename)
+                variants = []
+                for encoding, suffix in ENCODINGS:
+                    if filename + suffix in names:
+                        variants.append(StaticAsset(path + suffix, os.stat(path + suffix), encoding))
+                content_type, encoding = mimetypes.guess_type(filename)
+                if content_type is None or encoding:
+                    # Compressed downloads (.tar.gz and so on) are just bytes.
+                    content_type = 'application/octet-stream'
+                elif content_type.startswith('text/') or content_type in ('application/javascript',
+                                                                         'application/json'):
+                    content_type += '; charset=utf-8'
+                url = os.path.relpath(path, self.root).replace(os.sep, '/')
+                files[url] = StaticEntry(StaticAsset(path, os.stat(path)), content_type, variants)
+        with self._lock:
+            self.files = files
+            self._cache.clear()
+            self.memory_used = 0
+
+    def serve(self, environ):
+        """
+        Return the response for a static file, or None when the request isn't
+        for one, so the caller can go on resolving it against the URLconf.
+        """
+        path = environ['PATH_INFO']
+        if not path.startswith(self.prefix) or environ.get('REQUEST_METHOD', 'GET') not in ('GET', 'HEAD'):
+            return None
+        entry = self.files.get(path[len(self.prefix):])
+        if entry is None:
+            return None
+
+        asset = entry.choose(environ.get('HTTP_ACCEPT_ENCODING'))
+        if self.not_modified(environ, asset):
+            response = HttpResponseNotModified()
+        elif asset.size <= self.max_cached_size:
+            response = HttpResponse(self.read(asset), content_type=entry.content_type)
+        else:
+            response = StreamingHttpResponse(self.mapped_blocks(asset), content_type=entry.content_type)
+            response['Content-Length'] = str(asset.size)
+        response['ETag'] = asset.etag
+        response['Last-Modified'] = asset.last_modified
+        if entry.variants:
+            response['Vary'] = 'Accept-Encoding'
+        if asset.encoding:
+            response['Content-Encoding'] = asset.encoding
+        return response
+
+    # Used as a middleware, static files are answered before the URLconf.
+    process_request = serve
+
+    def not_modified(self, environ, asset):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            etags = [etag.strip() for etag in if_none_match.split(',')]
+            return '*' in etags or any(etag == asset.etag or etag == 'W/' + asset.etag for etag in etags)
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since is not None:
+            parsed = email.utils.parsedate_tz(if_modified_since)
+            return parsed is not None and asset.mtime <= email.utils.mktime_tz(parsed)
+        return False
+
+    def read(self, asset):
+        """The content of a small file, from the memory cache when possible."""
+        with self._lock:
+            content = self._cache.get(asset.path)
+            if content is not None:
+                self._cache.move_to_end(asset.path)
+                return content
+        with open(asset.path, 'rb') as f:
+            content = f.read()
+        with self._lock:
+            if asset.path not in self._cache and len(content) <= self.max_memory:
+                self._cache[asset.path] = content
+                self.memory_used += len(content)
+                while self.memory_used > self.max_memory:
+                    path, evicted = self._cache.popitem(last=False)
+                    self.memory_used -= len(evicted)
+        return content
+
+    def mapped_blocks(self, asset):
+        """Iterate over a large file through a memory mapping shared by all requests."""
+        mapping = asset.mapping
+        if mapping is None:
+            with self._lock:
+                if asset.mapping is None:
+                    with open(asset.path, 'rb') as f:
+                        asset.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                mapping = asset.mapping
+        for start in range(0, asset.size, self.block_size):
+            yield mapping[start:start + self.block_size]
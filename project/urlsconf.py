@@ -1,15 +1,18 @@
 from project.views import index_view, path_view
 import re
+import threading
 from .exceptions import ImproperlyConfigured
 from django.utils.functional import cached_property
 from project.exceptions import Http404
+from project.converters import get_converter
 
 
 class RegexURLPattern(object):
 
-    def __init__(self, regex, callback):
+    def __init__(self, regex, callback, name=None):
         self._regex = regex
         self.callback = callback
+        self.name = name
 
     @cached_property
     def regex(self):
@@ -73,19 +76,178 @@ class RegexURLPatternList(object):
         #     raise Http404
         # raise Http404
 
+def _parse_route(route):
+    """
+    Split a ``path()`` route into its segments: a string for a literal
+    segment, ``(name, converter)`` for a ``<converter:name>`` one. A route
+    ending with a slash ends with an empty segment, as the path it matches.
+    """
+    segments = []
+    names = set()
+    for segment in route.split('/'):
+        if '<' not in segment and '>' not in segment:
+            segments.append(segment)
+            continue
+        if not (segment.startswith('<') and segment.endswith('>')) or segment.count('<') != 1:
+            raise ImproperlyConfigured('Route "%s": a converter must take a whole path segment, '
+                                       'got "%s".' % (route, segment))
+        raw_converter, _, name = segment[1:-1].rpartition(':')
+        if not name.isidentifier():
+            raise ImproperlyConfigured('Route "%s": "%s" is not a valid parameter name.' % (route, name))
+        if name in names:
+            raise ImproperlyConfigured('Route "%s" uses the parameter "%s" twice.' % (route, name))
+        names.add(name)
+        segments.append((name, get_converter(raw_converter or 'str')))
+    return segments
+
+
+def _match_segments(segments, parts, kwargs):
+    """Match the path ``parts`` against route ``segments``, adding converted values to ``kwargs``."""
+    for segment, part in zip(segments, parts):
+        if segment.__class__ is str:
+            if segment != part:
+                return False
+        else:
+            name, converter = segment
+            try:
+                kwargs[name] = converter.to_python(part)
+            except ValueError:
+                return False
+    return True
+
+
+class RoutePattern(object):
+    """
+    A ``path()`` route such as ``'items/<int:id>/'``. The path is split on
+    slashes and compared segment by segment, without any regex; the view gets
+    the converted values as keyword arguments.
+    """
+
+    def __init__(self, route, callback, name=None):
+        self._route = route
+        self.segments = _parse_route(route)
+        self.callback = callback
+        self.name = name
+
+    @property
+    def literal_prefix(self):
+        """The literal text every matching path starts with."""
+        literals = []
+        for segment in self.segments:
+            if segment.__class__ is not str:
+                return '/'.join(literals) + '/' if literals else ''
+            literals.append(segment)
+        return '/'.join(literals)
+
+    def __repr__(self):
+        return 'RoutePattern instance route is: {}, callback name is: {}'.format(self._route, self.callback.__name__)
+
+    def __str__(self):
+        return self.__repr__()
+
+    def resolve(self, path):
+        parts = path.split('/')
+        kwargs = {}
+        if len(parts) == len(self.segments) and _match_segments(self.segments, parts, kwargs):
+            return self.callback, (), kwargs
+
+
+class RoutePatternList(object):
+    """A ``path()`` prefix, ending with a slash, in front of a list of sub patterns."""
+
+    def __init__(self, route, patterns):
+        if route and not route.endswith('/'):
+            raise ImproperlyConfigured('Route "%s" includes other patterns and must end with a slash.' % route)
+        self._route = route
+        # The empty segment after the last slash stands for the rest of the path.
+        self.segments = _parse_route(route)[:-1] if route else []
+        self.patterns = patterns
+
+    def __repr__(self):
+        return 'RoutePattern instance route is: {}, for sub pattern list'.format(self._route)
+
+    def __str__(self):
+        return self.__repr__()
+
+    def resolve(self, path):
+        parts = path.split('/', len(self.segments))
+        kwargs = {}
+        if len(parts) != len(self.segments) + 1 or not _match_segments(self.segments, parts, kwargs):
+            return None
+        new_path = parts[-1]
+        for pattern in self.patterns:
+            sub_match = pattern.resolve(new_path)
+            if sub_match:
+                sub_match_dict = dict(kwargs, **sub_match[2])
+                sub_match_args = () if sub_match_dict else sub_match[1]
+                return sub_match[0], sub_match_args, sub_match_dict
+
+
 from importlib import import_module
 
-def include(module_path):
+def _import_patterns(module_path):
+    url_conf_module = import_module(module_path)
+    return getattr(url_conf_module, 'url_patterns')
+
+
+class LazyURLPatterns(object):
+    """
+    The ``url_patterns`` of a module that is only imported the first time
+    they are needed, by a request whose path matches the prefix in front of
+    them or by ``load_all``. The import happens once even when several
+    threads need the patterns at the same time.
+    """
+
+    def __init__(self, module_path):
+        self.module_path = module_path
+        self._patterns = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'LazyURLPatterns instance module is: {}'.format(self.module_path)
+
+    @property
+    def loaded(self):
+        return self._patterns is not None
+
+    def load(self):
+        patterns = self._patterns
+        if patterns is None:
+            with self._lock:
+                if self._patterns is None:
+                    self._patterns = _import_patterns(self.module_path)
+                patterns = self._patterns
+        return patterns
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+    def __getitem__(self, index):
+        return self.load()[index]
+
+
+def include(module_path, lazy=False):
     if not module_path:
         raise ImproperlyConfigured('include url pattern config should not empty')
     if isinstance(module_path, str):
-        url_conf_module = import_module(module_path)
-        patterns = getattr(url_conf_module, 'url_patterns')
-        return patterns
+        if lazy:
+            return LazyURLPatterns(module_path)
+        return _import_patterns(module_path)
     raise ImproperlyConfigured("include url pattern config should be "
                                "a string but it's type is {}".format(type(module_path)))
 
-def url(regex: str, view):
+
+def load_all(patterns):
+    """Import every lazy include() below ``patterns`` now, e.g. before forking workers."""
+    for pattern in patterns:
+        sub_patterns = getattr(pattern, 'patterns', None)
+        if sub_patterns is not None:
+            load_all(sub_patterns)
+
+def url(regex: str, view, name=None):
 
     if not regex or not isinstance(regex, str):
         raise ImproperlyConfigured('{} is empty or invalid'.format(regex))
@@ -93,15 +255,30 @@ def url(regex: str, view):
     #     re.compile(regex)
     # except re.error as e:
     #     raise ImproperlyConfigured('"%s" is not a valid regular expression: %s' % (regex, e))
-    if isinstance(view, (list, tuple)):
+    if isinstance(view, (list, tuple, LazyURLPatterns)):
         return RegexURLPatternList(regex, view)
 
     if not callable(view):
         raise ImproperlyConfigured('URL pattern：{} view is not callable'.format(regex))
 
-    return RegexURLPattern(regex, view)
+    return RegexURLPattern(regex, view, name=name)
+
+def path(route: str, view, name=None):
+
+    if not isinstance(route, str):
+        raise ImproperlyConfigured('{} is not a valid route'.format(route))
+    if route.startswith('/'):
+        raise ImproperlyConfigured('Route "{}" should not start with a slash: '
+                                   'paths are matched without it'.format(route))
+    if isinstance(view, (list, tuple, LazyURLPatterns)):
+        return RoutePatternList(route, view)
+
+    if not callable(view):
+        raise ImproperlyConfigured('URL pattern：{} view is not callable'.format(route))
+
+    return RoutePattern(route, view, name=name)
 
 url_patterns = [
-    url('^$', index_view),
-    url('^path([1,2])$', path_view)
+    url('^$', index_view, name='index'),
+    url('^path([1,2])$', path_view, name='path')
 ]
\ No newline at end of file
@@ -0,0 +1,33 @@
+from collections import namedtuple
+
+import pytest
+
+from project import mywsgi
+
+Response = namedtuple('Response', ['status', 'headers', 'body'])
+
+
+class Client(object):
+    """Call ``mywsgi.application`` in process, like a WSGI server would."""
+
+    def __init__(self, monkeypatch):
+        self.monkeypatch = monkeypatch
+
+    def install(self, url_patterns, middleware=()):
+        """Serve ``url_patterns`` through ``middleware`` until the end of the test."""
+        self.monkeypatch.setattr(mywsgi, 'url_patterns', url_patterns)
+        self.monkeypatch.setattr(mywsgi, 'middleware', list(middleware))
+
+    def get(self, path, **environ):
+        """Request ``path``; keyword arguments go into the environ, ``REQUEST_METHOD`` too."""
+        environ.setdefault('REQUEST_METHOD', 'GET')
+        environ['PATH_INFO'] = path
+        started = []
+        body = b''.join(mywsgi.application(environ, lambda status, headers: started.append((status, headers))))
+        status, headers = started[0]
+        return Response(status, dict(headers), body)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    return Client(monkeypatch)
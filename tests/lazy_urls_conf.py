@@ -0,0 +1,6 @@
+from project.urlsconf import url, path
+
+url_patterns = [
+    url(r'^$', lambda version, *args, **kwargs: 'lazy root'),
+    path('items/<int:id>/', lambda version, *args, **kwargs: 'lazy item', name='lazy-item'),
+]
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from project import mywsgi
+from project.asyncserver import AsyncServer
+from project.response import FileResponse, HttpResponse, StreamingHttpResponse
+from project.urlsconf import url
+
+
+async def _async_view(request, *args, **kwargs):
+    await asyncio.sleep(0)
+    return HttpResponse('async {}'.format(args[0]))
+
+
+def _sync_view(request, *args, **kwargs):
+    return HttpResponse('sync {}'.format(request['QUERY_STRING']))
+
+
+def _stream_view(request, *args, **kwargs):
+    return StreamingHttpResponse('part{}'.format(number) for number in range(3))
+
+
+def _file_view(request, *args, **kwargs):
+    return FileResponse(open(__file__, 'rb'))
+
+
+async def _read_response(reader):
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('iso-8859-1')
+    status = head.split('\r\n')[0]
+    headers = dict(line.split(': ', 1) for line in head.split('\r\n')[1:] if line)
+    if headers.get('Transfer-Encoding') == 'chunked':
+        body = b''
+        while True:
+            size = int(await reader.readuntil(b'\r\n'), 16)
+            body += (await reader.readexactly(size + 2))[:-2]
+            if not size:
+                break
+    else:
+        body = await reader.readexactly(int(headers.get('Content-Length', 0)))
+    return status, headers, body
+
+
+def _exchange(requests):
+    async def main():
+        server = AsyncServer('127.0.0.1', 0)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+            results = []
+            for request in requests:
+                writer.write(request)
+                results.append(await _read_response(reader))
+            writer.close()
+            return results
+        finally:
+            server.close()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def patterns(monkeypatch):
+    monkeypatch.setattr(mywsgi, 'url_patterns', [
+        url('^async([1,2])$', _async_view),
+        url('^sync$', _sync_view),
+        url('^stream$', _stream_view),
+        url('^file$', _file_view),
+    ])
+
+
+def test_async_and_sync_views_on_one_connection(patterns):
+    results = _exchange([
+        b'GET /async1 HTTP/1.1\r\nHost: test\r\n\r\n',
+        b'GET /sync?a=1 HTTP/1.1\r\nHost: test\r\n\r\n',
+        b'GET /missing HTTP/1.1\r\nHost: test\r\n\r\n',
+    ])
+    assert [(status, body) for status, headers, body in results] == [
+        ('HTTP/1.1 200 OK', b'async 1'),
+        ('HTTP/1.1 200 OK', b'sync a=1'),
+        ('HTTP/1.1 404 Not Found', b'<p style="color:red;">path not found error</p>'),
+    ]
+    assert 'Connection' not in results[0][1]
+
+
+def test_http10_connection_is_closed(patterns):
+    status, headers, body = _exchange([b'GET /sync HTTP/1.0\r\n\r\n'])[0]
+    assert status == 'HTTP/1.1 200 OK'
+    assert headers['Connection'] == 'close'
+    assert body == b'sync '
+
+
+def test_streaming_response_is_chunked(patterns):
+    results = _exchange([
+        b'GET /stream HTTP/1.1\r\nHost: test\r\n\r\n',
+        b'GET /sync HTTP/1.1\r\nHost: test\r\n\r\n',
+    ])
+    status, headers, body = results[0]
+    assert headers['Transfer-Encoding'] == 'chunked'
+    assert body == b'part0part1part2'
+    assert results[1][2] == b'sync '
+
+
+def test_file_response_with_range(patterns):
+    with open(__file__, 'rb') as f:
+        data = f.read()
+    results = _exchange([
+        b'GET /file HTTP/1.1\r\nHost: test\r\n\r\n',
+        b'GET /file HTTP/1.1\r\nHost: test\r\nRange: bytes=7-16\r\n\r\n',
+    ])
+    assert results[0][1]['Content-Type'] == 'text/x-python'
+    assert results[0][2] == data
+    status, headers, body = results[1]
+    assert status == 'HTTP/1.1 206 Partial Content'
+    assert headers['Content-Range'] == 'bytes 7-16/%d' % len(data)
+    assert body == data[7:17]
+
+
+class _HeaderMiddleware(object):
+    def process_response(self, environ, response):
+        response['X-Middleware'] = 'yes'
+        return response
+
+
+def test_middleware_wraps_async_views(monkeypatch, patterns):
+    monkeypatch.setattr(mywsgi, 'middleware', [_HeaderMiddleware()])
+    results = _exchange([
+        b'GET /async2 HTTP/1.1\r\nHost: test\r\n\r\n',
+        b'GET /sync HTTP/1.1\r\nHost: test\r\n\r\n',
+    ])
+    assert [(headers['X-Middleware'], body) for status, headers, body in results] == [
+        ('yes', b'async 2'), ('yes', b'sync ')]
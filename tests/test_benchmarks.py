@@ -0,0 +1,52 @@
+import json
+
+from benchmarks import resolve
+
+
+def test_resolve_benchmark_writes_comparable_json(tmpdir, capsys):
+    output = str(tmpdir.join('bench.json'))
+    args = ['--sizes', '3', '--depths', '2', '--min-time', '0.0001', '--repeat', '2']
+    resolve.main(args + ['--output', output])
+    with open(output) as f:
+        data = json.load(f)
+    assert [result['urlconf'] for result in data['results']] == ['flat-3', 'mixed-3', 'nested-2']
+    nested = data['results'][2]
+    assert nested['routes'] == 21
+    assert sorted(nested['latency_ns']) == ['404', 'best', 'worst']
+    assert sorted(nested['latency_ns']['worst']) == ['linear', 'resolver']
+    assert nested['memory_per_route']['resolver'] > 0
+
+    capsys.readouterr()
+    resolve.main(args + ['--compare', output])
+    lines = capsys.readouterr().out.splitlines()
+    assert any(line.startswith('nested-2       worst  resolver') for line in lines)
+
+
+def test_load_helpers():
+    from benchmarks import load
+    from project.urlsconf import url
+
+    def view(request, *args, **kwargs):
+        pass
+
+    patterns = [
+        url('^$', view, name='index'),
+        url('^path([1,2])$', view, name='path'),
+        url('^root(?P<root>[1,2])/', [url('^item(?P<id>[0-9]+)/$', view, name='item')]),
+        url('^hex/(?P<value>[0-9a-f]{8})$', view, name='hex'),
+        url('^anonymous$', view),
+    ]
+    assert load.sample_paths(patterns) == ['/', '/root1/item1/', '/path1']
+    assert load.parse_mix(['/:3', '/path1', '/a:b:2']) == ['/', '/', '/', '/path1', '/a:b', '/a:b']
+
+    ordered = list(range(1, 1001))
+    assert [load.percentile(ordered, fraction) for fraction in (0.5, 0.99, 0.999)] == [500, 990, 999]
+    assert load.percentile([], 0.5) is None
+
+    result = load.ClientResult()
+    result.latencies = [0.001, 0.002, 0.003, 0.004]
+    result.statuses.update({200: 3, 503: 1})
+    result.errors['ConnectionResetError'] += 1
+    summary = load.summarize(result, 2.0)
+    assert (summary['requests'], summary['rps'], summary['error_rate']) == (4, 2.0, 0.4)
+    assert summary['latency_ms'] == {'p50': 2.0, 'p99': 4.0, 'p999': 4.0}
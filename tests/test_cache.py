@@ -0,0 +1,153 @@
+import time
+
+import pytest
+
+from project.cache import (CacheEntry, FileBackend, MemoryBackend, ResponseCacheMiddleware, etag_matches,
+                           vary_environ_keys)
+from project.response import HttpResponse
+from project.urlsconf import url
+
+calls = []
+
+
+def _view(request, *args, **kwargs):
+    calls.append(args)
+    response = HttpResponse('view %s' % args[0])
+    response['X-Custom'] = 'yes'
+    return response
+
+
+def _cookie_view(request, *args, **kwargs):
+    calls.append(args)
+    response = HttpResponse('cookie')
+    response.set_cookie('session', 'abc')
+    return response
+
+
+def _greeting_view(request, *args, **kwargs):
+    calls.append(args)
+    response = HttpResponse('hello %s' % request.COOKIES.get('user'))
+    response['Vary'] = 'Cookie'
+    return response
+
+
+url_patterns = [url('^path([1,2])$', _view), url('^cookie$', _cookie_view), url('^hello$', _greeting_view)]
+
+
+@pytest.fixture(autouse=True)
+def _reset_calls():
+    del calls[:]
+
+
+def test_cached_response_and_conditional_get(client):
+    client.install(url_patterns, [ResponseCacheMiddleware(ttl=60)])
+
+    status, headers, body = client.get('/path1')
+    assert (status, body) == ('200 OK', b'view 1')
+    etag = headers['ETag']
+    status, cached_headers, body = client.get('/path1')
+    assert (status, body) == ('200 OK', b'view 1')
+    assert cached_headers['X-Custom'] == 'yes'
+    assert cached_headers['ETag'] == etag
+    assert calls == [('1',)]
+
+    status, headers, body = client.get('/path1', HTTP_IF_NONE_MATCH='W/%s, "other"' % etag)
+    assert (status, body) == ('304 Not Modified', b'')
+    assert headers['ETag'] == etag
+    assert calls == [('1',)]
+
+    # A miss still answers a matching If-None-Match with a 304.
+    client.get('/path2', QUERY_STRING='a=1', HTTP_IF_NONE_MATCH=etag)
+    assert client.get('/path2', HTTP_IF_NONE_MATCH='*').status == '304 Not Modified'
+    assert calls == [('1',), ('2',), ('2',)]
+
+
+def test_uncacheable_responses(client):
+    client.install(url_patterns, [ResponseCacheMiddleware(ttl=60)])
+    for _ in range(2):
+        client.get('/cookie')
+        client.get('/missing')
+        client.get('/path1', REQUEST_METHOD='POST')
+    assert calls == [(), ('1',), (), ('1',)]
+
+
+def test_vary_on_headers(client):
+    client.install(url_patterns, [ResponseCacheMiddleware(ttl=60, vary_on=['HTTP_ACCEPT_LANGUAGE'])])
+    for language in ('en', 'fr', 'en'):
+        client.get('/path1', HTTP_ACCEPT_LANGUAGE=language)
+    assert len(calls) == 2
+
+
+def test_vary_header_of_the_response(client):
+    client.install(url_patterns, [ResponseCacheMiddleware(ttl=60)])
+    bodies = [client.get('/hello', HTTP_COOKIE='user=' + user).body for user in ('alice', 'bob', 'alice')]
+    assert bodies == [b'hello alice', b'hello bob', b'hello alice']
+    assert len(calls) == 2
+    assert client.get('/hello').body == b'hello None'
+    assert len(calls) == 3
+
+
+def test_vary_star_is_not_cached(client):
+    def view(request):
+        calls.append(())
+        response = HttpResponse('any')
+        response['Vary'] = 'Accept-Language, *'
+        return response
+
+    client.install([url('^any$', view)], [ResponseCacheMiddleware(ttl=60)])
+    client.get('/any')
+    client.get('/any')
+    assert len(calls) == 2
+
+
+def test_vary_on_file_backend(client, tmpdir):
+    client.install(url_patterns, [ResponseCacheMiddleware(ttl=60, backend=FileBackend(str(tmpdir)))])
+    for user in ('alice', 'bob', 'alice', 'bob'):
+        assert client.get('/hello', HTTP_COOKIE='user=' + user).body == b'hello ' + user.encode('ascii')
+    assert len(calls) == 2
+    assert vary_environ_keys('Cookie, accept-language,Content-Type, *') == [
+        'HTTP_COOKIE', 'HTTP_ACCEPT_LANGUAGE', 'CONTENT_TYPE', '*']
+
+
+def test_memory_backend_expiry_and_lru():
+    backend = MemoryBackend(max_memory=100)
+    headers = {'etag': ('ETag', '"x"')}
+    backend.set('a', CacheEntry(200, 'OK', headers, b'a' * 40, time.time() + 60))
+    backend.set('b', CacheEntry(200, 'OK', headers, b'b' * 40, time.time() + 60))
+    assert backend.get('a') is not None
+    backend.set('c', CacheEntry(200, 'OK', headers, b'c' * 40, time.time() + 60))
+    assert backend.get('b') is None
+    assert backend.get('a').content == b'a' * 40
+    assert backend.memory_used <= 100
+
+    backend.set('old', CacheEntry(200, 'OK', {}, b'', time.time() - 1))
+    assert backend.get('old') is None
+    backend.set('huge', CacheEntry(200, 'OK', {}, b'h' * 101, time.time() + 60))
+    assert backend.get('huge') is None
+
+
+def test_file_backend_is_shared(tmpdir):
+    writer = FileBackend(str(tmpdir))
+    reader = FileBackend(str(tmpdir))
+    entry = CacheEntry(200, 'OK', {'content-type': ('Content-Type', 'text/plain')}, b'body\nline',
+                       time.time() + 60)
+    writer.set('key', entry)
+    loaded = reader.get('key')
+    assert loaded.content == b'body\nline'
+    assert loaded.headers == entry.headers
+    response = loaded.response()
+    assert response['Content-Type'] == 'text/plain'
+
+    writer.set('expired', CacheEntry(200, 'OK', {}, b'', time.time() - 1))
+    assert len(tmpdir.listdir()) == 2
+    writer.prune()
+    assert len(tmpdir.listdir()) == 1
+    assert reader.get('expired') is None
+
+
+def test_etag_matches():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"b"', '"b"')
+    assert etag_matches('"b"', 'W/"b"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches('*', None)
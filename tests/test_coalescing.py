@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from project.coalescing import CoalescingMiddleware
+from project.response import HttpResponse
+from project.urlsconf import url
+
+calls = []
+release = threading.Event()
+
+
+def _slow_view(request, *args, **kwargs):
+    calls.append(args)
+    release.wait(5)
+    return HttpResponse('slow %s' % args[0])
+
+
+def _failing_view(request, *args, **kwargs):
+    calls.append(args)
+    release.wait(5)
+    raise ValueError('failed')
+
+
+def _other_view(request, *args, **kwargs):
+    calls.append(args)
+    return HttpResponse('other')
+
+
+def _greeting_view(request, *args, **kwargs):
+    calls.append(args)
+    release.wait(5)
+    response = HttpResponse('hello %s' % request.COOKIES.get('user'))
+    response['Vary'] = 'Cookie'
+    return response
+
+
+url_patterns = [
+    url('^slow([1,2])$', _slow_view),
+    url('^fail([1,2])$', _failing_view),
+    url('^other$', _other_view),
+    url('^hello$', _greeting_view),
+]
+
+
+@pytest.fixture(autouse=True)
+def _reset_views():
+    del calls[:]
+    release.clear()
+
+
+def _concurrently(client, paths, waiting, **environ):
+    bodies = {}
+
+    def get(number, path):
+        bodies[number] = client.get(path, **dict(environ)).body
+
+    threads = [threading.Thread(target=get, args=(number, path)) for number, path in enumerate(paths)]
+    for thread in threads:
+        thread.start()
+    # Release the views once ``waiting`` of them run and the others had time to queue up.
+    deadline = time.time() + 5
+    while len(calls) < waiting and time.time() < deadline:
+        time.sleep(0.001)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return [bodies[number] for number in range(len(paths))]
+
+
+def test_concurrent_requests_share_one_view_call(client):
+    middleware = CoalescingMiddleware()
+    client.install(url_patterns, [middleware])
+    bodies = _concurrently(client, ['/slow1'] * 5 + ['/slow2'] * 3, 2)
+    assert bodies == [b'slow 1'] * 5 + [b'slow 2'] * 3
+    assert sorted(calls) == [('1',), ('2',)]
+    assert middleware.counts == {'leaders': 2, 'coalesced': 6, 'timeouts': 0, 'unshared': 0}
+    assert middleware._flights == {}
+
+    # Once done, the next request runs the view again.
+    assert client.get('/slow1').body == b'slow 1'
+    assert len(calls) == 3
+
+
+def test_failed_leader_lets_followers_run(client):
+    middleware = CoalescingMiddleware()
+    client.install(url_patterns, [middleware])
+    bodies = _concurrently(client, ['/fail1'] * 3, 1)
+    assert bodies == [b'error occur in server'] * 3
+    assert len(calls) == 3
+    assert middleware.counts['unshared'] == 2
+
+
+def test_only_selected_views(client):
+    middleware = CoalescingMiddleware(views=[_other_view], timeout=0.01)
+    client.install(url_patterns, [middleware])
+    release.set()
+    client.get('/slow1')
+    client.get('/other')
+    assert middleware.counts['leaders'] == 1
+
+
+def test_timeout(client):
+    middleware = CoalescingMiddleware(timeout=0.01)
+    client.install(url_patterns, [middleware])
+    bodies = _concurrently(client, ['/slow1'] * 2, 2)
+    assert bodies == [b'slow 1'] * 2
+    assert len(calls) == 2
+    assert middleware.counts['timeouts'] == 1
+
+
+def test_requests_with_credentials_are_not_coalesced(client):
+    middleware = CoalescingMiddleware()
+    client.install(url_patterns, [middleware])
+    release.set()
+    assert client.get('/hello', HTTP_COOKIE='user=alice').body == b'hello alice'
+    assert client.get('/slow1', HTTP_AUTHORIZATION='Basic Ym9iOg==').body == b'slow 1'
+    assert middleware.counts['leaders'] == 0
+
+    # All three run the view at the same time.
+    release.clear()
+    bodies = _concurrently(client, ['/hello'] * 3, 5, HTTP_COOKIE='user=bob')
+    assert bodies == [b'hello bob'] * 3
+    assert len(calls) == 5
+    assert middleware.counts['leaders'] == 0
+
+
+def test_responses_varying_on_other_headers_are_not_shared(client):
+    middleware = CoalescingMiddleware(vary_on=['HTTP_COOKIE'])
+    client.install(url_patterns, [middleware])
+    bodies = _concurrently(client, ['/hello'] * 3, 1, HTTP_COOKIE='user=bob')
+    assert bodies == [b'hello bob'] * 3
+    assert middleware.counts == {'leaders': 1, 'coalesced': 2, 'timeouts': 0, 'unshared': 0}
+
+    del calls[:]
+    release.clear()
+    middleware = CoalescingMiddleware()
+    client.install(url_patterns, [middleware])
+    bodies = _concurrently(client, ['/hello'] * 3, 1)
+    assert bodies == [b'hello None'] * 3
+    assert len(calls) == 3
+    assert middleware.counts == {'leaders': 1, 'coalesced': 0, 'timeouts': 0, 'unshared': 2}
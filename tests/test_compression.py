@@ -0,0 +1,90 @@
+import gzip
+
+from project import compression, mywsgi
+from project.compression import CompressionMiddleware, accepted_codings
+from project.response import HttpResponse, StreamingHttpResponse
+from project.urlsconf import url
+
+HTML = b'<p>' + b'compressible text ' * 100 + b'</p>'
+
+
+def test_accepted_codings():
+    assert accepted_codings('gzip, deflate, br') == {'gzip', 'deflate', 'br'}
+    assert accepted_codings('GZIP;q=0.5, br; q=0, identity;q=bad') == {'gzip'}
+    assert accepted_codings('') == {''}
+
+
+def test_compresses_whole_bodies(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    middleware = CompressionMiddleware()
+    response = HttpResponse(HTML)
+    response['ETag'] = '"abc"'
+    response = middleware.process_response({'HTTP_ACCEPT_ENCODING': 'gzip, br'}, response)
+    assert response['Content-Encoding'] == 'gzip'
+    assert response['Vary'] == 'Accept-Encoding'
+    assert response['ETag'] == 'W/"abc"'
+    assert response['Content-Length'] == str(len(response.content))
+    assert gzip.decompress(response.content) == HTML
+
+    plain = middleware.process_response({}, HttpResponse(HTML))
+    assert plain.content == HTML and 'Content-Encoding' not in plain
+    assert plain['Vary'] == 'Accept-Encoding'
+
+    response = HttpResponse(HTML)
+    response['Vary'] = 'Cookie'
+    assert middleware.process_response({'HTTP_ACCEPT_ENCODING': 'br'}, response)['Vary'] == 'Cookie, Accept-Encoding'
+
+
+def test_skips_small_encoded_and_binary_bodies():
+    middleware = CompressionMiddleware()
+    environ = {'HTTP_ACCEPT_ENCODING': 'gzip'}
+    small = middleware.process_response(environ, HttpResponse(b'<p>short</p>'))
+    assert 'Content-Encoding' not in small and 'Vary' not in small
+
+    encoded = HttpResponse(HTML)
+    encoded['Content-Encoding'] = 'br'
+    assert middleware.process_response(environ, encoded).content == HTML
+
+    image = middleware.process_response(environ, HttpResponse(HTML, content_type='image/png'))
+    assert image.content == HTML and 'Content-Encoding' not in image
+
+    json = middleware.process_response(environ, HttpResponse(HTML, content_type='application/vnd.api+json'))
+    assert json['Content-Encoding'] == 'gzip'
+
+
+def test_compresses_streams_incrementally(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    produced = []
+
+    def chunks():
+        for i in range(50):
+            produced.append(i)
+            yield HTML
+
+    middleware = CompressionMiddleware(buffer_size=4096)
+    response = StreamingHttpResponse(chunks())
+    response['Content-Length'] = str(len(HTML) * 50)
+    response = middleware.process_response({'HTTP_ACCEPT_ENCODING': 'gzip'}, response)
+    assert response['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response
+
+    body = iter(response)
+    first = next(body)
+    # The compressor was flushed once buffer_size bytes of input went in.
+    assert len(produced) * len(HTML) <= 4096 + len(HTML)
+    assert gzip.decompress(first + b''.join(body)) == HTML * 50
+
+
+def test_application_compresses(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    statuses = []
+
+    def start_response(status, response_headers):
+        statuses.append((status, dict(response_headers)))
+
+    monkeypatch.setattr(mywsgi, 'url_patterns', [url('^$', lambda request: HttpResponse(HTML))])
+    monkeypatch.setattr(mywsgi, 'middleware', [CompressionMiddleware()])
+    body = mywsgi.application({'PATH_INFO': '/', 'HTTP_ACCEPT_ENCODING': 'gzip'}, start_response)
+    assert gzip.decompress(b''.join(body)) == HTML
+    assert statuses[-1][1]['Content-Encoding'] == 'gzip'
+    assert statuses[-1][1]['Content-Length'] == str(len(b''.join(body)))
@@ -0,0 +1,93 @@
+import threading
+
+from project import mywsgi, resolvers
+from project.metrics import Histogram, Metrics
+from project.resolvers import Resolver, ResolveCache, ResolveTrace
+from project.response import HttpResponse
+from project.urlsconf import url, include
+
+
+def _view(request, *args, **kwargs):
+    return HttpResponse('view')
+
+
+def _trace(resolver, path):
+    trace = ResolveTrace()
+    resolved = resolver.resolve(path, trace)
+    return resolved is not None, trace.tried, trace.depth
+
+
+def test_histogram_sums_threads():
+    histogram = Histogram('test_seconds', 'Test.', buckets=(1, 2, 5))
+    histogram.observe(0.5)
+    histogram.observe(2)
+
+    def work():
+        for value in (1, 3, 7):
+            histogram.observe(value)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    del threads, thread
+
+    assert histogram.snapshot() == ([5, 6, 10, 14], 14, 2.5 + 4 * 11)
+    assert histogram.render().splitlines() == [
+        '# HELP test_seconds Test.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{le="1.0"} 5',
+        'test_seconds_bucket{le="2.0"} 6',
+        'test_seconds_bucket{le="5.0"} 10',
+        'test_seconds_bucket{le="+Inf"} 14',
+        'test_seconds_sum 46.5',
+        'test_seconds_count 14',
+    ]
+
+
+def test_resolve_trace_counts_patterns_and_depth(monkeypatch):
+    monkeypatch.setattr(resolvers, '_TRIE_MIN_ROUTES', 0)
+    patterns = [
+        url('^$', _view),
+        url('^path([1,2])$', _view),
+        url('^root(?P<root>[1,2])/', include('tests.urls_config')),
+        url('^loose/', [url('path([1,2])$', _view)]),
+    ]
+    resolver = Resolver(patterns)
+    assert _trace(resolver, '') == (True, 1, 0)
+    # '^$' shares the combined regex and is tried first.
+    assert _trace(resolver, 'path2') == (True, 2, 0)
+    assert _trace(resolver, 'root1/sdpath1/subdpath2') == (True, 6, 2)
+    assert _trace(resolver, 'loose/xpath1') == (True, 3, 1)
+    assert _trace(resolver, 'nothing') == (False, 1, 0)
+
+    cache = ResolveCache()
+    trace = ResolveTrace()
+    cache.resolve(resolver, 'path1', trace)
+    assert trace.tried == 2
+    trace = ResolveTrace()
+    cache.resolve(resolver, 'path1', trace)
+    assert trace.tried == 0
+
+
+def test_metrics_endpoint(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(resolvers, '_TRIE_MIN_ROUTES', 0)
+    monkeypatch.setattr(mywsgi, 'url_patterns', [url('^path([1,2])$', _view)])
+    monkeypatch.setattr(mywsgi, 'metrics', metrics)
+    monkeypatch.setattr(mywsgi, 'middleware', [metrics])
+
+    start_response = lambda status, headers: None
+    assert b''.join(mywsgi.application({'PATH_INFO': '/path1'}, start_response)) == b'view'
+    mywsgi.application({'PATH_INFO': '/missing'}, start_response)
+    assert metrics.resolve.snapshot()[1] == 2
+    assert metrics.view.snapshot()[1] == 1
+    # No pattern shares a prefix with '/missing'.
+    assert metrics.patterns_tried.snapshot()[1:] == (2, 1)
+
+    body = b''.join(mywsgi.application({'PATH_INFO': '/__metrics__'}, start_response)).decode()
+    assert 'mywsgi_resolve_seconds_count 2\n' in body
+    assert 'mywsgi_view_seconds_count 1\n' in body
+    assert 'mywsgi_resolve_patterns_tried_bucket{le="1.0"} 2\n' in body
+    assert '# TYPE mywsgi_write_seconds histogram\n' in body
@@ -1,7 +1,8 @@
 from project import mywsgi
 import pytest
 from project.exceptions import Http404, ImproperlyConfigured
-from project.response import HttpResponseServerError, HttpResponseNotFound
+from project.response import HttpResponse, HttpResponseServerError, HttpResponseNotFound, StreamingHttpResponse, \
+    FileResponse
 from project.urlsconf import url
 
 def test_application(monkeypatch):
@@ -94,4 +95,174 @@ def test_path_to_response_with_include_url_patterns(monkeypatch):
         mywsgi.path_to_response({'PATH_INFO': '/root1/sdpath/subdpath1'})
 
 
+def test_application_sets_content_length(monkeypatch):
+    headers = {}
 
+    def start_response(status, response_headers):
+        headers.update(response_headers)
+
+    monkeypatch.setattr(mywsgi, "url_patterns", [url('^$', lambda request: HttpResponse('<h1>root</h1>'))])
+    response = mywsgi.application({'PATH_INFO': '/'}, start_response)
+    assert headers['Content-Length'] == str(len(response.content)) == '13'
+
+
+def test_application_streams_lazily(monkeypatch):
+    produced = []
+    closed = []
+
+    def chunks():
+        try:
+            for number in range(3):
+                produced.append(number)
+                yield 'chunk{}'.format(number)
+        finally:
+            closed.append(True)
+
+    headers = {}
+
+    def start_response(status, response_headers):
+        headers.update(response_headers)
+
+    monkeypatch.setattr(mywsgi, "url_patterns", [url('^$', lambda request: StreamingHttpResponse(chunks()))])
+    response = mywsgi.application({'PATH_INFO': '/'}, start_response)
+    assert 'Content-Length' not in headers
+    assert produced == []
+
+    body = iter(response)
+    assert next(body) == b'chunk0'
+    assert produced == [0]
+    response.close()
+    assert closed == [True]
+
+    with pytest.raises(AttributeError):
+        response.content
+
+
+def test_application_file_response_ranges(monkeypatch, tmpdir):
+    from wsgiref.util import FileWrapper
+
+    path = tmpdir.join('data.txt')
+    path.write_binary(b'0123456789')
+    statuses = []
+
+    def start_response(status, response_headers):
+        statuses.append((status, dict(response_headers)))
+
+    monkeypatch.setattr(mywsgi, "url_patterns", [url('^data$', lambda request: FileResponse(open(str(path), 'rb')))])
+
+    body = mywsgi.application({'PATH_INFO': '/data', 'wsgi.file_wrapper': FileWrapper}, start_response)
+    assert isinstance(body, FileWrapper)
+    assert b''.join(body) == b'0123456789'
+    body.close()
+    assert statuses[-1][0] == '200 OK'
+    assert statuses[-1][1]['Content-Type'] == 'text/plain'
+    assert statuses[-1][1]['Content-Length'] == '10'
+
+    for header, status, expected, content_range in [
+            ('bytes=2-4', '206 Partial Content', b'234', 'bytes 2-4/10'),
+            ('bytes=-3', '206 Partial Content', b'789', 'bytes 7-9/10'),
+            ('bytes=8-', '206 Partial Content', b'89', 'bytes 8-9/10'),
+            ('bytes=10-', '416 Requested Range Not Satisfiable', b'', 'bytes */10'),
+            ('bytes=1-2,4-5', '200 OK', b'0123456789', None)]:
+        response = mywsgi.application({'PATH_INFO': '/data', 'HTTP_RANGE': header}, start_response)
+        assert b''.join(response) == expected
+        response.close()
+        assert response.file_to_stream.closed
+        assert statuses[-1][0] == status
+        assert statuses[-1][1].get('Content-Range') == content_range
+        assert statuses[-1][1]['Content-Length'] == str(len(expected))
+
+
+def test_response_headers_and_cookies():
+    response = HttpResponse('ok')
+    assert not hasattr(response, '__dict__')
+    assert response._cookies is None and response._closables is None
+    assert response.wsgi_headers() == [('Content-Type', 'text/html; charset=utf-8')]
+
+    response['X-Latin'] = 'caf\xe9'
+    response['X-Number'] = 3
+    response.set_cookie('session', 'abc', path='/app')
+    assert response.wsgi_headers() == [('Content-Type', 'text/html; charset=utf-8'), ('X-Latin', 'caf\xe9'),
+                                       ('X-Number', '3'), ('Set-Cookie', 'session=abc; Path=/app')]
+    with pytest.raises(ValueError):
+        response['X-Bad'] = 'a\r\nb'
+
+    not_found = HttpResponseNotFound()
+    assert not_found.status_code == 404
+    not_found.status_code = 410
+    assert (not_found.status_code, not_found.reason_phrase) == (410, 'Gone')
+
+
+class _RecordingMiddleware(object):
+
+    def __init__(self, name, calls, short_circuit=False, handle_errors=False):
+        self.name = name
+        self.calls = calls
+        self.short_circuit = short_circuit
+        self.handle_errors = handle_errors
+
+    def process_request(self, environ):
+        self.calls.append((self.name, 'request'))
+        if self.short_circuit and environ['PATH_INFO'] == '/short':
+            return HttpResponse('short {}'.format(self.name))
+
+    def process_view(self, environ, callback, args, kwargs):
+        self.calls.append((self.name, 'view', args))
+
+    def process_exception(self, environ, exception):
+        self.calls.append((self.name, 'exception', type(exception).__name__))
+        if self.handle_errors:
+            return HttpResponse('handled by {}'.format(self.name), status=500)
+
+    def process_response(self, environ, response):
+        self.calls.append((self.name, 'response'))
+        response['X-Seen-By'] = response.get('X-Seen-By', '') + self.name
+        return response
+
+
+def test_middleware_hooks_run_in_order(monkeypatch):
+    calls = []
+
+    def failing(request):
+        raise ValueError('boom')
+
+    monkeypatch.setattr(mywsgi, 'url_patterns', [
+        url('^path([1,2])$', lambda request, number: HttpResponse('path')),
+        url('^fail$', failing),
+    ])
+    middleware = [_RecordingMiddleware('a', calls, handle_errors=True),
+                  _RecordingMiddleware('b', calls, short_circuit=True)]
+    handler = mywsgi.build_handler(middleware)
+
+    response = handler({'PATH_INFO': '/path1'})
+    assert response.content == b'path' and response['X-Seen-By'] == 'ba'
+    assert calls == [('a', 'request'), ('b', 'request'), ('a', 'view', ('1',)), ('b', 'view', ('1',)),
+                     ('b', 'response'), ('a', 'response')]
+
+    del calls[:]
+    response = handler({'PATH_INFO': '/short'})
+    assert response.content == b'short b' and response['X-Seen-By'] == 'ba'
+    assert calls == [('a', 'request'), ('b', 'request'), ('b', 'response'), ('a', 'response')]
+
+    del calls[:]
+    response = handler({'PATH_INFO': '/fail'})
+    assert (response.status_code, response.content) == (500, b'handled by a')
+    assert calls[-3:] == [('b', 'exception', 'ValueError'), ('a', 'exception', 'ValueError'), ('a', 'response')]
+
+    del calls[:]
+    assert handler({'PATH_INFO': '/missing'}).content == b'handled by a'
+    assert calls[2] == ('b', 'exception', 'Http404')
+
+
+def test_application_uses_middleware(monkeypatch):
+    calls = []
+    monkeypatch.setattr(mywsgi, 'url_patterns', [url('^$', lambda request: HttpResponse('root'))])
+    monkeypatch.setattr(mywsgi, 'middleware', [_RecordingMiddleware('a', calls)])
+    handler = mywsgi.get_handler(mywsgi.middleware)
+    assert mywsgi.get_handler(mywsgi.middleware) is handler
+
+    statuses = []
+    body = mywsgi.application({'PATH_INFO': '/'}, lambda status, headers: statuses.append(dict(headers)))
+    assert b''.join(body) == b'root'
+    assert statuses[0]['X-Seen-By'] == 'a'
+    assert isinstance(mywsgi.application({'PATH_INFO': '/x'}, lambda status, headers: None), HttpResponseNotFound)
@@ -0,0 +1,90 @@
+import json
+import os
+import pstats
+import time
+
+import pytest
+
+from project.exceptions import ImproperlyConfigured
+from project.profiling import ProfilingMiddleware
+from project.response import HttpResponse
+from project.urlsconf import url
+
+
+def _view(request, *args, **kwargs):
+    return HttpResponse('view')
+
+
+def _slow_view(request, *args, **kwargs):
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+    return HttpResponse('slow')
+
+
+def _profiles(directory):
+    metas = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                metas.append(json.load(f))
+    return metas
+
+
+url_patterns = [url('^path([1,2])$', _view), url('^slow$', _slow_view)]
+
+
+def test_profile_on_header(client, tmpdir):
+    profiler = ProfilingMiddleware(str(tmpdir), token='secret', keep=2)
+    client.install(url_patterns, [profiler])
+
+    assert client.get('/path1').body == b'view'
+    assert client.get('/path1', HTTP_X_PROFILE='wrong').body == b'view'
+    assert _profiles(str(tmpdir)) == []
+
+    assert client.get('/path2', HTTP_X_PROFILE='secret').body == b'view'
+    [meta] = _profiles(str(tmpdir))
+    assert meta['path'] == '/path2'
+    assert meta['status'] == 200
+    assert meta['route'] == {'view': _view.__module__ + '._view', 'args': ['2'], 'kwargs': {}}
+    stats = pstats.Stats(os.path.join(str(tmpdir), meta['profile']))
+    assert any(function == '_view' for _, _, function in stats.stats)
+
+    client.get('/path1', HTTP_X_PROFILE='secret')
+    client.get('/missing', HTTP_X_PROFILE='secret')
+    metas = _profiles(str(tmpdir))
+    assert [meta['path'] for meta in metas] == ['/path1', '/missing']
+    assert metas[1]['route'] is None
+    assert metas[1]['status'] == 'Http404'
+    assert len(os.listdir(str(tmpdir))) == 4
+
+
+def test_header_profiling_requires_a_token(client, tmpdir):
+    with pytest.raises(ImproperlyConfigured):
+        ProfilingMiddleware(str(tmpdir))
+    with pytest.raises(ImproperlyConfigured):
+        ProfilingMiddleware(str(tmpdir), header='X-Debug', token='')
+    client.install(url_patterns, [ProfilingMiddleware(str(tmpdir), header=None)])
+    client.get('/path1', HTTP_X_PROFILE='')
+    assert _profiles(str(tmpdir)) == []
+
+
+def test_profile_rate(client, tmpdir):
+    client.install(url_patterns, [ProfilingMiddleware(str(tmpdir), header=None, rate=1.0)])
+    client.get('/path1')
+    assert len(_profiles(str(tmpdir))) == 1
+
+
+def test_sample_slow_requests(client, tmpdir):
+    profiler = ProfilingMiddleware(str(tmpdir), header=None, threshold=0.02, interval=0.002)
+    client.install(url_patterns, [profiler])
+
+    assert client.get('/path1').body == b'view'
+    assert _profiles(str(tmpdir)) == []
+    assert client.get('/slow').body == b'slow'
+    [meta] = _profiles(str(tmpdir))
+    assert meta['path'] == '/slow'
+    assert meta['samples'] > 0
+    assert profiler.sampler.watched == {}
+    with open(os.path.join(str(tmpdir), meta['profile'])) as f:
+        assert '_slow_view (test_profiling.py:' in f.read()
@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+from project import mywsgi
+from project.request import HttpRequest, RawPostDataException, parse_cookie
+from project.response import HttpResponse
+from project.urlsconf import url
+
+
+def _request(body=b'', **environ):
+    environ.setdefault('REQUEST_METHOD', 'POST')
+    environ.setdefault('PATH_INFO', '/form')
+    environ['wsgi.input'] = io.BytesIO(body)
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return HttpRequest(environ)
+
+
+def test_query_cookies_and_headers():
+    request = _request(QUERY_STRING='a=1&a=2&b=&c=%20x', HTTP_COOKIE='sessionid=abc; theme="dark"; flag',
+                       HTTP_X_FORWARDED_FOR='10.0.0.1', CONTENT_TYPE='text/plain')
+    assert request._get is None and request._cookies is None and request._headers is None
+    assert request.GET['a'] == '2'
+    assert request.GET.getlist('a') == ['1', '2']
+    assert request.GET['b'] == ''
+    assert request.GET['c'] == ' x'
+    assert request.GET is request.GET
+    assert request.COOKIES == {'sessionid': 'abc', 'theme': 'dark', '': 'flag'}
+    assert request.headers['x-forwarded-for'] == '10.0.0.1'
+    assert request.headers.get('Content-Type') == 'text/plain'
+    assert 'Content-Length' in request.headers
+    assert request.get_full_path() == '/form?a=1&a=2&b=&c=%20x'
+    assert request.method == 'POST'
+    assert request['PATH_INFO'] == '/form'
+    assert parse_cookie('') == {}
+
+
+def test_streaming_read_stops_at_content_length():
+    request = _request(b'line one\nline two\n')
+    request.environ['wsgi.input'] = io.BytesIO(b'line one\nline two\nnot the body')
+    assert request.readline() == b'line one\n'
+    assert request.read(4) == b'line'
+    assert request.read() == b' two\n'
+    assert request.read() == b''
+    with pytest.raises(RawPostDataException):
+        request.body
+
+
+def test_body_is_read_once():
+    request = _request(b'a=1')
+    assert request.body == b'a=1'
+    assert request.body is request.body
+    assert list(request) == [b'a=1']
+    assert _request().body == b''
+
+
+def test_views_get_a_request(monkeypatch):
+    seen = []
+
+    def view(request, number):
+        seen.append(request)
+        return HttpResponse('page %s of %s' % (request.GET.get('page'), number))
+
+    monkeypatch.setattr(mywsgi, 'url_patterns', [url('^path([1,2])$', view)])
+    environ = {'PATH_INFO': '/path1', 'QUERY_STRING': 'page=3'}
+    assert b''.join(mywsgi.application(environ, lambda status, headers: None)) == b'page 3 of 1'
+    assert isinstance(seen[0], HttpRequest)
+    assert seen[0].environ is environ
@@ -0,0 +1,502 @@
+import datetime
+import sys
+import threading
+import uuid
+
+import pytest
+
+from project import converters, mywsgi, resolvers
+from project import urlsconf
+from project.exceptions import Http404, ImproperlyConfigured, NoReverseMatch
+from project.resolvers import Resolver, ResolveCache, freeze, get_resolver, reverse, _literal_prefix
+from project.urlsconf import url, include, path
+
+
+def _view(version, *args, **kwargs):
+    return args, kwargs
+
+
+def _other_view(version, *args, **kwargs):
+    return 'other', args, kwargs
+
+
+def _linear_resolve(patterns, path):
+    for pattern in patterns:
+        obj = pattern.resolve(path)
+        if obj:
+            return obj
+
+
+def test_resolver_matches_linear_scan():
+    patterns = [
+        url('^$', _view),
+        url('^path([1,2])$', _view),
+        url('^item(?P<id>[0-9]+)$', _view),
+        url('^item(?P<id>[0-9]+)/(?P<part>[a-z]+)$', _other_view),
+        url('^root(?P<root>[1,2])/', include('tests.urls_config')),
+        url('^root([1,2])/', include('tests.urls_config')),
+    ]
+    resolver = Resolver(patterns)
+    for path in ['', 'path1', 'path3', 'item12', 'item12/abc', 'root1/', 'root1/path2',
+                 'root2/dpath1', 'root1/sdpath2/subdpath1', 'root1/sdpath2/', 'nothing']:
+        assert resolver.resolve(path) == _linear_resolve(patterns, path)
+
+
+def test_resolver_keeps_first_match_order():
+    patterns = [
+        url('^path', _other_view),
+        url('^path([1,2])$', _view),
+    ]
+    assert Resolver(patterns).resolve('path1')[0] is _other_view
+
+
+def test_resolver_continues_after_include_miss():
+    patterns = [
+        url('^root(?P<root>[1,2])/', include('tests.include_to_urls_conf')),
+        url('^root(?P<root>[1,2])/(?P<rest>.*)$', _other_view),
+    ]
+    assert Resolver(patterns).resolve('root1/unknown') == (_other_view, (), {'root': '1', 'rest': 'unknown'})
+
+
+def test_resolver_with_uncombinable_patterns():
+    patterns = [
+        url('^(?P<word>[a-z]+)-(?P=word)$', _view),
+        url('path([1,2])$', _other_view),
+        url('(?i)^upper$', _view),
+    ]
+    resolver = Resolver(patterns)
+    assert resolver.resolve('ab-ab') == (_view, (), {'word': 'ab'})
+    assert resolver.resolve('xpath2') == (_other_view, ('2',), {})
+    assert resolver.resolve('UPPER') == (_view, (), {})
+    assert resolver.resolve('ab-cd') is None
+
+
+def test_resolver_with_top_level_alternation():
+    patterns = [
+        url('^first$', _other_view),
+        url(r'^a|b', _view),
+        url('^root/', [url(r'^x|y', _view)]),
+        url('^last$', _other_view),
+    ]
+    resolver = Resolver(patterns)
+    for path in ['a', 'xb', 'b', 'first', 'last', 'root/x', 'root/zy', 'root/z', 'zzz']:
+        assert resolver.resolve(path) == _linear_resolve(patterns, path), path
+    assert resolver.resolve('xb') == (_view, (), {})
+
+
+def test_resolver_flattens_include_trees():
+    patterns = [
+        url('^root(?P<root>[1,2])/', include('tests.urls_config')),
+        url('^root([1,2])/', include('tests.urls_config')),
+    ]
+    resolver = Resolver(patterns)
+    assert len(resolver.routes) == 10
+    assert all(route.include is None for route in resolver.routes)
+    for path in ['root1/', 'root1/path2', 'root2/dpath1', 'root1/sdpath2/', 'root1/sdpath2/subdpath1',
+                 'root1/sdpath/subdpath1', 'root3/path1', 'root1/path1x']:
+        assert resolver.resolve(path) == _linear_resolve(patterns, path)
+
+
+def test_flattened_prefix_keeps_level_by_level_args():
+    patterns = [
+        url('^api/', [
+            url('^v([0-9])/', [url('^users/(?P<id>[0-9]+)$', _view), url('^users$|^members$', _other_view)]),
+        ]),
+        url('^(x)/', [url('^(y)/', [url('^(?P<id>[0-9]+)$|^z$', _view)])]),
+    ]
+    resolver = Resolver(patterns)
+    assert [route.include is not None for route in resolver.routes] == [True, True]
+    for path in ['api/v1/users/5', 'api/v1/users', 'api/v2/members', 'api/v1/other', 'x/y/5', 'x/y/z']:
+        assert resolver.resolve(path) == _linear_resolve(patterns, path), path
+    assert resolver.resolve('api/v1/users/5') == (_view, (), {'id': '5'})
+    assert resolver.resolve('api/v1/users') == (_other_view, ('1',), {})
+    assert resolver.resolve('x/y/5') == (_view, ('x',), {'id': '5'})
+
+
+def test_word_boundaries_are_not_glued_after_a_prefix():
+    patterns = [
+        url('^..(?!b)', [url(r'^\b(?=a)', _view)]),
+        url('^x', [url(r'^\Ba', _other_view)]),
+    ]
+    resolver = Resolver(patterns)
+    assert all(route.include is not None for route in resolver.routes)
+    for path in ['..a', 'xxa', 'xa', 'x a', '  a']:
+        assert resolver.resolve(path) == _linear_resolve(patterns, path), path
+    # Resolved level by level, the boundaries sit at the start of the sub path.
+    assert resolver.resolve('xxa') == (_view, (), {})
+    assert resolver.resolve('xa') is None
+
+
+def test_flattened_prefix_does_not_backtrack():
+    patterns = [
+        url('^a+', [url('^ab$', _view)]),
+        url('^(?P<id>[0-9]+)/', [url('^(?P<id>[a-z]+)$', _view)]),
+    ]
+    resolver = Resolver(patterns)
+    assert resolver.resolve('aab') is None
+    assert resolver.resolve('12/x') == _linear_resolve(patterns, '12/x') == (_view, ('12',), {'id': 'x'})
+
+
+def test_unflattenable_include_is_resolved_per_level():
+    patterns = [
+        url('^root/', [url('path([1,2])$', _view), url('^other$', _other_view)]),
+    ]
+    resolver = Resolver(patterns)
+    assert [route.include for route in resolver.routes] == [patterns[0]]
+    assert resolver.resolve('root/xpath1') == (_view, ('1',), {})
+    assert resolver.resolve('root/other') == (_other_view, (), {})
+
+
+def test_literal_prefix():
+    assert _literal_prefix('^path([1,2])$') == 'path'
+    assert _literal_prefix('^root(?P<root>[1,2])/') == 'root'
+    assert _literal_prefix(r'^static\.files/') == 'static.files/'
+    assert _literal_prefix('^items?/') == 'item'
+    assert _literal_prefix('^a+b') == 'a'
+    assert _literal_prefix('^$') == ''
+    assert _literal_prefix('^path|^other') == ''
+    assert _literal_prefix('path$') == ''
+    assert _literal_prefix(r'^\d+') == ''
+
+
+def test_resolver_only_tries_patterns_sharing_the_prefix():
+    patterns = [url('^page%d/(?P<id>[0-9]+)$' % number, _view) for number in range(50)]
+    patterns.append(url('^(?P<slug>[a-z]+)$', _other_view))
+    patterns.append(url('[0-9]$', _other_view))
+    resolver = Resolver(patterns)
+
+    candidates = resolver._candidates('page7/12')
+    assert [getattr(unit, 'indexes', None) or unit.index for unit in candidates] == [[7, 50], 51]
+    assert resolver.resolve('page7/12') == (_view, (), {'id': '12'})
+    assert resolver.resolve('page42/1') == (_view, (), {'id': '1'})
+    assert resolver.resolve('pages') == (_other_view, (), {'slug': 'pages'})
+    assert resolver.resolve('other1') == (_other_view, (), {})
+    assert resolver.resolve('page7/x') is None
+
+
+def test_trie_nodes_without_routes_share_candidates(monkeypatch):
+    monkeypatch.setattr(resolvers, '_TRIE_MIN_ROUTES', 0)
+    patterns = [url('^path([1,2])$', _view), url('^pathology/$', _other_view), url('^pat/$', _view)]
+    resolver = Resolver(patterns)
+    # 'pat' and 'patholo' stop at nodes without routes of their own.
+    assert resolver._candidates('pat') is resolver._candidates('')
+    assert resolver._candidates('patholo') is resolver._candidates('path1')
+    assert resolver._candidates('pathology/') is not resolver._candidates('path1')
+
+    warmed = Resolver(patterns)
+    warmed.warm()
+    nodes = [warmed._trie]
+    with_units = 0
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.children.values())
+        assert (node.units is not None) == bool(node.indexes or node is warmed._trie)
+        with_units += node.units is not None
+    assert with_units == 4
+    assert resolver.resolve('pat/') == (_view, (), {})
+    assert resolver.resolve('pathology/') == (_other_view, (), {})
+
+
+def test_short_table_has_no_trie():
+    patterns = [url('^path([1,2])$', _view), url('^item/(?P<id>[0-9]+)$', _other_view)]
+    resolver = Resolver(patterns)
+    assert not resolver._trie.children
+    assert resolver._candidates('path1') is resolver._candidates('other')
+    for path in ['path1', 'item/3', 'item/x', 'other']:
+        assert resolver.resolve(path) == _linear_resolve(patterns, path)
+
+
+def test_resolver_reports_invalid_regex():
+    with pytest.raises(ImproperlyConfigured):
+        Resolver([url(r'^d({1,-1}$', _view)])
+
+
+def test_get_resolver_rebuilds_when_patterns_swapped(monkeypatch):
+    first = [url('^$', _view)]
+    second = [url('^$', _other_view)]
+    assert get_resolver(first) is get_resolver(first)
+    assert get_resolver(second).patterns is second
+
+    monkeypatch.setattr(mywsgi, 'url_patterns', second)
+    assert mywsgi.path_to_response({'PATH_INFO': '/'}) == ('other', (), {})
+    with pytest.raises(Http404):
+        mywsgi.path_to_response({'PATH_INFO': '/path1'})
+
+
+def test_resolve_and_reverse_against_different_lists(monkeypatch):
+    served = [url('^path([1,2])$', _view, name='path')]
+    named = [url('^named([1,2])$', _other_view, name='named')]
+    monkeypatch.setattr(mywsgi, 'url_patterns', served)
+    monkeypatch.setattr(urlsconf, 'url_patterns', named)
+    cache = ResolveCache()
+    monkeypatch.setattr(mywsgi, 'resolve_cache', cache)
+
+    resolver = get_resolver(served)
+    for _ in range(3):
+        assert mywsgi.resolve_path({'PATH_INFO': '/path1'}) == (_view, ('1',), {})
+        assert reverse('named', 2) == '/named2'
+    assert get_resolver(served) is resolver
+    assert get_resolver(named).patterns is named
+    # The cache was never emptied by a resolver swap.
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_resolve_cache_counts_and_evicts():
+    resolver = Resolver([url('^$', _view), url('^path([1,2])$', _other_view)])
+    cache = ResolveCache(maxsize=2)
+    assert cache.resolve(resolver, '') == (_view, (), {})
+    assert cache.resolve(resolver, '') == (_view, (), {})
+    assert cache.resolve(resolver, 'path1') == (_other_view, ('1',), {})
+    assert cache.resolve(resolver, 'path2') == (_other_view, ('2',), {})
+    assert (cache.hits, cache.misses, len(cache)) == (1, 3, 2)
+    assert '' not in cache._entries
+
+    assert cache.resolve(resolver, 'path3') is None
+    assert len(cache) == 2
+
+
+def test_resolve_cache_negative_mode_and_swap(monkeypatch):
+    calls = []
+
+    def view(version, *args, **kwargs):
+        calls.append(args)
+        return 'view'
+
+    cache = ResolveCache(maxsize=10, negative=True)
+    monkeypatch.setattr(mywsgi, 'resolve_cache', cache)
+    monkeypatch.setattr(mywsgi, 'url_patterns', [url('^path([1,2])$', view)])
+    for _ in range(3):
+        with pytest.raises(Http404):
+            mywsgi.path_to_response({'PATH_INFO': '/path3'})
+    assert mywsgi.path_to_response({'PATH_INFO': '/path1'}) == 'view'
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    monkeypatch.setattr(mywsgi, 'url_patterns', [url('^path([1-3])$', view)])
+    assert mywsgi.path_to_response({'PATH_INFO': '/path3'}) == 'view'
+    assert len(cache) == 1
+
+
+def test_freeze_reports_every_invalid_regex():
+    patterns = [
+        url(r'^d({1,-1}$', _view),
+        url('^ok$', _view),
+        url('^root/', [url(r'^(unclosed$', _view)]),
+    ]
+    with pytest.raises(ImproperlyConfigured) as excinfo:
+        freeze(patterns)
+    assert 'd({1,-1}$' in str(excinfo.value)
+    assert '(unclosed$' in str(excinfo.value)
+
+
+def test_freeze_installs_warm_resolver():
+    patterns = [url('^$', _view), url('^root(?P<root>[1,2])/', include('tests.urls_config'))]
+    resolver = freeze(patterns)
+    assert get_resolver(patterns) is resolver
+    assert all(route._compiled is not None for route in resolver.routes)
+    assert resolver._trie.units is not None
+    assert resolver.resolve('root2/sdpath1/subdpath2') == _linear_resolve(patterns, 'root2/sdpath1/subdpath2')
+
+
+def test_freeze_reuses_route_table_file(tmpdir):
+    cache_file = str(tmpdir.join('routes.json'))
+    patterns = [
+        url('^root(?P<root>[1,2])/', include('tests.urls_config')),
+        url('^other/', [url('path([1,2])$', _other_view)]),
+    ]
+    first = freeze(patterns, cache_file=cache_file)
+    with open(cache_file) as f:
+        written = f.read()
+
+    second = freeze(patterns, cache_file=cache_file)
+    with open(cache_file) as f:
+        assert f.read() == written
+    assert [route.state() for route in second.routes] == [route.state() for route in first.routes]
+    for path in ['root1/', 'root1/path2', 'root2/sdpath1/subdpath1', 'other/xpath1', 'missing']:
+        assert second.resolve(path) == _linear_resolve(patterns, path)
+
+    freeze([url('^changed$', _view)], cache_file=cache_file)
+    with open(cache_file) as f:
+        assert f.read() != written
+
+
+def test_reverse_through_includes():
+    patterns = [
+        url('^$', _view, name='home'),
+        url('^path([1,2])$', _view, name='path'),
+        url('^root(?P<root>[1,2])/', [
+            url('^item(?P<id>[0-9]+)/$', _view, name='item'),
+            url(r'^files/(?P<name>[a-z]+)\.txt$', _other_view, name='file'),
+        ]),
+        url('^loose(?:x)?$', _view, name='loose'),
+    ]
+    resolver = Resolver(patterns)
+    assert resolver.reverse('home') == '/'
+    assert resolver.reverse('path', 2) == '/path2'
+    assert resolver.reverse('item', root=1, id=42) == '/root1/item42/'
+    assert resolver.reverse('item', 1, 42) == '/root1/item42/'
+    assert resolver.reverse('file', root='2', name='abc') == '/root2/files/abc.txt'
+    assert resolver.resolve(resolver.reverse('item', root=1, id=42)[1:]) == (_view, ('1',), {'root': '1', 'id': '42'})
+
+    for name, args, kwargs in [('path', (3,), {}), ('path', (), {}), ('item', (), {'root': 1}),
+                               ('item', (), {'root': 1, 'id': 'x'}), ('missing', (), {}),
+                               ('loose', (), {})]:
+        with pytest.raises(NoReverseMatch):
+            resolver.reverse(name, *args, **kwargs)
+    with pytest.raises(ValueError):
+        resolver.reverse('item', 1, id=2)
+
+
+def test_reverse_memoizes_routes_without_arguments(monkeypatch):
+    resolver = Resolver([url('^about/$', _view, name='about')])
+    assert resolver.reverse('about') == '/about/'
+    assert resolver._reverse_cache == {'about': '/about/'}
+    resolver._reverse_index = {}
+    assert resolver.reverse('about') == '/about/'
+
+    monkeypatch.setattr(urlsconf, 'url_patterns', [url('^path([1,2])$', _view, name='path')])
+    assert reverse('path', 1) == '/path1'
+
+
+def test_path_routes_convert_segments():
+    item_uuid = 'a8098c1a-f86e-11da-bd1a-00112444be1e'
+    patterns = [
+        path('', _view, name='home'),
+        path('items/<int:id>/', _view, name='item'),
+        path('items/<slug:slug>/', _other_view, name='item-slug'),
+        path('files/<uuid:key>/<name>', _view),
+        path('blog/<int:year>/', [path('<slug:slug>/', _other_view, name='post')]),
+    ]
+    resolver = Resolver(patterns)
+    assert resolver.resolve('') == (_view, (), {})
+    assert resolver.resolve('items/42/') == (_view, (), {'id': 42})
+    assert resolver.resolve('items/some-thing/') == (_other_view, (), {'slug': 'some-thing'})
+    assert resolver.resolve('files/%s/a.txt' % item_uuid) == (_view, (), {'key': uuid.UUID(item_uuid), 'name': 'a.txt'})
+    assert resolver.resolve('blog/2016/hello/') == (_other_view, (), {'year': 2016, 'slug': 'hello'})
+    for missing in ['items/42', 'items/4 2/', 'items/42/x', 'files/%s/' % item_uuid.upper(), 'files/x/a',
+                    'blog/x/hello/', 'blog/2016/']:
+        assert resolver.resolve(missing) is None, missing
+        assert _linear_resolve(patterns, missing) is None, missing
+
+    assert resolver.reverse('item', id=7) == '/items/7/'
+    assert resolver.reverse('post', year=2016, slug='hello') == '/blog/2016/hello/'
+    with pytest.raises(NoReverseMatch):
+        resolver.reverse('item', id='x')
+
+
+def test_path_and_regex_routes_keep_first_match_order():
+    patterns = [
+        path('items/<str:name>/', _other_view),
+        path('items/new/', _view),
+        url('^items/(?P<id>[0-9]+)/edit/$', _view),
+        path('items/<int:id>/edit/', _other_view),
+        path('items/<int:id>/<slug:action>/', _view),
+        path('other/', _other_view),
+    ]
+    resolver = Resolver(patterns)
+    for candidate in ['items/new/', 'items/1/', 'items/1/edit/', 'items/1/delete/', 'other/', 'missing']:
+        assert resolver.resolve(candidate) == _linear_resolve(patterns, candidate), candidate
+    assert resolver.resolve('items/new/')[0] is _other_view
+    assert resolver.resolve('items/1/edit/') == (_view, (), {'id': '1'})
+
+
+def test_registered_converter(monkeypatch):
+    class YearConverter(converters.Converter):
+        regex = '[0-9]{4}'
+
+        def to_python(self, value):
+            if len(value) != 4 or not value.isdigit():
+                raise ValueError(value)
+            return int(value)
+
+    monkeypatch.setattr(converters, '_converters', dict(converters.DEFAULT_CONVERTERS))
+    converters.register_converter(YearConverter, 'year')
+    resolver = Resolver([path('archive/<year:year>/', _view, name='archive')])
+    assert resolver.resolve('archive/2016/') == (_view, (), {'year': 2016})
+    assert resolver.resolve('archive/16/') is None
+    assert resolver.reverse('archive', year=2016) == '/archive/2016/'
+    assert all(isinstance(converter, converters.Converter) for converter in converters.DEFAULT_CONVERTERS.values())
+
+    class DateConverter(converters.Converter):
+        regex = '[0-9]{8}'
+
+        def to_python(self, value):
+            return datetime.datetime.strptime(value, '%Y%m%d').date()
+
+        def to_url(self, value):
+            if not isinstance(value, datetime.date):
+                raise ValueError(value)
+            return value.strftime('%Y%m%d')
+
+    converters.register_converter(DateConverter, 'ymd')
+    resolver = Resolver([path('day/<ymd:d>/', _view, name='day')])
+    day = datetime.date(2016, 1, 5)
+    assert resolver.resolve('day/20160105/') == (_view, (), {'d': day})
+    assert resolver.reverse('day', d=day) == '/day/20160105/'
+    with pytest.raises(NoReverseMatch):
+        resolver.reverse('day', d='20160105')
+
+
+def test_invalid_path_routes():
+    for route in ['/items/', 'items/<int:id', 'items/page<int:id>/', 'items/<unknown:id>/',
+                  'items/<int:id>/<int:id>/', 'items/<int:1d>/']:
+        with pytest.raises(ImproperlyConfigured):
+            path(route, _view)
+    with pytest.raises(ImproperlyConfigured):
+        path('items', [path('', _view)])
+
+
+def _forget_lazy_module(monkeypatch):
+    monkeypatch.delitem(sys.modules, 'tests.lazy_urls_conf', raising=False)
+
+
+def test_lazy_include_is_imported_on_first_match(monkeypatch, tmpdir):
+    _forget_lazy_module(monkeypatch)
+    lazy = include('tests.lazy_urls_conf', lazy=True)
+    patterns = [
+        url('^path([1,2])$', _view),
+        url('^lazy(?P<number>[0-9])/', lazy),
+    ]
+    resolver = freeze(patterns, cache_file=str(tmpdir.join('routes.json')))
+    assert 'tests.lazy_urls_conf' not in sys.modules
+    assert resolver.resolve('path1') == (_view, ('1',), {})
+    assert resolver.resolve('lazyx/') is None
+    assert not lazy.loaded
+
+    callback, args, kwargs = resolver.resolve('lazy1/items/5/')
+    assert lazy.loaded
+    assert kwargs == {'number': '1', 'id': 5}
+    assert callback(None) == 'lazy item'
+    assert _linear_resolve(patterns, 'lazy2/') == resolver.resolve('lazy2/')
+    assert resolver.reverse('lazy-item', number=3, id=4) == '/lazy3/items/4/'
+
+    # The route table written before the import is still valid after it.
+    again = freeze(patterns, cache_file=str(tmpdir.join('routes.json')))
+    assert again.resolve('lazy1/items/5/')[2] == {'number': '1', 'id': 5}
+
+
+def test_lazy_include_imports_once(monkeypatch):
+    imported = []
+
+    def slow_import(module_path):
+        imported.append(module_path)
+        threading.Event().wait(0.05)
+        return [url('^$', _view)]
+
+    monkeypatch.setattr(urlsconf, '_import_patterns', slow_import)
+    lazy = include('tests.anything', lazy=True)
+    threads = [threading.Thread(target=lazy.load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert imported == ['tests.anything']
+    assert len(lazy) == 1
+
+
+def test_freeze_can_load_lazy_includes(monkeypatch):
+    _forget_lazy_module(monkeypatch)
+    lazy = include('tests.lazy_urls_conf', lazy=True)
+    resolver = freeze([path('lazy/', lazy)], load_lazy=True)
+    assert lazy.loaded
+    assert resolver._reverse_index is not None
+    assert resolver.resolve('lazy/items/2/')[2] == {'id': 2}
@@ -0,0 +1,299 @@
+import http.client
+import os
+import signal
+import socket
+import threading
+import time
+
+import pytest
+
+runserver = pytest.importorskip('project.runserver', exc_type=ImportError)
+
+
+class _Handler(runserver.WSGIRequestHandler):
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+class _Prefork(runserver.PreforkServer):
+    respawn_delay = 0.1
+
+
+def _pid_app(environ, start_response):
+    body = str(os.getpid()).encode('ascii')
+    start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def _get(port, path='/'):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        connection.request('GET', path, headers={'Connection': 'close'})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def _wait_for(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.05)
+
+
+def _gone(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    return False
+
+
+def _make_server(application, threads=0):
+    return runserver.make_server('127.0.0.1', 0, application, threads=threads, handler_class=_Handler)
+
+
+def _connect(port, request):
+    connection = socket.create_connection(('127.0.0.1', port), timeout=10)
+    connection.sendall(request)
+    return connection
+
+
+def _read_response(rfile):
+    status = rfile.readline().decode('iso-8859-1').rstrip('\r\n')
+    headers = {}
+    for line in iter(rfile.readline, b'\r\n'):
+        name, value = line.decode('iso-8859-1').rstrip('\r\n').split(': ', 1)
+        headers[name] = value
+    if headers.get('Transfer-Encoding') == 'chunked':
+        body = b''
+        while True:
+            size = int(rfile.readline(), 16)
+            body += rfile.read(size + 2)[:-2]
+            if not size:
+                break
+    else:
+        body = rfile.read(int(headers.get('Content-Length', 0)))
+    return status, headers, body
+
+
+@pytest.fixture
+def serve():
+    """Serve an application from a thread; return the server and its port."""
+    servers = []
+
+    def start(application, handler_class=_Handler, **kwargs):
+        httpd = runserver.make_server('127.0.0.1', 0, application, handler_class=handler_class, **kwargs)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        servers.append(httpd)
+        return httpd, httpd.server_address[1]
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def prefork():
+    """Fork a supervisor serving ``httpd``; return the port and the supervisor's pid."""
+    supervisors = []
+
+    def start(httpd, workers):
+        pid = os.fork()
+        if not pid:
+            try:
+                _Prefork(httpd, workers).serve_forever()
+            finally:
+                os._exit(0)
+        supervisors.append(pid)
+        httpd.server_close()
+        return httpd.server_address[1], pid
+
+    yield start
+    for pid in supervisors:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+
+def test_prefork_workers_accept_on_a_non_blocking_socket(prefork):
+    def application(environ, start_response):
+        body = b'%d %d' % (os.getpid(), httpd.socket.getblocking())
+        start_response('200 OK', [('Content-Length', str(len(body)))])
+        return [body]
+
+    httpd = _make_server(application)
+    port, supervisor = prefork(httpd, workers=2)
+    status, body = _get(port)
+    worker, blocking = body.split()
+    assert status == 200
+    assert int(worker) not in (os.getpid(), supervisor)
+    assert blocking == b'0'
+
+
+def test_prefork_replaces_a_dead_worker(prefork):
+    port, supervisor = prefork(_make_server(_pid_app), workers=1)
+    worker = int(_get(port)[1])
+    os.kill(worker, signal.SIGKILL)
+    _wait_for(lambda: _gone(worker))
+    replacement = int(_get(port)[1])
+    assert replacement not in (worker, supervisor)
+    assert _get(port) == (200, str(replacement).encode('ascii'))
+
+
+def test_prefork_sighup_replaces_every_worker(prefork):
+    port, supervisor = prefork(_make_server(_pid_app), workers=2)
+    old = set()
+    _wait_for(lambda: old.add(int(_get(port)[1])) or len(old) == 2)
+    os.kill(supervisor, signal.SIGHUP)
+    for pid in old:
+        _wait_for(lambda: _gone(pid))
+    new = set(int(_get(port)[1]) for _ in range(10))
+    assert new and not new & old
+    assert not _gone(supervisor)
+
+
+def test_prefork_workers_with_a_thread_pool(prefork):
+    port, supervisor = prefork(_make_server(_pid_app, threads=2), workers=2)
+    workers = set()
+    _wait_for(lambda: workers.add(int(_get(port)[1])) or len(workers) == 2)
+    assert supervisor not in workers and os.getpid() not in workers
+
+
+def test_full_queue_gets_503_and_is_counted(serve):
+    release = threading.Event()
+
+    def application(environ, start_response):
+        release.wait(10)
+        start_response('200 OK', [('Content-Length', '2')])
+        return [b'ok']
+
+    httpd, port = serve(application, threads=1, queue_size=1)
+    first = _connect(port, b'GET / HTTP/1.1\r\nConnection: close\r\n\r\n')
+    _wait_for(lambda: httpd.stats()['busy'] == 1)
+    second = _connect(port, b'GET / HTTP/1.1\r\nConnection: close\r\n\r\n')
+    _wait_for(lambda: httpd.stats()['queued'] == 1)
+    assert httpd.stats() == {'pool_size': 1, 'busy': 1, 'utilization': 1.0, 'queued': 1, 'queue_size': 1,
+                             'idle': 0, 'handled': 0, 'rejected': 0}
+
+    third = _connect(port, b'GET / HTTP/1.1\r\nConnection: close\r\n\r\n')
+    status, headers, body = _read_response(third.makefile('rb'))
+    assert (status, headers['Retry-After'], headers['Connection'], body) == (
+        'HTTP/1.1 503 Service Unavailable', '1', 'close', b'server busy\n')
+    assert httpd.stats()['rejected'] == 1
+
+    release.set()
+    for connection in (first, second):
+        assert _read_response(connection.makefile('rb'))[::2] == ('HTTP/1.1 200 OK', b'ok')
+    _wait_for(lambda: httpd.stats()['handled'] == 2)
+    stats = httpd.stats()
+    assert (stats['busy'], stats['queued'], stats['rejected']) == (0, 0, 1)
+
+
+def _text_app(environ, start_response):
+    body = environ['PATH_INFO'].encode('ascii')
+    start_response('200 OK', [('Content-Length', str(len(body)))])
+    return [body]
+
+
+def test_keep_alive_serves_several_requests_on_one_connection(serve):
+    httpd, port = serve(_text_app)
+    connection = _connect(port, b'GET /one HTTP/1.1\r\n\r\nGET /two HTTP/1.1\r\n\r\n')
+    rfile = connection.makefile('rb')
+    first, second = _read_response(rfile), _read_response(rfile)
+    assert (first[0], first[2], second[2]) == ('HTTP/1.1 200 OK', b'/one', b'/two')
+    assert 'Connection' not in first[1] and 'Connection' not in second[1]
+    connection.sendall(b'GET /last HTTP/1.1\r\nConnection: close\r\n\r\n')
+    status, headers, body = _read_response(rfile)
+    assert (headers['Connection'], body) == ('close', b'/last')
+    assert rfile.read() == b''
+
+
+def test_idle_connection_gives_its_pool_thread_up(serve):
+    class Handler(_Handler):
+        max_requests = 4
+
+    httpd, port = serve(_text_app, handler_class=Handler, threads=1, queue_size=1)
+    idle = _connect(port, b'GET /1 HTTP/1.1\r\n\r\nGET /2 HTTP/1.1\r\n\r\n')
+    idle_rfile = idle.makefile('rb')
+    assert [_read_response(idle_rfile)[2] for _ in range(2)] == [b'/1', b'/2']
+    _wait_for(lambda: httpd.stats()['idle'] == 1)
+
+    # The only thread serves other connections meanwhile; none get a 503.
+    started = time.time()
+    others = []
+    for number in range(3):
+        others.append(_connect(port, b'GET /other HTTP/1.1\r\n\r\n'))
+        assert _read_response(others[-1].makefile('rb'))[::2] == ('HTTP/1.1 200 OK', b'/other')
+    assert time.time() - started < Handler.idle_timeout / 2
+    _wait_for(lambda: httpd.stats()['idle'] == 4)
+    assert (httpd.stats()['busy'], httpd.stats()['rejected']) == (0, 0)
+
+    # The parked connection resumes, and still counts its requests.
+    idle.sendall(b'GET /3 HTTP/1.1\r\n\r\nGET /4 HTTP/1.1\r\n\r\n')
+    third, fourth = _read_response(idle_rfile), _read_response(idle_rfile)
+    assert (third[2], fourth[2], fourth[1]['Connection']) == (b'/3', b'/4', 'close')
+    assert idle_rfile.read() == b''
+
+
+def test_parked_connection_is_closed_when_idle(serve):
+    class Handler(_Handler):
+        idle_timeout = 0.2
+
+    httpd, port = serve(_text_app, handler_class=Handler, threads=1)
+    connection = _connect(port, b'GET /1 HTTP/1.1\r\n\r\n')
+    rfile = connection.makefile('rb')
+    assert _read_response(rfile)[2] == b'/1'
+    started = time.time()
+    assert rfile.read() == b''
+    assert time.time() - started < 5
+    _wait_for(lambda: httpd.stats()['idle'] == 0)
+
+
+def test_last_request_allowed_on_a_connection_closes_it(serve):
+    class Handler(_Handler):
+        max_requests = 2
+
+    httpd, port = serve(_text_app, handler_class=Handler)
+    connection = _connect(port, b'GET /1 HTTP/1.1\r\n\r\nGET /2 HTTP/1.1\r\n\r\nGET /3 HTTP/1.1\r\n\r\n')
+    rfile = connection.makefile('rb')
+    first, second = _read_response(rfile), _read_response(rfile)
+    assert 'Connection' not in first[1]
+    assert (second[1]['Connection'], second[2]) == ('close', b'/2')
+    assert rfile.read() == b''
+
+
+def test_idle_connection_is_closed(serve):
+    class Handler(_Handler):
+        idle_timeout = 0.2
+
+    httpd, port = serve(_text_app, handler_class=Handler)
+    connection = _connect(port, b'GET /1 HTTP/1.1\r\n\r\n')
+    rfile = connection.makefile('rb')
+    assert _read_response(rfile)[2] == b'/1'
+    started = time.time()
+    assert rfile.read() == b''
+    assert time.time() - started < 5
+
+
+def test_responses_without_length_are_chunked(serve):
+    def application(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'first ', b'', b'second']
+
+    httpd, port = serve(application)
+    connection = _connect(port, b'GET / HTTP/1.1\r\n\r\nHEAD / HTTP/1.1\r\n\r\nGET / HTTP/1.0\r\n\r\n')
+    rfile = connection.makefile('rb')
+    status, headers, body = _read_response(rfile)
+    assert (headers['Transfer-Encoding'], body) == ('chunked', b'first second')
+    status, headers, body = _read_response(rfile)
+    assert (status, body) == ('HTTP/1.1 200 OK', b'')
+    # HTTP/1.0 clients don't understand chunks; the end of the body is the end of the connection.
+    assert rfile.readline() == b'HTTP/1.1 200 OK\r\n'
+    head, _, body = rfile.read().partition(b'\r\n\r\n')
+    assert b'Transfer-Encoding' not in head and b'Connection: close' in head
+    assert body == b'first second'
@@ -0,0 +1,107 @@
+import gzip
+
+import pytest
+
+from project import mywsgi
+from project.exceptions import ImproperlyConfigured
+from project.staticfiles import StaticFiles
+from project.urlsconf import url
+
+
+@pytest.fixture
+def static_root(tmpdir):
+    tmpdir.join('app.css').write_binary(b'body { color: red; }\n' * 10)
+    tmpdir.join('app.css.gz').write_binary(gzip.compress(b'body { color: red; }\n' * 10))
+    tmpdir.join('app.css.br').write_binary(b'brotli bytes')
+    tmpdir.mkdir('img').join('big.bin').write_binary(bytes(bytearray(range(256))) * 1000)
+    return tmpdir
+
+
+def _serve(static, path, **headers):
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}
+    environ.update(headers)
+    return static.serve(environ)
+
+
+def test_index_groups_precompressed_variants(static_root):
+    static = StaticFiles(str(static_root))
+    assert sorted(static.files) == ['app.css', 'img/big.bin']
+    entry = static.files['app.css']
+    assert entry.content_type == 'text/css; charset=utf-8'
+    assert [asset.encoding for asset in entry.variants] == ['br', 'gzip']
+
+    assert _serve(static, '/other/app.css') is None
+    assert _serve(static, '/static/missing.css') is None
+    assert static.serve({'PATH_INFO': '/static/app.css', 'REQUEST_METHOD': 'POST'}) is None
+    with pytest.raises(ImproperlyConfigured):
+        StaticFiles(str(static_root.join('app.css')))
+
+
+def test_negotiates_encoding(static_root):
+    static = StaticFiles(str(static_root))
+    plain = _serve(static, '/static/app.css')
+    assert plain.content == b'body { color: red; }\n' * 10
+    assert 'Content-Encoding' not in plain
+    assert plain['Vary'] == 'Accept-Encoding'
+
+    gzipped = _serve(static, '/static/app.css', HTTP_ACCEPT_ENCODING='gzip, deflate')
+    assert gzipped['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gzipped.content) == plain.content
+    assert gzipped['ETag'] != plain['ETag']
+
+    assert _serve(static, '/static/app.css', HTTP_ACCEPT_ENCODING='gzip, br')['Content-Encoding'] == 'br'
+    assert _serve(static, '/static/app.css', HTTP_ACCEPT_ENCODING='br;q=0, gzip')['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in _serve(static, '/static/app.css', HTTP_ACCEPT_ENCODING='identity')
+
+
+def test_conditional_requests(static_root):
+    static = StaticFiles(str(static_root))
+    response = _serve(static, '/static/app.css')
+    etag, last_modified = response['ETag'], response['Last-Modified']
+
+    not_modified = _serve(static, '/static/app.css', HTTP_IF_NONE_MATCH='"other", ' + etag)
+    assert not_modified.status_code == 304
+    assert not_modified.content == b''
+    assert not_modified['ETag'] == etag
+    assert 'Content-Type' not in not_modified
+    assert _serve(static, '/static/app.css', HTTP_IF_NONE_MATCH='"other"').status_code == 200
+    assert _serve(static, '/static/app.css', HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+    assert _serve(static, '/static/app.css',
+                  HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 1970 00:00:00 GMT').status_code == 200
+
+
+def test_memory_cache_and_mmap(static_root):
+    static = StaticFiles(str(static_root), max_cached_size=1024, max_memory=250)
+    _serve(static, '/static/app.css')
+    assert static.memory_used == 210
+    _serve(static, '/static/app.css', HTTP_ACCEPT_ENCODING='br')
+    assert static.memory_used == 222
+    _serve(static, '/static/app.css', HTTP_ACCEPT_ENCODING='gzip')
+    assert len(static._cache) == 2
+    assert static.memory_used <= 250
+
+    big = _serve(static, '/static/img/big.bin')
+    assert big.streaming
+    assert big['Content-Length'] == '256000'
+    assert big['Content-Type'] == 'application/octet-stream'
+    assert b''.join(big) == bytes(bytearray(range(256))) * 1000
+    assert static.files['img/big.bin'].asset.mapping is not None
+
+
+def test_mounted_before_url_resolution(monkeypatch, static_root):
+    statuses = []
+
+    def start_response(status, response_headers):
+        statuses.append((status, dict(response_headers)))
+
+    monkeypatch.setattr(mywsgi, 'url_patterns', [url('^static/(?P<name>.*)$', lambda request, name: 'view')])
+    monkeypatch.setattr(mywsgi, 'middleware', [StaticFiles(str(static_root))])
+    body = mywsgi.application({'PATH_INFO': '/static/app.css', 'REQUEST_METHOD': 'GET'}, start_response)
+    assert b''.join(body) == b'body { color: red; }\n' * 10
+    assert statuses[-1][1]['Content-Length'] == '210'
+    assert mywsgi.get_handler(mywsgi.middleware)({'PATH_INFO': '/static/missing.css'}) == 'view'
+
+    etag = statuses[-1][1]['ETag']
+    body = mywsgi.application({'PATH_INFO': '/static/app.css', 'HTTP_IF_NONE_MATCH': etag}, start_response)
+    assert statuses[-1][0] == '304 Not Modified'
+    assert 'Content-Length' not in statuses[-1][1]